@@ -9,27 +9,68 @@ try:
 except ImportError:
     win32com = None
     pywintypes = None
+# COM apartment setup for threads that talk to Outlook (part of pywin32)
+try:
+    import pythoncom
+except ImportError:
+    pythoncom = None
+# Optional Aho-Corasick automaton for keyword matching (pyahocorasick)
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+# Optional readers for the native (Office-free) converter backend
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+try:
+    import docx  # python-docx
+except ImportError:
+    docx = None
 import re
 import sys
 import subprocess
-import random
 import shutil
+import signal
+import sqlite3
+import hashlib
+import heapq
+import json
+import math
+import multiprocessing
+import queue
+import random
+import threading
 import time
-from datetime import datetime
+import zlib
+from datetime import datetime, timedelta
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
 from io import BytesIO
 from tqdm import tqdm
-from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, TimeoutError
 import fitz  # PyMuPDF (if needed for advanced PDF parsing)
+from reportlab import rl_config
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen.canvas import Canvas as rlc
 from pypdf import PdfReader, PdfWriter
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
 from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+from google.auth.transport.requests import AuthorizedSession, Request
 from google.oauth2.credentials import Credentials
 from google.auth.exceptions import RefreshError
 import argparse
+import cProfile
+import functools
+import logging
+import logging.handlers
+import pstats
+import tracemalloc
+import requests
 import configparser
 
 
@@ -41,7 +82,8 @@ SCRIPT_NAME = "Email_Search"
 MAX_ATTACHMENT_SIZE_MB = 40
 MAX_ATTACHMENT_SIZE_BYTES = MAX_ATTACHMENT_SIZE_MB * 1024 * 1024
 OCR_TIMEOUT_SECONDS = 60  # 1 minute per file
-OCR_JOBS = os.cpu_count() or 1  # concurrency for OCR
+OCR_JOBS = os.cpu_count() or 1  # total cores shared by all concurrent OCR processes
+OCR_PAGES_PER_JOB = 4  # pages per ocrmypdf job before a file is given another core
 MAX_SPLIT_SIZE_MB = 90
 OCR_CHECK_PERCENTAGE = 0.05
 OCR_CHECK_MAX_PAGES = 25
@@ -51,6 +93,7 @@ OCR_TEXT_THRESHOLD = 10
 GDRIVE_CLIENT_SECRET_FILE = ''
 GDRIVE_TOKEN_FILE = ''
 GDRIVE_MEETING_TRANSCRIPTS_FOLDER_ID = ''
+DRIVE_API_URL = 'https://www.googleapis.com/drive/v3'
 
 SIGNATURE_IMAGE_EXTENSIONS = ('.png', '.gif', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
 WORD_EXTENSIONS = ('.doc', '.docx')
@@ -62,6 +105,11 @@ EXCLUDED_FOLDERS = ['sent items', 'deleted items', 'junk e-mail', 'drafts', 'out
 # --- Configuration from INI ---
 parser = argparse.ArgumentParser()
 parser.add_argument('--config', default='config.ini', help='Path to INI configuration file')
+parser.add_argument('--trace', default=None,
+                    help='Write a span trace here (.json Chrome trace events, .jsonl OpenTelemetry-style)')
+parser.add_argument('--profile', action='store_true', help='Sample hot functions with cProfile and tracemalloc')
+parser.add_argument('command', nargs='*',
+                    help='Optional subcommand: query <keywords> builds the output from the text corpus instead of Outlook')
 args, _ = parser.parse_known_args()
 CONFIG = configparser.ConfigParser()
 CONFIG.read(args.config)
@@ -72,55 +120,301 @@ _raw_base_dir = CONFIG.get('PATHS', 'base_output_dir',
                            fallback=os.path.join(os.path.expanduser('~'), 'Downloads'))
 BASE_OUTPUT_DIR = os.path.abspath(os.path.expanduser(_raw_base_dir))
 LOG_LEVEL = CONFIG.get('LOGGING', 'log_level', fallback='INFO')
+TRACE_FILE = args.trace or CONFIG.get('LOGGING', 'trace_file', fallback='').strip()
+PROFILE = args.profile or CONFIG.getboolean('LOGGING', 'profile', fallback=False)
+PROFILE_SAMPLE_EVERY = max(1, CONFIG.getint('LOGGING', 'profile_sample_every', fallback=10))
+KEYWORD_WHOLE_WORD = CONFIG.getboolean('GENERAL', 'whole_word', fallback=False)
+KEYWORD_PHRASE_MATCH = CONFIG.getboolean('GENERAL', 'phrase_match', fallback=False)
 # Email settings
 OUTLOOK_EMAIL = CONFIG.get('EMAIL', 'outlook_email', fallback=None)
 EXCLUDED_FOLDERS = [e.strip().lower() for e in CONFIG.get('EMAIL', 'excluded_folders', fallback=', '.join(EXCLUDED_FOLDERS)).split(',') if e.strip()]
 PROCESS_ONLY_WITH_KEYWORDS = CONFIG.getboolean('EMAIL', 'process_only_with_keywords', fallback=True)
+INCREMENTAL_EXPORT = CONFIG.getboolean('EMAIL', 'incremental_export', fallback=True)
+SERVER_SIDE_FILTER = CONFIG.getboolean('EMAIL', 'server_side_filter', fallback=True)
+DASL_KEYWORD_MATCH = CONFIG.get('EMAIL', 'dasl_keyword_match', fallback='like').strip().lower()
 LIMIT_TO_DAYS_BACK = CONFIG.getint('EMAIL', 'limit_to_days_back', fallback=0)
+RENDER_WORKERS = max(1, CONFIG.getint('EMAIL', 'render_workers', fallback=min(4, os.cpu_count() or 1)))
+ATTACHMENT_WORKERS = max(1, CONFIG.getint('EMAIL', 'attachment_workers', fallback=4))
+PIPELINE_QUEUE_SIZE = max(1, CONFIG.getint('EMAIL', 'pipeline_queue_size', fallback=64))
+COLLAPSE_THREADS = CONFIG.getboolean('EMAIL', 'collapse_threads', fallback=False)
+THREAD_SIMILARITY = min(1.0, max(0.1, CONFIG.getfloat('EMAIL', 'thread_similarity', fallback=0.8)))
 # Attachment settings
 ALLOWED_ATTACHMENT_EXTENSIONS = tuple(e.strip().lower() for e in CONFIG.get('ATTACHMENTS', 'allowed_extensions', fallback=', '.join(ALLOWED_ATTACHMENT_EXTENSIONS)).split(',') if e.strip())
 CONVERT_OFFICE_DOCS = CONFIG.getboolean('ATTACHMENTS', 'convert_office_docs', fallback=True)
+ATTACHMENT_DEDUP = CONFIG.getboolean('ATTACHMENTS', 'deduplicate', fallback=True)
 MAX_ATTACHMENT_SIZE_MB = CONFIG.getint('ATTACHMENTS', 'max_attachment_size_mb', fallback=MAX_ATTACHMENT_SIZE_MB)
 MAX_ATTACHMENT_SIZE_BYTES = MAX_ATTACHMENT_SIZE_MB * 1024 * 1024
+CONVERTER_BACKEND = CONFIG.get('ATTACHMENTS', 'converter_backend', fallback='auto').strip().lower()
+# auto: Word/Excel over COM where pywin32 is available, otherwise the native converter
+if CONVERTER_BACKEND == 'auto':
+    CONVERTER_BACKEND = 'com' if win32com is not None else 'native'
+CONVERTER_WORKERS = max(1, CONFIG.getint('ATTACHMENTS', 'converter_workers', fallback=2))
+CONVERTER_MAX_JOBS = max(1, CONFIG.getint('ATTACHMENTS', 'converter_max_jobs', fallback=50))
+NATIVE_MAX_ROWS = max(1, CONFIG.getint('ATTACHMENTS', 'native_max_rows', fallback=5000))
+NATIVE_MAX_COLS = max(1, CONFIG.getint('ATTACHMENTS', 'native_max_cols', fallback=30))
+NATIVE_MAX_PAGES = max(1, CONFIG.getint('ATTACHMENTS', 'native_max_pages', fallback=200))
+# Conversions used to share the OCR timeout; keep honoring it when no conversion timeout is set
+CONVERSION_TIMEOUT = CONFIG.getint('ATTACHMENTS', 'conversion_timeout',
+                                   fallback=CONFIG.getint('PDF', 'ocr_timeout', fallback=OCR_TIMEOUT_SECONDS))
 # PDF settings
 SPLIT_EMAILS = CONFIG.getboolean('PDF', 'split_emails', fallback=True)
 SPLIT_ATTACHMENTS = CONFIG.getboolean('PDF', 'split_attachments', fallback=True)
+SINGLE_PASS_MERGE = CONFIG.getboolean('PDF', 'single_pass_merge', fallback=True)
+STREAM_EMAIL_RENDER = CONFIG.getboolean('PDF', 'stream_email_render', fallback=True)
+INDEX_MANIFEST = CONFIG.get('PDF', 'index_manifest', fallback='none').strip().lower()
+COMPACT_OUTPUT = CONFIG.getboolean('PDF', 'compact_output', fallback=True)
+IMAGE_DPI_CAP = CONFIG.getint('PDF', 'image_dpi_cap', fallback=0)
 MAX_SPLIT_SIZE_MB = CONFIG.getint('PDF', 'max_split_size_mb', fallback=MAX_SPLIT_SIZE_MB)
 OCR_REQUIRED = CONFIG.getboolean('PDF', 'ocr_required', fallback=True)
 OCR_TIMEOUT_SECONDS = CONFIG.getint('PDF', 'ocr_timeout', fallback=OCR_TIMEOUT_SECONDS)
+OCR_JOBS = max(1, CONFIG.getint('PDF', 'ocr_jobs', fallback=OCR_JOBS))
+OCR_CHECK_MAX_PAGES = CONFIG.getint('PDF', 'ocr_check_max_pages', fallback=OCR_CHECK_MAX_PAGES)
+OCR_TEXT_THRESHOLD = CONFIG.getint('PDF', 'ocr_text_threshold', fallback=OCR_TEXT_THRESHOLD)
+OCR_CHECK_PERCENTAGE = CONFIG.getfloat('PDF', 'ocr_check_percentage', fallback=OCR_CHECK_PERCENTAGE)
+OCR_PAGE_LEVEL = CONFIG.getboolean('PDF', 'ocr_page_level', fallback=True)
+OCR_CACHE_ENABLE = CONFIG.getboolean('PDF', 'ocr_cache', fallback=True)
+OCR_CACHE_DIR = os.path.abspath(os.path.expanduser(
+    CONFIG.get('PDF', 'ocr_cache_dir', fallback='') or os.path.join(BASE_OUTPUT_DIR, '.email_search_cache', 'ocr')))
+OCR_CACHE_MAX_MB = CONFIG.getint('PDF', 'ocr_cache_max_mb', fallback=2048)
+# ocrmypdf: one ocrmypdf process per file; tesseract: pages of all files OCR'd in-process from one queue
+OCR_ENGINE = CONFIG.get('PDF', 'ocr_engine', fallback='ocrmypdf').strip().lower()
+OCR_LANGUAGE = CONFIG.get('PDF', 'ocr_language', fallback='eng').strip() or 'eng'
+OCR_DPI = max(72, CONFIG.getint('PDF', 'ocr_dpi', fallback=300))
+OCR_TESSDATA = CONFIG.get('PDF', 'tessdata', fallback='').strip() or None
 # Google Drive settings
 GOOGLE_DRIVE_ENABLE = CONFIG.getboolean('GOOGLE_DRIVE', 'enable_transcript_download', fallback=True)
 GDRIVE_CLIENT_SECRET_FILE = CONFIG.get('GOOGLE_DRIVE', 'client_secret_file', fallback=GDRIVE_CLIENT_SECRET_FILE)
 GDRIVE_TOKEN_FILE = CONFIG.get('GOOGLE_DRIVE', 'token_file', fallback=GDRIVE_TOKEN_FILE)
-GDRIVE_MEETING_TRANSCRIPTS_FOLDER_ID = CONFIG.get('GOOGLE_DRIVE', 'transcript_folder_id', fallback=GDRIVE_MEETING_TRANSCRIPTS_FOLDER_ID)
+GDRIVE_MEETING_TRANSCRIPTS_FOLDER_ID = CONFIG.get('GOOGLE_DRIVE', 'transcript_folder_id', fallback=GDRIVE_MEETING_TRANSCRIPTS_FOLDER_ID).strip()
+DRIVE_SERVER_SIDE_FILTER = CONFIG.getboolean('GOOGLE_DRIVE', 'server_side_filter', fallback=True)
+DRIVE_DOWNLOAD_WORKERS = max(1, CONFIG.getint('GOOGLE_DRIVE', 'download_workers', fallback=4))
+DRIVE_MAX_RETRIES = max(0, CONFIG.getint('GOOGLE_DRIVE', 'max_retries', fallback=5))
+DRIVE_BACKOFF_SECONDS = CONFIG.getfloat('GOOGLE_DRIVE', 'backoff_seconds', fallback=1.0)
+DRIVE_CHUNK_BYTES = max(1, CONFIG.getint('GOOGLE_DRIVE', 'chunk_size_mb', fallback=8)) * 1024 * 1024
+DRIVE_INCREMENTAL_SYNC = CONFIG.getboolean('GOOGLE_DRIVE', 'incremental_sync', fallback=True)
+CORPUS_ENABLE = CONFIG.getboolean('CORPUS', 'enable', fallback=False)
+CORPUS_DIR = os.path.abspath(os.path.expanduser(
+    CONFIG.get('CORPUS', 'path', fallback='').strip() or os.path.join(BASE_OUTPUT_DIR, f"{SCRIPT_NAME}_corpus")))
 
 # Globals
 keywords = []
 BASE_FOLDER = EMAIL_SAVE_PATH = ATTACHMENT_SAVE_PATH = TRANSCRIPT_SAVE_PATH = LOG_FILE = None
 CONSOLIDATED_EMAIL_PDF_PATH = CONSOLIDATED_ATTACHMENT_PDF_PATH = CONSOLIDATED_TRANSCRIPT_PDF_PATH = None
-log_messages = []
 # Index metadata storage
 EMAIL_INDEX_LIST = []
 ATTACHMENT_INDEX_LIST = []
 TRANSCRIPT_INDEX_LIST = []
+# Output parts per index type as (file name, page count), for the index manifest
+OUTPUT_PARTS = {'email': [], 'attachment': [], 'transcript': []}
+
+# Logging
+# Console and log file both honor [LOGGING] log_level. File records are buffered
+# and written in batches (and at exit) rather than held for the whole run.
+LOG_BUFFER_RECORDS = 500
+LOG_FORMATTER = logging.Formatter('[%(asctime)s] %(message)s', '%Y-%m-%d %H:%M:%S')
+LOGGER = logging.getLogger(SCRIPT_NAME)
+LOGGER.setLevel(getattr(logging, LOG_LEVEL.strip().upper(), logging.INFO))
+LOGGER.propagate = False
+LOGGER.handlers.clear()
+_console_handler = logging.StreamHandler(sys.stdout)
+_console_handler.setFormatter(LOG_FORMATTER)
+LOGGER.addHandler(_console_handler)
+# Target (the log file) is attached by initialize_paths_and_logging; records wait in the buffer until then
+LOG_FILE_HANDLER = logging.handlers.MemoryHandler(LOG_BUFFER_RECORDS, flushLevel=logging.ERROR)
+LOGGER.addHandler(LOG_FILE_HANDLER)
 
 # Logging helper
-def log(msg, worker=False):
-    ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+def log(msg, worker=False, level=logging.INFO):
     prefix = '[WORKER] ' if worker else ''
-    entry = f"[{ts}] {prefix}{msg}"
-    log_messages.append(entry)
-    # Always print to keep progress bar visible
-    print(entry)
+    LOGGER.log(level, f"{prefix}{msg}")
+
+# Tracing
+class Span:
+    __slots__ = ('name', 'attrs', 'start', 'end', 'span_id', 'parent_id', 'thread_id', 'thread_name')
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+class NullSpan:
+    def set(self, **attrs):
+        return self
+
+NULL_SPAN = NullSpan()
+
+class Tracer:
+    """
+    Span recorder for the pipeline. span(name, **attrs) times a block on the
+    current thread, nested under the thread's open span if any; attributes
+    found along the way (pages, bytes, cache hits) are added with set().
+    While disabled, span() hands out a shared no-op span.
+
+    export() writes Chrome trace-event JSON (.json, for chrome://tracing or
+    Perfetto) or OpenTelemetry-style JSONL (.jsonl), one span per line.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.ids = iter(range(1, 1 << 62))
+        self.origin = time.perf_counter()
+        self.origin_unix = time.time()
+        self.trace_id = os.urandom(16).hex()
+
+    def enable(self):
+        self.enabled = True
+        self.origin = time.perf_counter()
+        self.origin_unix = time.time()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        if not self.enabled:
+            yield NULL_SPAN
+            return
+        stack = self.local.__dict__.setdefault('stack', [])
+        span = Span()
+        span.name, span.attrs = name, attrs
+        span.span_id = next(self.ids)
+        span.parent_id = stack[-1].span_id if stack else None
+        thread = threading.current_thread()
+        span.thread_id, span.thread_name = thread.ident, thread.name
+        stack.append(span)
+        span.start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end = time.perf_counter()
+            stack.pop()
+            with self.lock:
+                self.spans.append(span)
+
+    # Innermost open span on this thread, for adding attributes from nested code
+    def current(self):
+        stack = getattr(self.local, 'stack', None)
+        return stack[-1] if stack else NULL_SPAN
+
+    def export(self, path):
+        with self.lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        pid = os.getpid()
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.lower().endswith('.jsonl'):
+                for s in spans:
+                    f.write(json.dumps({
+                        'trace_id': self.trace_id, 'span_id': f"{s.span_id:016x}",
+                        'parent_span_id': f"{s.parent_id:016x}" if s.parent_id else None,
+                        'name': s.name,
+                        'start_time_unix_nano': int((self.origin_unix + s.start - self.origin) * 1e9),
+                        'end_time_unix_nano': int((self.origin_unix + s.end - self.origin) * 1e9),
+                        'attributes': dict(s.attrs, **{'thread.name': s.thread_name}),
+                    }, default=str) + '\n')
+            else:
+                threads = {s.thread_id: s.thread_name for s in spans}
+                events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                          for tid, name in threads.items()]
+                events.extend({'name': s.name, 'cat': s.name.split('.')[0], 'ph': 'X', 'pid': pid, 'tid': s.thread_id,
+                               'ts': round((s.start - self.origin) * 1e6, 1), 'dur': round((s.end - s.start) * 1e6, 1),
+                               'args': s.attrs} for s in spans)
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, default=str)
+        return len(spans)
+
+TRACER = Tracer()
+
+# Profiling (--profile)
+# Hot paths sampled by the profiler; 'Class.method' entries patch the class
+PROFILE_TARGETS = ('snapshot_mail_item', 'prepare_attachment', 'render_email_pdf', 'EmailStreamRenderer.add',
+                   'ConverterPool.convert', 'pages_needing_ocr', 'ocr_pdf_task', 'get_doc_info',
+                   'merge_pdfs_to_parts', 'split_pdf_by_size', 'build_project_index')
+
+class Profiler:
+    """
+    Opt-in sampling profiler for PROFILE_TARGETS. The first call of each
+    target and every sample_every-th after it run under cProfile, and the
+    samples are merged into one pstats.Stats. Only one sample is taken at a
+    time (cProfile can't profile overlapping calls); calls made meanwhile
+    run unprofiled. tracemalloc tracks allocations for the whole run.
+    """
+    def __init__(self, sample_every=10):
+        self.sample_every = max(1, sample_every)
+        self.calls = {}
+        self.samples = {}
+        self.stats = None
+        self.lock = threading.Lock()
+        self.sampling = threading.Lock()
+
+    def wrap(self, name, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.lock:
+                n = self.calls[name] = self.calls.get(name, 0) + 1
+            if (n - 1) % self.sample_every or not self.sampling.acquire(blocking=False):
+                return fn(*args, **kwargs)
+            prof = cProfile.Profile()
+            try:
+                return prof.runcall(fn, *args, **kwargs)
+            finally:
+                self.sampling.release()
+                with self.lock:
+                    self.samples[name] = self.samples.get(name, 0) + 1
+                    if self.stats is None:
+                        self.stats = pstats.Stats(prof)
+                    else:
+                        self.stats.add(prof)
+        return wrapper
+
+    def install(self, namespace):
+        tracemalloc.start()
+        for target in PROFILE_TARGETS:
+            if '.' in target:
+                cls_name, method = target.split('.')
+                cls = namespace[cls_name]
+                setattr(cls, method, self.wrap(target, getattr(cls, method)))
+            else:
+                namespace[target] = self.wrap(target, namespace[target])
+
+    def report(self, path, top=40):
+        """Write the merged profile (text, plus a .prof for viewers) and the top allocations."""
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        current, peak = tracemalloc.get_traced_memory() if snapshot else (0, 0)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("Sampled calls: " + ', '.join(f"{name} {self.samples.get(name, 0)}/{count}"
+                                                    for name, count in sorted(self.calls.items())) + '\n\n')
+            if self.stats is not None:
+                self.stats.stream = f
+                self.stats.sort_stats('cumulative').print_stats(top)
+                self.stats.dump_stats(os.path.splitext(path)[0] + '.prof')
+            if snapshot:
+                f.write(f"\nPython memory: {current / (1024 * 1024):.1f} MB current, {peak / (1024 * 1024):.1f} MB peak\n")
+                f.write("Top allocation sites:\n")
+                for stat in snapshot.statistics('lineno')[:15]:
+                    f.write(f"  {stat}\n")
+
+def traced(name):
+    """Decorator: run the function inside a span called name."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return fn(*args, **kwargs)
+            with TRACER.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
 
 # Path initialization
-def initialize_paths_and_logging():
+def initialize_paths_and_logging(keyword_text=None):
     global keywords, BASE_FOLDER, EMAIL_SAVE_PATH, ATTACHMENT_SAVE_PATH, TRANSCRIPT_SAVE_PATH, LOG_FILE
     global CONSOLIDATED_EMAIL_PDF_PATH, CONSOLIDATED_ATTACHMENT_PDF_PATH, CONSOLIDATED_TRANSCRIPT_PDF_PATH
     global PROJECT_SAFE, DATE_STR
-    # Load keywords from configuration
+    # Load keywords from configuration, unless given (corpus queries)
     try:
-        keywords[:] = [k.strip().lower() for k in CONFIG.get('GENERAL', 'keywords').split(',') if k.strip()]
+        if keyword_text is None:
+            keyword_text = CONFIG.get('GENERAL', 'keywords')
+        keywords[:] = [k.strip().lower() for k in keyword_text.split(',') if k.strip()]
     except Exception:
         keywords[:] = []
     if not keywords:
@@ -143,23 +437,90 @@ def initialize_paths_and_logging():
     CONSOLIDATED_TRANSCRIPT_PDF_PATH = os.path.join(BASE_FOLDER, f"Transcripts_{safe}_{date}.pdf")
     for path in [EMAIL_SAVE_PATH, ATTACHMENT_SAVE_PATH, TRANSCRIPT_SAVE_PATH]:
         os.makedirs(path, exist_ok=True)
+    file_handler = logging.FileHandler(LOG_FILE, mode='w', encoding='utf-8', delay=True)
+    file_handler.setFormatter(LOG_FORMATTER)
+    LOG_FILE_HANDLER.setTarget(file_handler)
 
-# PDF validation
-def is_valid_pdf(path):
+# Copies of already-exported attachments that were skipped, with the bytes and pages they would have added
+ATTACHMENT_DEDUP_STATS = {'duplicates': 0, 'bytes': 0, 'pages': 0}
+
+# Per-run document metadata registry
+# Keyed by (absolute path, mtime, size) so a file rewritten in place is parsed again
+DOC_REGISTRY = {}
+DOC_REGISTRY_LOCK = threading.Lock()
+DOC_REGISTRY_STATS = {'lookups': 0, 'hits': 0, 'parses': 0, 'parse_seconds': 0.0, 'seconds_saved': 0.0}
+
+def doc_key(path):
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+def get_doc_info(path, need_text=False):
+    """
+    Return the registry entry for path: a dict with 'valid', 'page_count',
+    'size' and 'has_text' (None until a text-layer check has been done).
+
+    The PDF is parsed only the first time it is seen; later lookups are served
+    from memory. Pass need_text=True when the caller will also need the text
+    layer status, so both are collected in the same parse.
+    """
+    try:
+        key = doc_key(path)
+    except OSError:
+        return {'valid': False, 'page_count': 0, 'size': 0, 'has_text': False, 'parse_seconds': 0.0}
+    with DOC_REGISTRY_LOCK:
+        DOC_REGISTRY_STATS['lookups'] += 1
+        info = DOC_REGISTRY.get(key)
+        if info and (not need_text or info['has_text'] is not None):
+            DOC_REGISTRY_STATS['hits'] += 1
+            DOC_REGISTRY_STATS['seconds_saved'] += info['parse_seconds']
+            return info
+    start = time.perf_counter()
+    if info is None:
+        info = {'valid': False, 'page_count': 0, 'size': key[2], 'has_text': None, 'parse_seconds': 0.0}
     try:
         reader = PdfReader(path)
-        return len(reader.pages) > 0
+        info['page_count'] = len(reader.pages)
+        info['valid'] = info['page_count'] > 0
+        if need_text:
+            text = ''.join(page.extract_text() or '' for page in reader.pages[:OCR_CHECK_MAX_PAGES])
+            info['has_text'] = len(text) > OCR_TEXT_THRESHOLD
     except Exception:
-        log(f"Invalid PDF: {os.path.basename(path)}")
-        return False
+        info['valid'] = False
+        info['has_text'] = False
+    elapsed = time.perf_counter() - start
+    info['parse_seconds'] += elapsed
+    with DOC_REGISTRY_LOCK:
+        DOC_REGISTRY[key] = info
+        DOC_REGISTRY_STATS['parses'] += 1
+        DOC_REGISTRY_STATS['parse_seconds'] += elapsed
+    return info
+
+# Record metadata for a PDF this run just wrote, so it never needs parsing
+def register_doc(path, page_count, has_text=None):
+    key = doc_key(path)
+    with DOC_REGISTRY_LOCK:
+        DOC_REGISTRY[key] = {'valid': page_count > 0, 'page_count': page_count,
+                             'size': key[2], 'has_text': has_text, 'parse_seconds': 0.0}
+
+def pdf_page_count(path):
+    return get_doc_info(path)['page_count']
+
+# PDF validation
+def is_valid_pdf(path, need_text=False):
+    if get_doc_info(path, need_text)['valid']:
+        return True
+    log(f"Invalid PDF: {os.path.basename(path)}", level=logging.WARNING)
+    return False
 
 # Merge PDFs
+@traced('pdf.merge')
 def merge_pdfs(paths, out_path):
+    """Merge paths into out_path; returns the paths that were merged ([] on failure)."""
     writer = PdfWriter()
     valid = [p for p in paths if os.path.exists(p) and is_valid_pdf(p)]
     if not valid:
         log(f"No PDFs to merge for {os.path.basename(out_path)}")
-        return
+        return []
     # Merge each PDF file into output, with progress bar
     for p in tqdm(valid,
                     desc=f"Merging {os.path.basename(out_path)}",
@@ -171,403 +532,2011 @@ def merge_pdfs(paths, out_path):
             writer.write(f)
         log(f"Merged PDF: {out_path}")
     except Exception as e:
-        log(f"Merge save failed: {e}")
+        log(f"Merge save failed: {e}", level=logging.WARNING)
+        return []
+    if COMPACT_OUTPUT:
+        compact_pdf(out_path)
+    register_doc(out_path, len(writer.pages))
+    return valid
+
+# Approximate bytes added per indirect object ("n 0 obj ... endobj" plus xref row)
+PDF_OBJECT_OVERHEAD_BYTES = 40
+# Approximate fixed bytes per written part (header, catalog, pages tree, trailer)
+PDF_PART_OVERHEAD_BYTES = 1024
+# Fraction of the size limit a part is planned against, leaving room for estimate error
+PDF_SPLIT_SAFETY_MARGIN = 0.98
+# Keys that point back up the page tree; following them would pull in the whole document
+PDF_BACKREF_KEYS = ('/Parent', '/P')
+
+def pdf_object_bytes(obj):
+    buf = BytesIO()
+    obj.write_to_stream(buf)
+    return buf.getvalue()
+
+# Compaction of written output
+# Merged files carry a copy of every font and image per source document (the
+# same Helvetica dictionary in each rendered email, the same letterhead in each
+# attachment). With [PDF] compact_output each written merge output or part is
+# rewritten by MuPDF with identical objects and streams merged, streams
+# deflated and objects packed into object streams; images above image_dpi_cap
+# are downsampled first.
+COMPACT_LOCK = threading.Lock()
+COMPACT_STATS = {'files': 0, 'bytes_in': 0, 'bytes_out': 0, 'parts_avoided': 0}
+# Bytes saved per written file; merge_to_parts totals them per output into COMPACT_STATS
+COMPACT_SAVED = {}
+
+@traced('pdf.compact')
+def compact_pdf(path):
+    """Compact path in place when that makes it smaller; returns its size afterwards."""
+    before = os.path.getsize(path)
+    tmp_path = path + '.compact'
+    try:
+        with fitz.open(path) as doc:
+            if IMAGE_DPI_CAP > 0:
+                doc.rewrite_images(dpi_threshold=IMAGE_DPI_CAP + 1, dpi_target=IMAGE_DPI_CAP)
+            doc.save(tmp_path, garbage=4, deflate=True, use_objstms=1)
+        after = os.path.getsize(tmp_path)
+        if after < before:
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+            after = before
+    except Exception as e:
+        log(f"Compaction failed for {os.path.basename(path)}: {e}", level=logging.WARNING)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        after = before
+    with COMPACT_LOCK:
+        COMPACT_SAVED[path] = before - after
+    TRACER.current().set(file=os.path.basename(path), bytes=before, saved=before - after)
+    return after
+
+# Estimate the bytes a page adds to a part, counting shared objects only once
+def page_footprint(page, seen, added=None):
+    """
+    Walk the objects reachable from page (skipping back-references to the page
+    tree) and return (size, added): the serialized size of every indirect
+    object not already in seen, and the keys of those objects. Callers merge
+    added into seen once the page is accepted into a part, so resources shared
+    between pages of that part (fonts, images, XObjects) are counted once.
+    Passing an added set accumulates keys across several pages, so a group of
+    pages can be sized together before being accepted.
+    """
+    total = 0
+    if added is None:
+        added = set()
+    ref = getattr(page, 'indirect_reference', None)
+    stack = [ref if ref is not None else page]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, IndirectObject):
+            # Include the owning reader so objects from different source files don't collide
+            key = (id(obj.pdf), obj.idnum, obj.generation)
+            if key in seen or key in added:
+                continue
+            added.add(key)
+            obj = obj.get_object()
+            if obj is None:
+                continue
+            try:
+                data = pdf_object_bytes(obj)
+            except Exception:
+                data = b''
+            # Compaction writes identical streams from different files (fonts, images) once
+            if COMPACT_OUTPUT and isinstance(obj, StreamObject):
+                digest = hashlib.sha1(data).digest()
+                if digest in seen or digest in added:
+                    continue
+                added.add(digest)
+            total += len(data) + PDF_OBJECT_OVERHEAD_BYTES
+        if isinstance(obj, DictionaryObject):
+            stack.extend(v for k, v in obj.items() if k not in PDF_BACKREF_KEYS)
+        elif isinstance(obj, ArrayObject):
+            stack.extend(obj)
+    return total, added
+
+# Write the given pages to out_path as one part
+def write_pdf_part(pages, out_path):
+    writer = PdfWriter()
+    for page in pages:
+        writer.add_page(page)
+    with open(out_path, 'wb') as f:
+        writer.write(f)
+    size = compact_pdf(out_path) if COMPACT_OUTPUT else os.path.getsize(out_path)
+    register_doc(out_path, len(pages))
+    return size
 
 # Split large PDF into parts
+@traced('pdf.split')
 def split_pdf_by_size(path, max_mb=MAX_SPLIT_SIZE_MB):
-    parts = []
-    if os.path.getsize(path) <= max_mb * 1024 * 1024:
+    """
+    Split path into <name>_partN.pdf files of at most max_mb each.
+
+    Part sizes are tracked incrementally from per-page object footprints, so
+    each part is serialized exactly once when it is finalized. If a written
+    part still ends up over the limit (the estimate is approximate), trailing
+    pages are moved to the next part and the part is rewritten.
+    """
+    max_bytes = max_mb * 1024 * 1024
+    if os.path.getsize(path) <= max_bytes:
         return [path]
     reader = PdfReader(path)
-    writer = PdfWriter()
-    # Iterate pages with progress
-    pages = reader.pages
-    page_iter = tqdm(pages,
-                     desc=f"Splitting {os.path.basename(path)}",
-                     unit='page', position=1, leave=True)
-    part_num = 1
-    for page in page_iter:
-        writer.add_page(page)
-        temp = BytesIO()
-        writer.write(temp)
-        if temp.tell() >= max_mb * 1024 * 1024:
-            out_path = f"{os.path.splitext(path)[0]}_part{part_num}.pdf"
-            with open(out_path, 'wb') as f:
-                writer.write(f)
-            parts.append(out_path)
-            part_num += 1
-            writer = PdfWriter()
-    if writer.pages:
-        out_path = f"{os.path.splitext(path)[0]}_part{part_num}.pdf"
-        with open(out_path, 'wb') as f:
-            writer.write(f)
-        parts.append(out_path)
+    base = os.path.splitext(path)[0]
+    parts = []
+    pending = []
+    def flush(page_indices):
+        # Write a part, trimming trailing pages back onto the queue while too large
+        while True:
+            out_path = f"{base}_part{len(parts) + 1}.pdf"
+            size = write_pdf_part([reader.pages[i] for i in page_indices], out_path)
+            if size <= max_bytes or len(page_indices) == 1:
+                if size > max_bytes:
+                    log(f"Page {page_indices[0] + 1} of {os.path.basename(path)} alone exceeds {max_mb}MB")
+                parts.append(out_path)
+                return
+            keep = max(1, int(len(page_indices) * max_bytes / size * 0.95))
+            pending[:0] = page_indices[keep:]
+            page_indices = page_indices[:keep]
+    seen = set()
+    current = []
+    estimate = PDF_PART_OVERHEAD_BYTES
+    budget = max_bytes * PDF_SPLIT_SAFETY_MARGIN
+    progress = tqdm(total=len(reader.pages),
+                    desc=f"Splitting {os.path.basename(path)}",
+                    unit='page', position=1, leave=True)
+    idx = 0
+    while True:
+        if pending:
+            page_idx = pending.pop(0)
+        elif idx < len(reader.pages):
+            page_idx = idx
+            idx += 1
+            progress.update(1)
+        elif current:
+            # Out of pages: write the last part; anything it trims comes back through pending
+            flush(current)
+            seen, current, estimate = set(), [], PDF_PART_OVERHEAD_BYTES
+            continue
+        else:
+            break
+        size, added = page_footprint(reader.pages[page_idx], seen)
+        if current and estimate + size > budget:
+            queued = len(pending)
+            flush(current)
+            seen, current, estimate = set(), [], PDF_PART_OVERHEAD_BYTES
+            if len(pending) > queued:
+                # Pages trimmed off the written part go ahead of this one
+                pending.insert(len(pending) - queued, page_idx)
+                continue
+            size, added = page_footprint(reader.pages[page_idx], seen)
+        current.append(page_idx)
+        seen |= added
+        estimate += size
+    progress.close()
+    TRACER.current().set(file=os.path.basename(path), pages=len(reader.pages), parts=len(parts))
     return parts
-   
-def update_attachment_index_after_split(part_paths, index_list):
+
+# Merge PDFs straight into size-bounded parts
+@traced('pdf.merge')
+def merge_pdfs_to_parts(paths, out_path, max_mb=MAX_SPLIT_SIZE_MB):
     """
-    Update attachment index entries with correct merged_file and start_page values
-    after the merged attachments PDF has been split into parts.
+    Merge paths into parts of at most max_mb each without first writing a
+    monolithic merged file. Source documents are kept whole within one part
+    unless a document is larger than a part on its own.
+
+    Parts are named <out_path>_partN.pdf; if everything fits in one part it is
+    written to out_path itself, matching split_pdf_by_size.
+
+    Returns (part_paths, part_page_counts, placements) where placements holds
+    one dict per merged source with 'path', 'merged_file', 'start_page'
+    (1-based, relative to merged_file) and 'page_count'. A source only counts
+    as merged once every one of its pages has been written.
     """
-    # Compute page counts for each part
-    part_page_counts = []
-    for p in part_paths:
-        try:
-            count = len(PdfReader(p).pages)
-        except Exception:
-            count = 0
-        part_page_counts.append(count)
-    # Compute cumulative boundaries
-    boundaries = []
-    cum = 0
-    for count in part_page_counts:
-        cum += count
-        boundaries.append(cum)
-    # Update each entry with merged_file and start_page
+    max_bytes = max_mb * 1024 * 1024
+    budget = max_bytes * PDF_SPLIT_SAFETY_MARGIN
+    base = os.path.splitext(out_path)[0]
+    parts, part_page_counts, placements = [], [], []
+    # Pages written so far per placement
+    placed = []
+    # Pages planned for the current part as (placement index, page) pairs
+    current = []
+    seen = set()
+    estimate = PDF_PART_OVERHEAD_BYTES
+
+    def add(entries):
+        nonlocal estimate
+        for pl_idx, page in entries:
+            size, added = page_footprint(page, seen)
+            seen.update(added)
+            estimate += size
+            current.append((pl_idx, page))
+
+    def flush():
+        nonlocal current, seen, estimate
+        pages, leftover = current, []
+        while True:
+            part_path = f"{base}_part{len(parts) + 1}.pdf"
+            size = write_pdf_part([page for _, page in pages], part_path)
+            if size <= max_bytes or len(pages) == 1:
+                if size > max_bytes:
+                    log(f"A single page of {os.path.basename(placements[pages[0][0]]['path'])} exceeds {max_mb}MB")
+                break
+            keep = max(1, int(len(pages) * max_bytes / size * 0.95))
+            leftover[:0] = pages[keep:]
+            pages = pages[:keep]
+        # Emit page offsets for every source that starts in this part
+        for local_page, (pl_idx, _) in enumerate(pages, 1):
+            placed[pl_idx] += 1
+            placement = placements[pl_idx]
+            if not placement['merged_file']:
+                placement['merged_file'] = os.path.basename(part_path)
+                placement['start_page'] = local_page
+        parts.append(part_path)
+        part_page_counts.append(len(pages))
+        current, seen, estimate = [], set(), PDF_PART_OVERHEAD_BYTES
+        add(leftover)
+
+    for p in tqdm(paths,
+                  desc=f"Merging {os.path.basename(out_path)}",
+                  unit='file', position=1, leave=True):
+        if not os.path.exists(p) or not is_valid_pdf(p):
+            continue
+        pages = list(PdfReader(p).pages)
+        pl_idx = len(placements)
+        placements.append({'path': p, 'merged_file': '', 'start_page': 0, 'page_count': len(pages)})
+        placed.append(0)
+        # Size the whole document against the current part first
+        doc_size, doc_added = 0, set()
+        for page in pages:
+            doc_size += page_footprint(page, seen, doc_added)[0]
+        # Pages trimmed off a written part stay in current, so flush until the document fits
+        while current and estimate + doc_size > budget:
+            flush()
+            doc_size, doc_added = 0, set()
+            for page in pages:
+                doc_size += page_footprint(page, seen, doc_added)[0]
+        if estimate + doc_size <= budget:
+            seen.update(doc_added)
+            estimate += doc_size
+            current.extend((pl_idx, page) for page in pages)
+            continue
+        # Document is larger than a part on its own: fill parts page by page
+        for page in pages:
+            while current and estimate + page_footprint(page, seen)[0] > budget:
+                flush()
+            add([(pl_idx, page)])
+    while current:
+        flush()
+    incomplete = [pl['path'] for pl, n in zip(placements, placed) if n != pl['page_count']]
+    if incomplete:
+        log(f"Pages missing from {os.path.basename(out_path)} for: {', '.join(map(os.path.basename, incomplete))}",
+            level=logging.WARNING)
+        placements = [pl for pl, n in zip(placements, placed) if n == pl['page_count']]
+    if not parts:
+        log(f"No PDFs to merge for {os.path.basename(out_path)}")
+        return [], [], []
+    if len(parts) == 1:
+        os.replace(parts[0], out_path)
+        register_doc(out_path, part_page_counts[0])
+        with COMPACT_LOCK:
+            COMPACT_SAVED[out_path] = COMPACT_SAVED.pop(parts[0], 0)
+        parts[0] = out_path
+        for placement in placements:
+            placement['merged_file'] = os.path.basename(out_path)
+    log(f"Merged {len(placements)} PDFs into {len(parts)} part(s): {out_path}")
+    TRACER.current().set(output=os.path.basename(out_path), files=len(placements), parts=len(parts),
+                         pages=sum(part_page_counts), bytes=sum(os.path.getsize(p) for p in parts))
+    return parts, part_page_counts, placements
+
+# Merge paths into out_path, packed into size-bounded parts when split is set
+def merge_to_parts(paths, out_path, split=True):
+    """
+    Returns (part_paths, part_page_counts, merged) where merged lists the
+    sources that made it into the output, in order. Page counts come from the
+    merge itself (or the document registry), never from re-reading the parts.
+    """
+    if split and SINGLE_PASS_MERGE:
+        parts, part_page_counts, placements = merge_pdfs_to_parts(paths, out_path, MAX_SPLIT_SIZE_MB)
+        merged = [pl['path'] for pl in placements]
+    else:
+        merged = merge_pdfs(paths, out_path)
+        if not merged:
+            return [], [], []
+        parts = split_pdf_by_size(out_path, MAX_SPLIT_SIZE_MB) if split else [out_path]
+        part_page_counts = [pdf_page_count(p) for p in parts]
+    if COMPACT_OUTPUT and parts:
+        with COMPACT_LOCK:
+            saved = sum(COMPACT_SAVED.pop(p, 0) for p in set(parts) | {out_path})
+            size = sum(os.path.getsize(p) for p in parts)
+            COMPACT_STATS['files'] += len(parts)
+            COMPACT_STATS['bytes_in'] += size + saved
+            COMPACT_STATS['bytes_out'] += size
+            if split:
+                # Parts the output would have needed at its uncompacted size
+                max_bytes = MAX_SPLIT_SIZE_MB * 1024 * 1024
+                COMPACT_STATS['parts_avoided'] += max(0, math.ceil((size + saved) / max_bytes) - len(parts))
+    return parts, part_page_counts, merged
+
+# Flag index entries whose source PDF is missing from the merged output
+def flag_unmerged(index_list, sources, merged):
+    """
+    index_list holds one live entry per source, in the order of sources
+    (deduplicated copies and entries already flagged are skipped). Entries
+    whose source is not in merged are flagged 'omitted' so they take no pages.
+    """
+    merged = set(merged)
+    live = [e for e in index_list if not e.get('duplicate_of') and not e.get('omitted')]
+    for entry, source in zip(live, sources):
+        if source not in merged:
+            entry['omitted'] = True
+
+def update_index_after_split(part_paths, index_list, part_page_counts=None):
+    """
+    Fill 'merged_file' and 'start_page' (1-based, relative to the part) into
+    index entries from their 'page_count', given the parts the merged output
+    was written as. Each entry's part is found by binary search over the
+    cumulative part boundaries. Entries flagged 'omitted' get no location;
+    deduplicated copies take the location of the copy that was merged.
+    part_page_counts can be passed when already known (e.g. from
+    merge_to_parts) to avoid re-opening every part.
+    """
+    if part_page_counts is None:
+        part_page_counts = [pdf_page_count(p) for p in part_paths]
+    boundaries = list(accumulate(part_page_counts))
+    names = [os.path.basename(p) for p in part_paths]
+    last = len(boundaries) - 1
     global_page = 0
+    merged = {}
     for entry in index_list:
-        pc = entry.get('page_count', 0)
+        if entry.get('duplicate_of'):
+            continue
+        if entry.get('omitted'):
+            entry['merged_file'], entry['start_page'] = '', 0
+            continue
         start_global = global_page + 1
-        # Determine part index for this start page
-        part_idx = 0
-        for idx, boundary in enumerate(boundaries):
-            if start_global <= boundary:
-                part_idx = idx
-                break
-        # Assign merged file name
-        merged_filename = os.path.basename(part_paths[part_idx])
-        entry['merged_file'] = merged_filename
-        # Compute start page relative to the part
-        prev_boundary = boundaries[part_idx - 1] if part_idx > 0 else 0
-        entry['start_page'] = start_global - prev_boundary
-        global_page += pc
+        part_idx = min(bisect_left(boundaries, start_global), last)
+        entry['merged_file'] = names[part_idx]
+        entry['start_page'] = start_global - (boundaries[part_idx - 1] if part_idx else 0)
+        global_page += entry.get('page_count', 0)
+        merged.setdefault(entry.get('sha256'), entry)
+    for entry in index_list:
+        if entry.get('duplicate_of'):
+            canonical = merged.get(entry.get('sha256'))
+            entry['merged_file'] = canonical['merged_file'] if canonical else ''
+            entry['start_page'] = canonical['start_page'] if canonical else 0
 
-# Save email as PDF, convert attachments
-def save_email_as_pdf(item, out_path):
+# Thread key: ConversationID, else the 22-byte thread header of ConversationIndex (44 hex chars)
+def mail_conversation_id(mail):
+    try:
+        conv = getattr(mail, 'ConversationID', '') or ''
+        if not conv:
+            conv = (getattr(mail, 'ConversationIndex', '') or '')[:44]
+        return str(conv)
+    except Exception:
+        return ''
+
+# Plain-data copy of the mail fields used for rendering and the index
+def mail_item_fields(item):
     mail = item
+    # Determine recipients for 'to' field, with fallback for items lacking 'To' attribute
+    if hasattr(mail, 'To'):
+        to_field = mail.To
+    elif hasattr(mail, 'Recipients'):
+        recips = []
+        try:
+            for i in range(1, mail.Recipients.Count + 1):
+                r = mail.Recipients.Item(i)
+                name = getattr(r, 'Name', None)
+                if name:
+                    recips.append(name)
+                else:
+                    addr = getattr(r, 'Address', None)
+                    if addr:
+                        recips.append(addr)
+            to_field = ', '.join(recips)
+        except Exception:
+            to_field = ''
+    else:
+        to_field = ''
+    # Safely extract email metadata fields with fallbacks
+    from_field = getattr(mail, 'SenderName', '') or ''
+    subject_field = getattr(mail, 'Subject', '') or ''
+    # SentOn may not exist (e.g., ReportItem); default to empty
+    sent_on = ''
+    sent_attr = getattr(mail, 'SentOn', None)
+    if sent_attr:
+        try:
+            sent_on = sent_attr.strftime("%Y-%m-%d %H:%M:%S")
+        except Exception:
+            sent_on = ''
+    body_field = getattr(mail, 'Body', '') or ''
+    return {
+        'from': from_field,
+        'to': to_field,
+        'subject': subject_field,
+        'sent': sent_on,
+        'body': body_field,
+        'sender': from_field or getattr(mail, 'SenderEmailAddress', '') or '',
+        'conversation_id': mail_conversation_id(mail)
+    }
+
+# Email page layout: 100-character lines at 12pt leading from y=750 down to y=54
+EMAIL_WRAP_WIDTH = 100
+EMAIL_LINES_PER_PAGE = 59
+# A line up to the width ending at whitespace, or a hard break inside a longer token
+EMAIL_WRAP_RE = re.compile(r'.{1,%d}(?:\s+|$)|\S{%d}' % (EMAIL_WRAP_WIDTH, EMAIL_WRAP_WIDTH))
+
+def wrap_email_text(text):
+    return [l for l in map(str.strip, EMAIL_WRAP_RE.findall(text)) if l]
+
+def email_lines(details):
+    lines = []
+    for h in [
+        f"From: {details['from']}",
+        f"To: {details['to']}",
+        f"Subject: {details['subject']}",
+        f"Sent: {details['sent']}", 'Body:']:
+        lines.extend(wrap_email_text(h))
+    lines.extend(wrap_email_text(details['body']))
+    return lines
+
+# Draw wrapped lines starting on a fresh page; returns the number of pages used
+def draw_email_lines(rlc_canvas, lines):
+    pages = 0
+    for i in range(0, len(lines), EMAIL_LINES_PER_PAGE):
+        text = rlc_canvas.beginText(50, 750)
+        # First page keeps the canvas default font, continuation pages use 10pt
+        if pages:
+            text.setFont('Helvetica', 10, 12)
+        else:
+            text.setLeading(12)
+        for line in lines[i:i + EMAIL_LINES_PER_PAGE]:
+            text.textLine(line)
+        rlc_canvas.drawText(text)
+        rlc_canvas.showPage()
+        pages += 1
+    return pages
+
+# Render email fields (see mail_item_fields) to a PDF; returns the page count, 0 on failure
+@traced('render.email_file')
+def render_email_pdf(details, out_path):
     try:
         rlc_canvas = rlc(out_path, pagesize=letter)
-        # Determine recipients for 'to' field, with fallback for items lacking 'To' attribute
-        if hasattr(mail, 'To'):
-            to_field = mail.To
-        elif hasattr(mail, 'Recipients'):
-            recips = []
-            try:
-                for i in range(1, mail.Recipients.Count + 1):
-                    r = mail.Recipients.Item(i)
-                    name = getattr(r, 'Name', None)
-                    if name:
-                        recips.append(name)
-                    else:
-                        addr = getattr(r, 'Address', None)
-                        if addr:
-                            recips.append(addr)
-                to_field = ', '.join(recips)
-            except Exception:
-                to_field = ''
-        else:
-            to_field = ''
-        # Safely extract email metadata fields with fallbacks
-        from_field = getattr(mail, 'SenderName', '') or ''
-        subject_field = getattr(mail, 'Subject', '') or ''
-        # SentOn may not exist (e.g., ReportItem); default to empty
-        sent_on = ''
-        sent_attr = getattr(mail, 'SentOn', None)
-        if sent_attr:
-            try:
-                sent_on = sent_attr.strftime("%Y-%m-%d %H:%M:%S")
-            except Exception:
-                sent_on = ''
-        body_field = getattr(mail, 'Body', '') or ''
-        details = {
-            'from': from_field,
-            'to': to_field,
-            'subject': subject_field,
-            'sent': sent_on,
-            'body': body_field
-        }
-        y = 750
-        def writeline(txt):
-            nonlocal y
-            for l in re.findall('.{1,100}(?:\\s+|$)', txt):
-                if y < 50:
-                    rlc_canvas.showPage()
-                    rlc_canvas.setFont('Helvetica', 10)
-                    y = 750
-                rlc_canvas.drawString(50, y, l.strip())
-                y -= 12
-        for h in [
-            f"From: {details['from']}",
-            f"To: {details['to']}",
-            f"Subject: {details['subject']}",
-            f"Sent: {details['sent']}", '', 'Body:']:
-            writeline(h)
-        writeline(details['body'])
+        page_count = draw_email_lines(rlc_canvas, email_lines(details))
         rlc_canvas.save()
-        return out_path
+        return page_count
     except Exception as e:
         import traceback
-        log(f"[save_email_as_pdf] FAILED for subject='{mail.Subject}': {e}\n{traceback.format_exc()}")
+        log(f"[render_email_pdf] FAILED for subject='{details.get('subject')}': {e}\n{traceback.format_exc()}", level=logging.ERROR)
+        return 0
+
+# Quoted-history collapsing for email threads
+THREAD_COLLAPSE_STATS = {'messages': 0, 'paragraphs': 0, 'chars': 0}
+# Quote markers at the start of a line ("> ", ">> ")
+QUOTE_PREFIX_RE = re.compile(r'^[ \t]*(?:>[ \t]?)+', re.M)
+PARAGRAPH_SPLIT_RE = re.compile(r'\n[ \t>]*\n')
+MERSENNE_61 = (1 << 61) - 1
+
+class ThreadCollapser:
+    """
+    Drop quoted history from replies. Within one conversation (see
+    mail_item_fields' conversation_id), a body paragraph that was already
+    rendered is replaced by a one-line pointer to the message, and when
+    known the merged file and page, where it first appeared.
+
+    Paragraphs match exactly once whitespace, case and '>' quote markers are
+    normalized, or approximately (re-wrapped or lightly edited quotes) when
+    the Jaccard similarity of their word shingles, estimated with MinHash
+    and bucketed with LSH, reaches threshold. Paragraphs shorter than
+    min_words (greetings, sign-offs) are always kept. Only novel paragraphs
+    are remembered, so state grows with unique content, not with quoting.
+
+    Messages are processed in the order they are rendered: collapse() before
+    drawing, record() once the message's placement is known.
+    """
+    SHINGLE_WORDS = 4
+    PERMUTATIONS = 32
+    BANDS = 8
+
+    def __init__(self, threshold=None, min_words=8):
+        self.threshold = threshold or THREAD_SIMILARITY
+        self.min_words = min_words
+        rows = self.PERMUTATIONS // self.BANDS
+        self.band_slices = [slice(b * rows, (b + 1) * rows) for b in range(self.BANDS)]
+        # Fixed (a, b) pairs for the (a*x + b) mod p hash family
+        self.perms = []
+        for i in range(self.PERMUTATIONS):
+            seed = hashlib.sha256(b'minhash%d' % i).digest()
+            self.perms.append((int.from_bytes(seed[:8], 'big') % (MERSENNE_61 - 1) + 1,
+                               int.from_bytes(seed[8:16], 'big') % MERSENNE_61))
+        # conversation -> {'exact': {paragraph hash: ref}, 'bands': {band key: [(signature, ref)]}}
+        self.threads = {}
+
+    @staticmethod
+    def paragraphs(body):
+        return [p for p in PARAGRAPH_SPLIT_RE.split(body.replace('\r\n', '\n').replace('\r', '\n')) if p.strip()]
+
+    @staticmethod
+    def normalize(paragraph):
+        return QUOTE_PREFIX_RE.sub('', paragraph).lower().split()
+
+    def signature(self, words):
+        k = self.SHINGLE_WORDS
+        shingles = {hash(' '.join(words[i:i + k])) & MERSENNE_61 for i in range(len(words) - k + 1)}
+        return array('Q', [min((a * h + b) % MERSENNE_61 for h in shingles) for a, b in self.perms])
+
+    def similar(self, thread, sig):
+        for b, band in enumerate(self.band_slices):
+            for other, ref in thread['bands'].get((b, sig[band].tobytes()), ()):
+                if sum(x == y for x, y in zip(sig, other)) >= self.threshold * self.PERMUTATIONS:
+                    return ref
         return None
 
-# Convert Office docs to PDF
- 
+    @staticmethod
+    def describe(ref):
+        where = f"message from {ref['sender'] or 'unknown sender'}"
+        if ref['sent']:
+            where += f", sent {ref['sent']}"
+        if ref.get('part'):
+            where += f" (email PDF part {ref['part']}, page {ref['page']})"
+        elif ref.get('page'):
+            where += f" (email PDF page {ref['page']})"
+        return where
 
-def convert_office_to_pdf(path):
-    ext = os.path.splitext(path)[1].lower()
-    output = path.replace(ext, '.pdf')
+    def collapse(self, details):
+        """
+        Return (details to render, pending) with already-seen paragraphs
+        replaced by pointers. Pass pending to record() after rendering.
+        """
+        conv = details.get('conversation_id')
+        if not conv:
+            return details, None
+        thread = self.threads.setdefault(conv, {'exact': {}, 'bands': {}})
+        kept, novel = [], []
+        # Current run of omitted paragraphs, collapsed into one pointer line
+        run = []
+        omitted = 0
+
+        def flush():
+            if run:
+                plural = 's' if len(run) > 1 else ''
+                sources = list({id(ref): ref for ref in run}.values())
+                more = f" and {len(sources) - 1} other message{'s' if len(sources) > 2 else ''}" if len(sources) > 1 else ''
+                kept.append(f"[{len(run)} quoted paragraph{plural} omitted, first shown in {self.describe(sources[0])}{more}]")
+                run.clear()
+
+        for para in self.paragraphs(details['body']):
+            words = self.normalize(para)
+            if len(words) < self.min_words:
+                flush()
+                kept.append(para)
+                continue
+            key = hash(' '.join(words))
+            sig = None
+            ref = thread['exact'].get(key)
+            if ref is None:
+                sig = self.signature(words)
+                ref = self.similar(thread, sig)
+            if ref is not None:
+                run.append(ref)
+                omitted += 1
+                THREAD_COLLAPSE_STATS['paragraphs'] += 1
+                THREAD_COLLAPSE_STATS['chars'] += len(para)
+                continue
+            flush()
+            kept.append(para)
+            novel.append((len(kept) - 1, key, sig))
+        flush()
+        if not omitted:
+            # Nothing quoted: render the body as-is
+            return details, (thread, kept, novel)
+        THREAD_COLLAPSE_STATS['messages'] += 1
+        return dict(details, body='\n\n'.join(kept)), (thread, kept, novel)
+
+    def record(self, pending, details, entry=None, part=None):
+        """
+        Remember the novel paragraphs of a rendered message. entry is its
+        index entry; with 'start_page' set (streamed render) pointers name
+        the page, and part the email PDF part, each paragraph landed on.
+        """
+        if pending is None:
+            return
+        thread, kept, novel = pending
+        placed = entry is not None and 'start_page' in entry
+        if placed:
+            # Line offset of each kept paragraph: wrapping is per line, so paragraphs wrap independently
+            line = len(email_lines(dict(details, body='')))
+            offsets = []
+            for para in kept:
+                offsets.append(line)
+                line += len(wrap_email_text(para))
+        for idx, key, sig in novel:
+            ref = {'sender': details.get('sender') or details.get('from', ''), 'sent': details.get('sent', '')}
+            if placed:
+                ref['part'] = part
+                ref['page'] = entry['start_page'] + offsets[idx] // EMAIL_LINES_PER_PAGE
+            thread['exact'].setdefault(key, ref)
+            if sig is None:
+                continue
+            for b, band in enumerate(self.band_slices):
+                thread['bands'].setdefault((b, sig[band].tobytes()), []).append((sig, ref))
+
+class EmailStreamRenderer:
+    """
+    Draw emails one after another into a single reportlab canvas instead of
+    one file per email, rolling over to a new part before the current one
+    would exceed max_mb (None = never split). An email is never split across
+    parts. Parts are named like merge_pdfs_to_parts: <out_path>_partN.pdf,
+    or out_path itself when everything fits in one.
+
+    add() fills 'merged_file', 'start_page' (1-based) and 'page_count' into
+    the index entry it is given; merged_file is final once close() returns.
+    """
+    # Page object, content stream dictionary and text operators per page
+    PAGE_OVERHEAD_BYTES = 600
+
+    def __init__(self, out_path, max_mb=MAX_SPLIT_SIZE_MB):
+        self.out_path = out_path
+        self.base = os.path.splitext(out_path)[0]
+        self.budget = max_mb * 1024 * 1024 * PDF_SPLIT_SAFETY_MARGIN if max_mb else None
+        self.parts, self.part_page_counts, self.entries = [], [], []
+        self.canvas = None
+        self.pages = 0
+        self.estimate = PDF_PART_OVERHEAD_BYTES
+
+    def part_path(self):
+        return f"{self.base}_part{len(self.parts) + 1}.pdf"
+
+    # Number of the part being drawn, None when the output is never split
+    def part_number(self):
+        return len(self.parts) + 1 if self.budget else None
+
+    def estimate_size(self, lines):
+        # reportlab deflates page streams at a higher level than 1, so this is an
+        # upper bound before its ASCII85 wrapping, which adds a quarter
+        text = '\n'.join(lines).encode('latin-1', 'replace')
+        pages = -(-len(lines) // EMAIL_LINES_PER_PAGE)
+        size = len(zlib.compress(text, 1))
+        if rl_config.useA85:
+            size = size * 5 // 4
+        return size + pages * self.PAGE_OVERHEAD_BYTES
+
+    def close_part(self):
+        path = self.part_path()
+        self.canvas.save()
+        register_doc(path, self.pages, has_text=True)
+        self.parts.append(path)
+        self.part_page_counts.append(self.pages)
+        self.canvas = None
+        self.pages = 0
+        self.estimate = PDF_PART_OVERHEAD_BYTES
+
+    @traced('render.email')
+    def add(self, details, entry):
+        lines = email_lines(details)
+        size = self.estimate_size(lines)
+        if self.canvas is not None and self.budget and self.estimate + size > self.budget:
+            self.close_part()
+        if self.canvas is None:
+            self.canvas = rlc(self.part_path(), pagesize=letter)
+        page_count = draw_email_lines(self.canvas, lines)
+        entry['merged_file'] = os.path.basename(self.part_path())
+        entry['start_page'] = self.pages + 1
+        entry['page_count'] = page_count
+        TRACER.current().set(lines=len(lines), pages=page_count, part=len(self.parts) + 1, estimated_bytes=size)
+        self.pages += page_count
+        self.estimate += size
+        self.entries.append(entry)
+        return entry
+
+    def close(self):
+        if self.canvas is not None:
+            self.close_part()
+        if len(self.parts) == 1:
+            os.replace(self.parts[0], self.out_path)
+            register_doc(self.out_path, self.part_page_counts[0], has_text=True)
+            self.parts[0] = self.out_path
+            for entry in self.entries:
+                entry['merged_file'] = os.path.basename(self.out_path)
+        if self.parts:
+            log(f"Rendered {len(self.entries)} emails into {len(self.parts)} part(s): {self.out_path}")
+        return self.parts
+
+# Save email as PDF, convert attachments
+def save_email_as_pdf(item, out_path):
     try:
+        details = mail_item_fields(item)
+    except Exception as e:
+        log(f"[save_email_as_pdf] FAILED reading item: {e}", level=logging.WARNING)
+        return None
+    page_count = render_email_pdf(details, out_path)
+    if not page_count:
+        return None
+    # Rendered emails always carry a text layer; record them without a parse
+    register_doc(out_path, page_count, has_text=True)
+    return out_path
+
+# Office conversion backends
+# A backend converts one document per convert() call and may keep its
+# application open between calls. Backends run inside converter worker
+# processes (see ConverterPool); report_pid is set by the worker so helper
+# processes such as WINWORD.EXE can be killed with a hung worker.
+class ComOfficeBackend:
+    """Word/Excel over COM, one dedicated instance of each kept open across jobs."""
+    def __init__(self):
+        self.word = None
+        self.excel = None
+        self.report_pid = lambda pid: None
+
+    def start(self):
+        if pythoncom is not None:
+            pythoncom.CoInitialize()
+
+    # Best effort: reading the window handle can itself fail (Protected View, no window)
+    def report_window_pid(self, get_window):
+        try:
+            import win32process
+            self.report_pid(win32process.GetWindowThreadProcessId(get_window().Hwnd)[1])
+        except Exception:
+            pass
+
+    def convert(self, path, output):
+        ext = os.path.splitext(path)[1].lower()
         if ext in WORD_EXTENSIONS:
-            word = win32com.client.Dispatch('Word.Application')
+            if self.word is None:
+                self.word = win32com.client.DispatchEx('Word.Application')
+                self.word.Visible = False
+                self.word.DisplayAlerts = 0
+            doc = self.word.Documents.Open(path, ReadOnly=True, AddToRecentFiles=False)
             try:
-                doc = word.Documents.Open(path)
+                self.report_window_pid(lambda: doc.ActiveWindow)
                 doc.SaveAs(output, FileFormat=17)
-                doc.Close()
             finally:
-                word.Quit()
-                del doc, word
+                doc.Close(False)
         elif ext in EXCEL_EXTENSIONS:
             # Convert Excel workbooks to PDF using Workbook.ExportAsFixedFormat,
             # restricting to used data range to avoid empty colored columns
-            excel = win32com.client.Dispatch('Excel.Application')
-            excel.Visible = False
-            excel.DisplayAlerts = False
+            if self.excel is None:
+                self.excel = win32com.client.DispatchEx('Excel.Application')
+                self.excel.Visible = False
+                self.excel.DisplayAlerts = False
+                self.report_window_pid(lambda: self.excel)
+            # Open workbook in read-only mode
+            wb = self.excel.Workbooks.Open(path, ReadOnly=1)
             try:
-                # Open workbook in read-only mode
-                wb = excel.Workbooks.Open(path, ReadOnly=1)
                 # Set print area on each sheet to used range only
                 for sheet in wb.Sheets:
                     try:
-                        used = sheet.UsedRange
-                        addr = used.Address
-                        sheet.PageSetup.PrintArea = addr
+                        sheet.PageSetup.PrintArea = sheet.UsedRange.Address
                     except Exception:
                         continue
                 # Export workbook to PDF respecting print areas
                 wb.ExportAsFixedFormat(0, output)
-                wb.Close(False)
             finally:
-                excel.Quit()
-                del wb, excel
+                wb.Close(False)
         else:
-            return None
+            raise ValueError(f"Unsupported file type: {ext}")
         return output
-    except Exception as e:
-        log(f"Office convert failed: {e}")
-        return None
 
-# Fetch Outlook mail items
-# Fetch Outlook mail items (search inbox and subfolders for keywords in subject or body)
-# Fetch Outlook mail items
-# Can filter by keywords or fetch all based on config
-def get_all_mail_items(_keywords=None):
-    # Initialize Outlook COM application
-    try:
-        outlook_app = win32com.client.gencache.EnsureDispatch("Outlook.Application")
-    except Exception:
-        outlook_app = win32com.client.Dispatch("Outlook.Application")
-    namespace = outlook_app.GetNamespace("MAPI")
-    # Select mailbox based on configured email address, if provided
-    if OUTLOOK_EMAIL:
-        # Retrieve Accounts as iterable (handles COM collection)
-        try:
-            accounts = list(namespace.Accounts)
-        except (TypeError, AttributeError):
-            accounts = []
-            try:
-                count = namespace.Accounts.Count
-                for i in range(1, count + 1):
-                    accounts.append(namespace.Accounts.Item(i))
-            except Exception:
-                accounts = []
-        # Find matching account by SMTP address
-        account = None
-        for acc in accounts:
-            try:
-                smtp = getattr(acc, 'SmtpAddress', '') or ''
-            except Exception:
-                smtp = ''
-            if smtp.lower() == OUTLOOK_EMAIL.lower():
-                account = acc
-                break
-        if account:
-            inbox = account.DeliveryStore.GetDefaultFolder(6)
-        else:
-            inbox = namespace.GetDefaultFolder(6)
-    else:
-        inbox = namespace.GetDefaultFolder(6)
-    def search_folder(folder):
-        items = []
-        # Safely get items in folder
-        try:
-            all_items = list(folder.Items)
-        except Exception as e:
-            log(f"Error accessing items in folder {folder.Name}: {e}")
-            all_items = []
-        for item in all_items:
-            # Skip items older than configured days back
-            if LIMIT_TO_DAYS_BACK > 0:
-                sent_attr = getattr(item, 'SentOn', None)
-                if not sent_attr:
-                    continue
+    def stop(self):
+        for app in (self.word, self.excel):
+            if app is not None:
                 try:
-                    if (datetime.now() - sent_attr).days > LIMIT_TO_DAYS_BACK:
-                        continue
+                    app.Quit()
                 except Exception:
-                    continue
+                    pass
+        self.word = self.excel = None
+        if pythoncom is not None:
+            pythoncom.CoUninitialize()
+
+class StubConverterBackend:
+    """
+    Stand-in converter for tests and benchmarks on machines without Office:
+    writes a one-page PDF naming the source file. startup_delay and delay
+    (seconds) model application launch and per-document conversion time;
+    files whose name contains hang_marker never finish, to exercise timeouts.
+    """
+    def __init__(self, startup_delay=0.0, delay=0.0, hang_marker=None):
+        self.startup_delay = startup_delay
+        self.delay = delay
+        self.hang_marker = hang_marker
+        self.report_pid = lambda pid: None
+
+    def start(self):
+        time.sleep(self.startup_delay)
+
+    def convert(self, path, output):
+        if self.hang_marker and self.hang_marker in os.path.basename(path):
+            while True:
+                time.sleep(60)
+        time.sleep(self.delay)
+        rlc_canvas = rlc(output, pagesize=letter)
+        rlc_canvas.drawString(50, 750, f"Converted from {os.path.basename(path)}")
+        rlc_canvas.save()
+        return output
+
+    def stop(self):
+        pass
+
+class NativeOfficeBackend:
+    """
+    Word/Excel conversion without Office, for Linux workers: python-docx for
+    .docx and openpyxl for .xlsx/.xlsm, drawn as plain text through
+    reportlab. Paragraphs keep their order with tables (one line per row),
+    and sheets are written one row per line, so the output stays searchable.
+
+    Workbooks are opened in openpyxl's read-only mode and streamed row by
+    row. Each sheet stops at max_rows rows, max_cols columns or max_pages
+    pages (documents at max_pages), and cells are cut at max_cell_chars, so
+    memory and output size are bounded however large the workbook is. A note
+    is drawn wherever content was cut. Legacy .doc/.xls need the com backend.
+    """
+    PAGE_TOP = 750
+    PAGE_BOTTOM = 50
+    LEADING = 11
+
+    def __init__(self, max_rows=None, max_cols=None, max_pages=None, max_cell_chars=200, width=110):
+        self.max_rows = max_rows or NATIVE_MAX_ROWS
+        self.max_cols = max_cols or NATIVE_MAX_COLS
+        self.max_pages = max_pages or NATIVE_MAX_PAGES
+        self.max_cell_chars = max_cell_chars
+        self.width = width
+        self.wrap_re = re.compile(r'.{1,%d}(?:\s+|$)|\S{%d}' % (width, width))
+        self.report_pid = lambda pid: None
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def convert(self, path, output):
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.docx':
+            if docx is None:
+                raise RuntimeError("python-docx is not installed")
+            convert = self.convert_docx
+        elif ext in ('.xlsx', '.xlsm'):
+            if openpyxl is None:
+                raise RuntimeError("openpyxl is not installed")
+            convert = self.convert_xlsx
+        else:
+            raise ValueError(f"{ext} files need the com converter backend")
+        rlc_canvas = rlc(output, pagesize=letter)
+        self.canvas = rlc_canvas
+        self.y = None
+        self.pages = 0
+        try:
+            convert(path)
+            if self.y is None:
+                # Empty document: still produce a valid one-page PDF
+                self.new_page()
+            rlc_canvas.save()
+        finally:
+            self.canvas = None
+        return output
+
+    def new_page(self):
+        if self.y is not None:
+            self.canvas.showPage()
+        self.canvas.setFont('Helvetica', 9)
+        self.y = self.PAGE_TOP
+        self.pages += 1
+
+    # Draw one logical line, wrapped; returns False once the page cap is reached
+    def line(self, text, font='Helvetica'):
+        for part in [l for l in map(str.strip, self.wrap_re.findall(text)) if l] or ['']:
+            if self.y is None or self.y < self.PAGE_BOTTOM:
+                if self.pages >= self.max_pages:
+                    return False
+                self.new_page()
+            self.canvas.setFont(font, 9)
+            self.canvas.drawString(50, self.y, part)
+            self.y -= self.LEADING
+        return True
+
+    def note(self, text):
+        # Cap notes may go one line past the page limit
+        if self.y is None or self.y < self.PAGE_BOTTOM:
+            self.new_page()
+        self.canvas.setFont('Helvetica-Oblique', 9)
+        self.canvas.drawString(50, self.y, text)
+        self.y -= self.LEADING
+
+    def convert_docx(self, path):
+        from docx.table import Table
+        from docx.text.paragraph import Paragraph
+        document = docx.Document(path)
+        for child in document.element.body.iterchildren():
+            tag = child.tag.rsplit('}', 1)[-1]
+            if tag == 'p':
+                para = Paragraph(child, document)
+                style = getattr(para.style, 'name', '') or ''
+                ok = self.line(para.text, 'Helvetica-Bold' if style.startswith(('Heading', 'Title')) else 'Helvetica')
+            elif tag == 'tbl':
+                ok = True
+                for row in Table(child, document).rows:
+                    cells = [c.text.strip()[:self.max_cell_chars] for c in row.cells[:self.max_cols]]
+                    ok = self.line(' | '.join(cells))
+                    if not ok:
+                        break
+            else:
+                continue
+            if not ok:
+                self.note(f"[Truncated at {self.max_pages} pages]")
+                return
+
+    def convert_xlsx(self, path):
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            for ws in wb.worksheets:
+                self.pages = 0
+                if self.y is not None:
+                    # Each sheet starts on its own page
+                    self.y = self.PAGE_BOTTOM - 1
+                self.line(f"Sheet: {ws.title}", 'Helvetica-Bold')
+                rows = 0
+                wide = False
+                for values in ws.iter_rows(max_col=self.max_cols + 1, values_only=True):
+                    if rows >= self.max_rows:
+                        self.note(f"[Sheet truncated at {self.max_rows} rows]")
+                        break
+                    rows += 1
+                    if len(values) > self.max_cols:
+                        wide = wide or values[self.max_cols] is not None
+                        values = values[:self.max_cols]
+                    # Trim empty trailing cells; skip fully empty rows
+                    cells = ['' if v is None else str(v)[:self.max_cell_chars] for v in values]
+                    while cells and not cells[-1]:
+                        cells.pop()
+                    if cells and not self.line(' | '.join(cells)):
+                        self.note(f"[Sheet truncated at {self.max_pages} pages]")
+                        break
+                if wide:
+                    self.note(f"[Columns beyond {self.max_cols} omitted]")
+        finally:
+            wb.close()
+
+CONVERTER_BACKENDS = {'com': ComOfficeBackend, 'native': NativeOfficeBackend, 'stub': StubConverterBackend}
+
+# Converter worker process: build the backend once, then serve jobs until told to stop
+def converter_worker(backend_name, backend_options, conn):
+    backend = CONVERTER_BACKENDS[backend_name](**backend_options)
+    backend.report_pid = lambda pid: conn.send(('pid', pid))
+    backend.start()
+    conn.send(('ready', None))
+    try:
+        while True:
+            job = conn.recv()
+            if job is None:
+                break
+            path, output = job
             try:
-                subj = (item.Subject or "").lower()
-                # prefer plaintext body, fallback to HTMLBody for HTML-only messages
-                raw_body = (getattr(item, "Body", "") or "").strip()
-                if not raw_body:
-                    raw_body = (getattr(item, "HTMLBody", "") or "")
-                body = raw_body.lower()
-                # Include all if not limiting to keywords, else filter
-                if (not PROCESS_ONLY_WITH_KEYWORDS) or any(kw in subj or kw in body for kw in keywords):
-                    items.append(item)
+                conn.send(('ok', backend.convert(path, output)))
             except Exception as e:
-                log(f"Error processing item in folder {folder.Name}: {e}")
-        # Recursively search subfolders
-        for sub in folder.Folders:
-            if sub.Name.lower() not in EXCLUDED_FOLDERS:
-                items.extend(search_folder(sub))
-        return items
-    return search_folder(inbox)
+                conn.send(('error', str(e)))
+    except EOFError:
+        pass
+    finally:
+        backend.stop()
 
-# Process emails and attachments
-def process_emails():
-    # Collect metadata for index
-    global EMAIL_INDEX_LIST, ATTACHMENT_INDEX_LIST
-    EMAIL_INDEX_LIST.clear()
-    ATTACHMENT_INDEX_LIST.clear()
-    items = get_all_mail_items(keywords)
-    email_pdfs = []
-    attachments = []
-    # Export matching emails to PDF with progress bar
-    for itm in tqdm(items,
-                      desc="Exporting Emails",
-                      unit='email', position=1, leave=True):
-        # Export email to PDF and record metadata
-        out = save_email_as_pdf(
-            itm,
-            os.path.join(EMAIL_SAVE_PATH, f"email_{random.randint(1000,9999)}.pdf"),
-        )
-        if out and is_valid_pdf(out):
-            email_pdfs.append(out)
-            # Extract email metadata
-            subject = getattr(itm, 'Subject', '') or ''
-            sender = getattr(itm, 'SenderName', '') or getattr(itm, 'SenderEmailAddress', '') or ''
-            sent_attr = getattr(itm, 'SentOn', None)
-            sent_on = ''
-            if sent_attr:
-                try:
-                    sent_on = sent_attr.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    sent_on = ''
-            EMAIL_INDEX_LIST.append({
-                'source_filename': os.path.basename(out),
-                'email_subject': subject,
-                'sender': sender,
-                'sent_on': sent_on
-            })
-        for att in itm.Attachments:
-            fn = att.FileName
-            ext = os.path.splitext(fn)[1].lower()
+class ConverterPool:
+    """
+    Long-lived Office conversion workers. Each worker process keeps its
+    backend (and so its Word/Excel instance) warm and takes one job at a
+    time; convert() blocks the calling thread until its job is done, so up
+    to `workers` threads convert concurrently.
+
+    A worker is retired after max_jobs conversions to bound leaks in the
+    Office applications. A job that runs past timeout seconds kills only its
+    own worker (and any helper processes it reported); a replacement is
+    started on demand.
+    """
+    def __init__(self, workers=None, backend=None, max_jobs=None, timeout=None, backend_options=None):
+        self.workers = workers or CONVERTER_WORKERS
+        self.backend = backend or CONVERTER_BACKEND
+        self.max_jobs = max_jobs or CONVERTER_MAX_JOBS
+        self.timeout = timeout or CONVERSION_TIMEOUT
+        self.backend_options = backend_options or {}
+        if self.backend not in CONVERTER_BACKENDS:
+            raise ValueError(f"Unknown converter backend: {self.backend}")
+        self.cond = threading.Condition()
+        self.idle = []
+        self.live = 0
+        self.stats = {'converted': 0, 'failed': 0, 'timeouts': 0, 'started': 0, 'recycled': 0}
+
+    def spawn(self):
+        conn, child_conn = multiprocessing.Pipe()
+        proc = multiprocessing.Process(target=converter_worker, args=(self.backend, self.backend_options, child_conn),
+                                       name='office-converter', daemon=True)
+        proc.start()
+        child_conn.close()
+        worker = {'proc': proc, 'conn': conn, 'jobs': 0, 'pids': set()}
+        # Application startup gets its own timeout rather than eating into the first job's
+        try:
+            if not conn.poll(self.timeout) or conn.recv()[0] != 'ready':
+                raise TimeoutError(f"converter worker did not start within {self.timeout}s")
+        except (EOFError, OSError, TimeoutError):
+            self.kill(worker)
+            raise
+        self.count('started')
+        return worker
+
+    def acquire(self):
+        with self.cond:
+            while True:
+                if self.idle:
+                    return self.idle.pop()
+                if self.live < self.workers:
+                    self.live += 1
+                    break
+                self.cond.wait()
+        try:
+            return self.spawn()
+        except Exception:
+            self.release(None)
+            raise
+
+    # Return a worker to the idle list, or give up its slot (None)
+    def release(self, worker):
+        with self.cond:
+            if worker is None:
+                self.live -= 1
+            else:
+                self.idle.append(worker)
+            self.cond.notify()
+
+    def kill(self, worker):
+        for pid in worker['pids']:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        worker['proc'].kill()
+        worker['proc'].join(5)
+        worker['conn'].close()
+
+    def retire(self, worker):
+        try:
+            worker['conn'].send(None)
+        except OSError:
+            pass
+        worker['proc'].join(10)
+        if worker['proc'].is_alive():
+            self.kill(worker)
+        else:
+            worker['conn'].close()
+
+    @traced('convert.office')
+    def convert(self, path):
+        name = os.path.basename(path)
+        output = os.path.splitext(path)[0] + '.pdf'
+        TRACER.current().set(file=name, bytes=os.path.getsize(path), backend=self.backend)
+        worker = self.acquire()
+        try:
+            worker['conn'].send((path, output))
+            deadline = time.monotonic() + self.timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not worker['conn'].poll(remaining):
+                    raise TimeoutError
+                status, value = worker['conn'].recv()
+                if status != 'pid':
+                    break
+                worker['pids'].add(value)
+        except TimeoutError:
+            log(f"Office conversion timed out after {self.timeout}s, restarting its worker: {name}", level=logging.WARNING)
+            self.count('timeouts')
+            self.kill(worker)
+            self.release(None)
+            return None
+        except (EOFError, OSError) as e:
+            log(f"Office converter worker exited while converting {name}: {e}", level=logging.WARNING)
+            self.count('failed')
+            self.kill(worker)
+            self.release(None)
+            return None
+        worker['jobs'] += 1
+        if worker['jobs'] >= self.max_jobs:
+            self.count('recycled')
+            self.retire(worker)
+            self.release(None)
+        else:
+            self.release(worker)
+        if status != 'ok':
+            log(f"Office convert failed for {name}: {value}", level=logging.WARNING)
+            self.count('failed')
+            return None
+        self.count('converted')
+        return value
+
+    def count(self, key):
+        with self.cond:
+            self.stats[key] += 1
+
+    def close(self):
+        with self.cond:
+            idle, self.idle = self.idle, []
+            self.live -= len(idle)
+        for worker in idle:
+            self.retire(worker)
+
+    def summary(self):
+        s = self.stats
+        return (f"Office conversion ({self.backend}): {s['converted']} converted, {s['failed']} failed, "
+                f"{s['timeouts']} timed out; {s['started']} workers started, {s['recycled']} recycled")
+
+CONVERTER_POOL = None
+CONVERTER_POOL_LOCK = threading.Lock()
+
+def get_converter_pool():
+    global CONVERTER_POOL
+    with CONVERTER_POOL_LOCK:
+        if CONVERTER_POOL is None:
+            CONVERTER_POOL = ConverterPool()
+        return CONVERTER_POOL
+
+def close_converter_pool():
+    if CONVERTER_POOL is not None:
+        CONVERTER_POOL.close()
+
+# Convert Office docs to PDF through the shared converter pool; returns the PDF path or None
+def convert_office_to_pdf(path):
+    return get_converter_pool().convert(path)
+
+# Multi-keyword matcher
+class KeywordMatcher:
+    """
+    Match all keywords against a text in a single scan and report which ones
+    occur, in keyword order.
+
+    whole_word: a keyword only matches when not touching other word characters.
+    phrase: whitespace inside a keyword matches any run of whitespace
+    (spaces, tabs, line breaks) in the text.
+
+    Uses a pyahocorasick automaton when installed. Otherwise substring mode
+    falls back to one str.find per keyword, which CPython runs in C and is
+    faster than a pure-Python automaton. The whole-word and phrase modes
+    fall back to a single regex compiled from a trie of the keywords.
+    """
+    def __init__(self, _keywords, whole_word=False, phrase=False):
+        self.whole_word = whole_word
+        self.phrase = phrase
+        norm = (lambda k: ' '.join(k.lower().split())) if phrase else (lambda k: k.lower())
+        # Normalized form -> keywords as configured; several can share one ('b a' and 'b  a' in phrase mode)
+        self.keywords = {}
+        # (normalized form, keyword) for every distinct keyword, in configured order
+        self.ordered = []
+        for kw in _keywords:
+            key = norm(kw)
+            if key and kw not in self.keywords.setdefault(key, []):
+                self.keywords[key].append(kw)
+                self.ordered.append((key, kw))
+        self.automaton = None
+        self.regex = None
+        if not self.keywords:
+            return
+        if ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for k in self.keywords:
+                self.automaton.add_word(k, k)
+            self.automaton.make_automaton()
+        elif whole_word or phrase:
+            # Lookahead so overlapping matches are all seen; longest match wins at each start
+            pattern = self.trie_pattern(self.keywords, phrase)
+            if whole_word:
+                pattern = r'(?<!\w)' + pattern + r'(?!\w)'
+            self.regex = re.compile('(?=(' + pattern + '))')
+            # The regex reports the longest keyword at each position; keywords
+            # contained in it are implied matches
+            self.contained = {}
+            for k in self.keywords:
+                for other in self.keywords:
+                    if other != k and other in k and (not whole_word or re.search(
+                            r'(?<!\w)' + re.escape(other) + r'(?!\w)', k)):
+                        self.contained.setdefault(k, []).append(other)
+
+    @staticmethod
+    def trie_pattern(words, phrase=False):
+        trie = {}
+        for word in words:
+            node = trie
+            for ch in word:
+                node = node.setdefault(ch, {})
+            node[''] = {}
+        def build(node):
+            alts = [(r'\s+' if phrase and ch == ' ' else re.escape(ch)) + build(child)
+                    for ch, child in node.items() if ch]
+            if not alts:
+                return ''
+            body = alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+            return '(?:' + body + ')?' if '' in node else body
+        return build(trie)
+
+    def find(self, *texts):
+        found = set()
+        for text in texts:
+            if not text or len(found) == len(self.keywords):
+                continue
+            text = text.lower()
+            if self.phrase:
+                text = ' '.join(text.split())
+            if self.automaton is not None:
+                for end, k in self.automaton.iter(text):
+                    if k in found:
+                        continue
+                    start = end - len(k) + 1
+                    if self.whole_word and ((start > 0 and (text[start - 1].isalnum() or text[start - 1] == '_'))
+                                            or (end + 1 < len(text) and (text[end + 1].isalnum() or text[end + 1] == '_'))):
+                        continue
+                    found.add(k)
+            elif self.regex is not None:
+                for m in self.regex.finditer(text):
+                    found.add(' '.join(m.group(1).split()) if self.phrase else m.group(1))
+            else:
+                found.update(k for k in self.keywords if k not in found and k in text)
+        if self.regex is not None:
+            for k in list(found):
+                found.update(self.contained.get(k, ()))
+        return [kw for k, kw in self.ordered if k in found]
+
+def build_keyword_matcher(_keywords=None):
+    return KeywordMatcher(keywords if _keywords is None else _keywords, KEYWORD_WHOLE_WORD, KEYWORD_PHRASE_MATCH)
+
+# Plain-text body, falling back to HTMLBody for HTML-only messages
+def item_body_text(item):
+    raw_body = (getattr(item, "Body", "") or "").strip()
+    if not raw_body:
+        raw_body = (getattr(item, "HTMLBody", "") or "")
+    return raw_body
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+# Incremental export state
+# Per-project record of which Outlook items (by EntryID + LastModificationTime)
+# matched the search and which artifacts were exported for them, so later runs
+# only render, convert and OCR new or modified items.
+RUN_STATE_CONN = None
+RUN_STATE_LOCK = threading.Lock()
+RUN_STATE_STATS = {'reused': 0, 'exported': 0, 'match_hits': 0, 'ocr_reused': 0}
+
+def run_state_dir():
+    return os.path.join(BASE_FOLDER, '.run_state')
+
+# Settings that change which items match or what gets exported for them
+def run_state_fingerprint():
+    return json.dumps([__version__, keywords, KEYWORD_WHOLE_WORD, KEYWORD_PHRASE_MATCH, PROCESS_ONLY_WITH_KEYWORDS,
+                       list(ALLOWED_ATTACHMENT_EXTENSIONS), CONVERT_OFFICE_DOCS, MAX_ATTACHMENT_SIZE_MB,
+                       STREAM_EMAIL_RENDER, COLLAPSE_THREADS, THREAD_SIMILARITY, CORPUS_ENABLE])
+
+def run_state_connect():
+    global RUN_STATE_CONN
+    with RUN_STATE_LOCK:
+        if RUN_STATE_CONN is None:
+            os.makedirs(run_state_dir(), exist_ok=True)
+            conn = sqlite3.connect(os.path.join(run_state_dir(), 'state.sqlite'), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS items ("
+                         "entry_id TEXT PRIMARY KEY, last_modified TEXT, matched INTEGER, "
+                         "email_pdf TEXT, email_index TEXT, attachments TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS drive_files ("
+                         "file_id TEXT PRIMARY KEY, name TEXT, md5 TEXT, modified TEXT, size INTEGER, stored TEXT)")
+            fingerprint = run_state_fingerprint()
+            row = conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            if row and row[0] != fingerprint:
+                log("Search settings changed since the last run; discarding incremental export state")
+                conn.execute("DELETE FROM items")
+                shutil.rmtree(os.path.join(run_state_dir(), 'artifacts'), ignore_errors=True)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)", (fingerprint,))
+            conn.commit()
+            RUN_STATE_CONN = conn
+    return RUN_STATE_CONN
+
+def run_state_commit():
+    if RUN_STATE_CONN is not None:
+        with RUN_STATE_LOCK:
+            RUN_STATE_CONN.commit()
+
+def item_state_key(item):
+    try:
+        return item.EntryID, str(item.LastModificationTime)
+    except Exception:
+        return None, None
+
+# Per-item folder holding the exported email PDF and its attachments
+def run_state_item_dir(entry_id):
+    digest = hashlib.sha1(entry_id.encode('utf-8')).hexdigest()[:20]
+    return os.path.join(run_state_dir(), 'artifacts', digest)
+
+# Known keyword-match result for an unchanged item, or None if it must be checked
+def run_state_match(entry_id, modified):
+    conn = run_state_connect()
+    with RUN_STATE_LOCK:
+        row = conn.execute("SELECT last_modified, matched FROM items WHERE entry_id = ?", (entry_id,)).fetchone()
+        known = row is not None and row[0] == modified and row[1] is not None
+        if known:
+            RUN_STATE_STATS['match_hits'] += 1
+    return bool(row[1]) if known else None
+
+def run_state_record_match(entry_id, modified, matched):
+    conn = run_state_connect()
+    with RUN_STATE_LOCK:
+        row = conn.execute("SELECT last_modified FROM items WHERE entry_id = ?", (entry_id,)).fetchone()
+        if row and row[0] == modified:
+            conn.execute("UPDATE items SET matched = ? WHERE entry_id = ?", (int(matched), entry_id))
+        else:
+            # New or modified item: any earlier artifacts are stale
+            conn.execute("INSERT OR REPLACE INTO items (entry_id, last_modified, matched) VALUES (?, ?, ?)",
+                         (entry_id, modified, int(matched)))
+
+# Artifacts exported for an unchanged item, or None if it has to be exported again
+def run_state_cached_export(entry_id, modified):
+    conn = run_state_connect()
+    with RUN_STATE_LOCK:
+        row = conn.execute("SELECT last_modified, email_pdf, email_index, attachments FROM items "
+                           "WHERE entry_id = ?", (entry_id,)).fetchone()
+    if not row or row[0] != modified or not row[1]:
+        return None
+    base = run_state_dir()
+    email_pdf = os.path.join(base, row[1])
+    atts = json.loads(row[3] or '[]')
+    for att in atts:
+        att['pdf_path'] = os.path.join(base, att['pdf_path'])
+        # OCR output from an earlier run, usable while the OCR settings are the same
+        ocr_path = att.pop('ocr_path', None)
+        if ocr_path and att.pop('ocr_settings', None) == run_state_ocr_settings():
+            ocr_path = os.path.join(base, ocr_path)
+            if os.path.exists(ocr_path):
+                att['ocr_path'] = ocr_path
+    if not os.path.exists(email_pdf) or not all(os.path.exists(a['pdf_path']) for a in atts):
+        return None
+    email_index = json.loads(row[2])
+    email_index['source_path'] = email_pdf
+    return {'email_pdf': email_pdf, 'email_index': email_index, 'attachments': atts}
+
+# Record the artifacts exported for an item; paths are stored relative to the state folder
+def run_state_save_export(entry_id, modified, email_pdf, email_index, attachments):
+    conn = run_state_connect()
+    base = run_state_dir()
+    stored_atts = [dict(a, pdf_path=os.path.relpath(a['pdf_path'], base),
+                        index={k: v for k, v in a['index'].items() if k != 'source_path'}) for a in attachments]
+    stored_index = {k: v for k, v in email_index.items() if k != 'source_path'}
+    with RUN_STATE_LOCK:
+        conn.execute("INSERT OR REPLACE INTO items (entry_id, last_modified, matched, email_pdf, email_index, attachments) "
+                     "VALUES (?, ?, 1, ?, ?, ?)",
+                     (entry_id, modified, os.path.relpath(email_pdf, base),
+                      json.dumps(stored_index), json.dumps(stored_atts)))
+        RUN_STATE_STATS['exported'] += 1
+
+def run_state_ocr_settings():
+    return f"required={OCR_REQUIRED}|{ocr_settings()}"
+
+# Store the OCR output of each exported attachment with its item, so unchanged items skip OCR next run
+def run_state_record_ocr(outcomes):
+    conn = run_state_connect()
+    base = run_state_dir()
+    settings = run_state_ocr_settings()
+    with RUN_STATE_LOCK:
+        rows = conn.execute("SELECT entry_id, attachments FROM items WHERE attachments IS NOT NULL").fetchall()
+        for entry_id, stored in rows:
+            atts = json.loads(stored)
+            changed = False
+            for att in atts:
+                output = outcomes.get(os.path.join(base, att['pdf_path']))
+                # Only outputs kept in the item's artifact folder outlive the run
+                if not output or not os.path.abspath(output).startswith(os.path.join(base, '')):
+                    continue
+                ocr_path = os.path.relpath(output, base)
+                if att.get('ocr_path') != ocr_path or att.get('ocr_settings') != settings:
+                    att['ocr_path'], att['ocr_settings'] = ocr_path, settings
+                    changed = True
+            if changed:
+                conn.execute("UPDATE items SET attachments = ? WHERE entry_id = ?", (json.dumps(atts), entry_id))
+        conn.commit()
+
+# DASL property names used for server-side filtering
+DASL_SENT_ON = 'urn:schemas:httpmail:date'
+DASL_SUBJECT = 'urn:schemas:httpmail:subject'
+DASL_BODY = 'urn:schemas:httpmail:textdescription'
+# Characters that are wildcards in DASL LIKE patterns; keywords containing them are checked in Python
+DASL_WILDCARDS = ('%', '_', '[', ']')
+
+def build_dasl_filter(_keywords, days_back=None, now=None):
+    """
+    Build an Outlook '@SQL=' filter for the date window and keyword match.
+
+    Returns (filter, keywords_applied). filter is None when there is nothing
+    to restrict on; keywords_applied is False when the keyword match could
+    not be expressed in DASL and still has to be done in Python.
+    """
+    if days_back is None:
+        days_back = LIMIT_TO_DAYS_BACK
+    clauses = []
+    if days_back > 0:
+        # DASL compares in UTC; widen by a day and let the Python check apply the exact window
+        since = (now or datetime.now()) - timedelta(days=days_back + 1)
+        clauses.append(f"\"{DASL_SENT_ON}\" >= '{since:%m/%d/%Y %I:%M %p}'")
+    keywords_applied = False
+    # Phrase mode matches across arbitrary whitespace, which LIKE can't express
+    if (PROCESS_ONLY_WITH_KEYWORDS and _keywords and not KEYWORD_PHRASE_MATCH
+            and not any(c in kw for kw in _keywords for c in DASL_WILDCARDS)):
+        terms = []
+        for kw in _keywords:
+            q = kw.replace("'", "''")
+            for prop in (DASL_SUBJECT, DASL_BODY):
+                if DASL_KEYWORD_MATCH == 'phrasematch':
+                    terms.append(f"\"{prop}\" ci_phrasematch '{q}'")
+                else:
+                    terms.append(f"\"{prop}\" LIKE '%{q}%'")
+        clauses.append('(' + ' OR '.join(terms) + ')')
+        keywords_applied = True
+    if not clauses:
+        return None, False
+    return '@SQL=' + ' AND '.join(clauses), keywords_applied
+
+# Mail source backed by the Outlook COM object model
+class OutlookMailSource:
+    """
+    Thin wrapper over an Outlook MAPI namespace, used by get_all_mail_items.
+    Any object with the same methods can stand in for it (see
+    benchmarks/fakes.py for an in-memory Outlook used on Linux).
+    """
+    def __init__(self, application=None, email=OUTLOOK_EMAIL):
+        if application is None:
+            # Initialize Outlook COM application
+            try:
+                application = win32com.client.gencache.EnsureDispatch("Outlook.Application")
+            except Exception:
+                application = win32com.client.Dispatch("Outlook.Application")
+        self.namespace = application.GetNamespace("MAPI")
+        self.email = email
+
+    def root_folder(self):
+        namespace = self.namespace
+        # Select mailbox based on configured email address, if provided
+        if not self.email:
+            return namespace.GetDefaultFolder(6)
+        # Retrieve Accounts as iterable (handles COM collection)
+        try:
+            accounts = list(namespace.Accounts)
+        except (TypeError, AttributeError):
+            accounts = []
+            try:
+                count = namespace.Accounts.Count
+                for i in range(1, count + 1):
+                    accounts.append(namespace.Accounts.Item(i))
+            except Exception:
+                accounts = []
+        # Find matching account by SMTP address
+        for acc in accounts:
+            try:
+                smtp = getattr(acc, 'SmtpAddress', '') or ''
+            except Exception:
+                smtp = ''
+            if smtp.lower() == self.email.lower():
+                return acc.DeliveryStore.GetDefaultFolder(6)
+        return namespace.GetDefaultFolder(6)
+
+    def subfolders(self, folder):
+        return list(folder.Folders)
+
+    def all_items(self, folder):
+        # Walk the collection's enumerator rather than copying it into a list
+        return iter(folder.Items)
+
+    def find_entry_ids(self, folder, dasl):
+        # Let the store evaluate the filter and return only EntryIDs, so no
+        # item properties cross the COM boundary for non-matching items.
+        # The table is opened here (so a bad filter fails now) and read lazily.
+        table = folder.GetTable(dasl, 0)
+        table.Columns.RemoveAll()
+        table.Columns.Add('EntryID')
+        def rows():
+            while not table.EndOfTable:
+                yield table.GetNextRow().GetValues()[0]
+        return rows()
+
+    def get_item(self, entry_id, folder):
+        return self.namespace.GetItemFromID(entry_id, folder.StoreID)
+
+# Mailbox enumeration counters for the summary; peak_inflight is the most snapshots held at once
+# Written by the enumerator thread only, except peak_inflight (the collecting thread's)
+ENUMERATION_STATS = {'folders': 0, 'scanned': 0, 'matched': 0, 'peak_inflight': 0}
+
+# Fetch Outlook mail items (search inbox and subfolders for keywords in subject or body)
+# Can filter by keywords or fetch all based on config
+def get_all_mail_items(_keywords=None, source=None):
+    """
+    Yield matching mail items folder by folder (depth first). Items are read
+    off Outlook only as the caller asks for the next one, so no folder is
+    held in memory and each COM item can be released once it is consumed.
+    """
+    if _keywords is None:
+        _keywords = keywords
+    if source is None:
+        source = OutlookMailSource()
+    inbox = source.root_folder()
+    dasl, keywords_applied = build_dasl_filter(_keywords) if SERVER_SIDE_FILTER else (None, False)
+    matcher = build_keyword_matcher(_keywords)
+    def fetch_items(entry_ids, folder):
+        for eid in entry_ids:
+            try:
+                yield source.get_item(eid, folder)
+            except Exception as e:
+                log(f"Error fetching item in folder {folder.Name}: {e}", level=logging.WARNING)
+    def guarded(candidates, folder):
+        # A collection that fails part-way ends that folder, not the whole search
+        candidates = iter(candidates)
+        while True:
+            try:
+                item = next(candidates)
+            except StopIteration:
+                return
+            except Exception as e:
+                log(f"Error accessing items in folder {folder.Name}: {e}", level=logging.WARNING)
+                return
+            yield item
+    def search_folder(folder):
+        ENUMERATION_STATS['folders'] += 1
+        server_matched = False
+        candidates = None
+        # Let Outlook filter the folder when possible
+        if dasl:
+            try:
+                entry_ids = source.find_entry_ids(folder, dasl)
+                candidates = fetch_items(entry_ids, folder)
+                # LIKE is a substring match; whole-word mode still needs checking in Python
+                server_matched = keywords_applied and not KEYWORD_WHOLE_WORD
+            except Exception as e:
+                log(f"Server-side filter unavailable for folder {folder.Name}, filtering in Python: {e}")
+        # Safely get items in folder
+        if candidates is None:
+            try:
+                candidates = source.all_items(folder)
+            except Exception as e:
+                log(f"Error accessing items in folder {folder.Name}: {e}", level=logging.WARNING)
+                candidates = []
+        for item in guarded(candidates, folder):
+            ENUMERATION_STATS['scanned'] += 1
+            # Skip items older than configured days back
+            if LIMIT_TO_DAYS_BACK > 0:
+                sent_attr = getattr(item, 'SentOn', None)
+                if not sent_attr:
+                    continue
+                try:
+                    if (datetime.now() - sent_attr).days > LIMIT_TO_DAYS_BACK:
+                        continue
+                except Exception:
+                    continue
+            matched = server_matched
+            if not matched:
+                try:
+                    # Unchanged items reuse last run's match result without reading the body
+                    entry_id, modified = item_state_key(item) if INCREMENTAL_EXPORT else (None, None)
+                    known = run_state_match(entry_id, modified) if entry_id else None
+                    if known is not None:
+                        matched = known
+                    else:
+                        # Include all if not limiting to keywords, else filter
+                        matched = (not PROCESS_ONLY_WITH_KEYWORDS) or bool(matcher.find(item.Subject or "", item_body_text(item)))
+                        if entry_id:
+                            run_state_record_match(entry_id, modified, matched)
+                except Exception as e:
+                    log(f"Error processing item in folder {folder.Name}: {e}", level=logging.WARNING)
+            if matched:
+                ENUMERATION_STATS['matched'] += 1
+                yield item
+        # Recursively search subfolders
+        for sub in source.subfolders(folder):
+            if sub.Name.lower() not in EXCLUDED_FOLDERS:
+                yield from search_folder(sub)
+    yield from search_folder(inbox)
+
+# Pick a free file name for a saved attachment. Office documents also claim
+# the name of their converted PDF so a later attachment can't be saved over it.
+def reserve_attachment_path(att_dir, fn, reserved):
+    base, extension = os.path.splitext(fn)
+    safe_base = re.sub(r'[\\/:"*?<>|]+', '_', base)
+    office = extension.lower() in WORD_EXTENSIONS + EXCEL_EXTENSIONS
+    count = 0
+    while True:
+        stem = safe_base if count == 0 else f"{safe_base}_{count}"
+        names = [os.path.join(att_dir, stem + extension)]
+        if office:
+            names.append(os.path.join(att_dir, stem + '.pdf'))
+        if not any(n in reserved or os.path.exists(n) for n in names):
+            reserved.update(names)
+            return names[0]
+        count += 1
+
+def snapshot_mail_item(item, seq, matcher, reserved, seen_hashes):
+    """
+    Copy everything the export needs off a COM item into plain data: the
+    fields to render, the index metadata and the allowed attachments. The
+    attachments are saved to disk here, since Outlook objects can only be
+    used on the thread that enumerated them.
+
+    Saved attachments are hashed; a payload already in seen_hashes is
+    deleted again and marked 'duplicate' so it isn't converted twice.
+    """
+    entry_id, modified = item_state_key(item) if INCREMENTAL_EXPORT else (None, None)
+    snap = {'seq': seq, 'entry_id': entry_id, 'modified': modified, 'cached': None, 'attachments': []}
+    email_dir, att_dir = EMAIL_SAVE_PATH, ATTACHMENT_SAVE_PATH
+    email_name = f"email_{seq + 1:06d}.pdf"
+    if entry_id:
+        # Unchanged since the last run: reuse the exported artifacts
+        cached = run_state_cached_export(entry_id, modified)
+        if cached:
+            snap['cached'] = cached
+            seen_hashes.update(a['sha256'] for a in cached['attachments'] if a.get('sha256'))
+            return snap
+        # New or modified: export into the item's persistent artifact folder
+        item_dir = run_state_item_dir(entry_id)
+        shutil.rmtree(item_dir, ignore_errors=True)
+        os.makedirs(item_dir)
+        email_dir = att_dir = item_dir
+        # Streamed emails keep their fields rather than a PDF, to be drawn again on reuse
+        email_name = 'email.json' if STREAM_EMAIL_RENDER else f"email_{os.path.basename(item_dir)}.pdf"
+    snap['email_path'] = os.path.join(email_dir, email_name)
+    details = mail_item_fields(item)
+    snap['details'] = details
+    # Record which keywords this item matched so reviewers can see why it was included
+    try:
+        item_matches = '; '.join(matcher.find(details['subject'], details['body'].strip() or getattr(item, 'HTMLBody', '') or ''))
+    except Exception:
+        item_matches = ''
+    snap['meta'] = {
+        'email_subject': details['subject'],
+        'sender': details['sender'],
+        'sent_on': details['sent'],
+        'matched_keywords': item_matches
+    }
+    if CORPUS_ENABLE:
+        # Corpus key: the EntryID, else a digest of the fields
+        key, version = (entry_id, modified) if entry_id else item_state_key(item)
+        if not key:
+            key = hashlib.sha1(json.dumps(details, sort_keys=True).encode('utf-8')).hexdigest()
+        snap['meta']['email_key'] = key
+        # HTML-only messages are matched on their HTML, as above
+        snap['corpus'] = {'key': key, 'modified': version,
+                          'match_text': '' if details['body'].strip() else getattr(item, 'HTMLBody', '') or ''}
+    for att in item.Attachments:
+        try:
+            fn = att.FileName
+            ext = os.path.splitext(fn)[1].lower()
             if ext in SIGNATURE_IMAGE_EXTENSIONS:
                 continue
             if ext not in ALLOWED_ATTACHMENT_EXTENSIONS:
                 log(f"Skipping unsupported attachment type: {fn}")
                 continue
-            # ensure unique filename
-            base, extension = os.path.splitext(fn)
-            safe_base = re.sub(r'[\\/:"*?<>|]+', '_', base)
-            dest = os.path.join(ATTACHMENT_SAVE_PATH, safe_base + extension)
-            count = 1
-            while os.path.exists(dest):
-                dest = os.path.join(
-                    ATTACHMENT_SAVE_PATH, f"{safe_base}_{count}{extension}"
-                )
-                count += 1
+            dest = reserve_attachment_path(att_dir, fn, reserved)
+            att.SaveAsFile(dest)
+            saved = {'file_name': fn, 'path': dest, 'sha256': file_sha256(dest), 'size': os.path.getsize(dest)}
+            if ATTACHMENT_DEDUP and saved['sha256'] in seen_hashes:
+                # Same payload already exported in this run: the first copy is reused
+                os.remove(dest)
+                saved['duplicate'] = True
+            seen_hashes.add(saved['sha256'])
+            snap['attachments'].append(saved)
+        except Exception as e:
+            log(f"Attachment save failed: {e}", level=logging.WARNING)
+    return snap
+
+# Enumerator thread: stream item snapshots into out_queue, then a None sentinel
+def enumerate_mail_snapshots(out_queue, source=None, errors=None):
+    if pythoncom is not None:
+        pythoncom.CoInitialize()
+    try:
+        matcher = build_keyword_matcher()
+        reserved = set()
+        seen_hashes = set()
+        items = get_all_mail_items(keywords, source)
+        seq = 0
+        while True:
             try:
-                att.SaveAsFile(dest)
-                # Convert non-PDF files (Word/Excel) to PDF with timeout and progress
-                if ext in WORD_EXTENSIONS + EXCEL_EXTENSIONS:
-                    log(f"Converting attachment to PDF: {fn}")
-                    start_conv = datetime.now()
-                    try:
-                        with ProcessPoolExecutor(max_workers=1) as exe:
-                            future = exe.submit(convert_office_to_pdf, dest)
-                            pdf_path = future.result(timeout=OCR_TIMEOUT_SECONDS)
-                    except TimeoutError:
-                        log(f"Office conversion timed out after {OCR_TIMEOUT_SECONDS}s: {fn}")
-                        continue
-                    except Exception as e:
-                        log(f"Office conversion failed for {fn}: {e}")
-                        continue
-                    # Validate PDF output
-                        if pdf_path and is_valid_pdf(pdf_path):
-                            elapsed = datetime.now() - start_conv
-                            log(f"Converted {fn} to PDF in {elapsed}")
-                            attachments.append(pdf_path)
-                            # Record attachment metadata with detailed info
-                            subject = getattr(itm, 'Subject', '') or ''
-                            sender = getattr(itm, 'SenderName', '') or getattr(itm, 'SenderEmailAddress', '') or ''
-                            sent_attr = getattr(itm, 'SentOn', None)
-                            sent_on = ''
-                            if sent_attr:
-                                try:
-                                    sent_on = sent_attr.strftime('%Y-%m-%d %H:%M:%S')
-                                except:
-                                    sent_on = ''
-                            try:
-                                page_count = len(PdfReader(pdf_path).pages)
-                            except Exception:
-                                page_count = 0
-                            ATTACHMENT_INDEX_LIST.append({
-                                'source_filename': os.path.basename(pdf_path),
-                                'attachment_name': fn,
-                                'email_subject': subject,
-                                'sender': sender,
-                                'sent_on': sent_on,
-                                'page_count': page_count,
-                                'start_page': 0,
-                                'merged_file': os.path.basename(CONSOLIDATED_ATTACHMENT_PDF_PATH)
-                            })
-                    else:
-                        log(f"Office convert produced invalid PDF for attachment: {fn}")
-                else:
-                    # PDF attachment
-                    attachments.append(dest)
-                    # Record attachment metadata with detailed info
-                    subject = getattr(itm, 'Subject', '') or ''
-                    sender = getattr(itm, 'SenderName', '') or getattr(itm, 'SenderEmailAddress', '') or ''
-                    sent_attr = getattr(itm, 'SentOn', None)
-                    sent_on = ''
-                    if sent_attr:
-                        try:
-                            sent_on = sent_attr.strftime('%Y-%m-%d %H:%M:%S')
-                        except:
-                            sent_on = ''
-                    try:
-                        page_count = len(PdfReader(dest).pages)
-                    except Exception:
-                        page_count = 0
-                    ATTACHMENT_INDEX_LIST.append({
-                        'source_filename': os.path.basename(dest),
-                        'attachment_name': fn,
-                        'email_subject': subject,
-                        'sender': sender,
-                        'sent_on': sent_on,
-                        'page_count': page_count,
-                        'start_page': 0,
-                        'merged_file': os.path.basename(CONSOLIDATED_ATTACHMENT_PDF_PATH)
-                    })
+                # Time blocked on a full queue is the workers' backlog, not Outlook's
+                with LANES.busy('outlook'), TRACER.span('enumerate.item', seq=seq) as span:
+                    itm = next(items, None)
+                    if itm is None:
+                        break
+                    snap = snapshot_mail_item(itm, seq, matcher, reserved, seen_hashes)
+                    span.set(attachments=len(snap['attachments']), cached=bool(snap['cached']))
+                # Drop the COM reference before blocking on the queue
+                itm = None
+                out_queue.put(snap)
             except Exception as e:
-                log(f"Attachment save failed: {e}")
+                log(f"Error reading mail item for export: {e}", level=logging.WARNING)
+            seq += 1
+        run_state_commit()
+    except Exception as e:
+        if errors is not None:
+            errors.append(e)
+    finally:
+        out_queue.put(None)
+        if pythoncom is not None:
+            pythoncom.CoUninitialize()
+
+# Convert (if needed) and validate one saved attachment; returns its record or None
+@traced('attachment.prepare')
+def prepare_attachment(att, meta):
+    fn, dest = att['file_name'], att['path']
+    ext = os.path.splitext(fn)[1].lower()
+    try:
+        # Convert non-PDF files (Word/Excel) to PDF with timeout
+        if ext in WORD_EXTENSIONS + EXCEL_EXTENSIONS:
+            log(f"Converting attachment to PDF: {fn}", level=logging.DEBUG)
+            start_conv = datetime.now()
+            # Timeouts and failures are logged by the converter pool
+            pdf_path = convert_office_to_pdf(dest)
+            if not pdf_path:
+                return None
+            # Validate PDF output
+            if not is_valid_pdf(pdf_path, need_text=OCR_REQUIRED):
+                log(f"Office convert produced invalid PDF for attachment: {fn}")
+                return None
+            log(f"Converted {fn} to PDF in {datetime.now() - start_conv}")
+        else:
+            # PDF attachment
+            pdf_path = dest
+        # Record attachment metadata with detailed info
+        att_entry = {
+            'source_filename': os.path.basename(pdf_path),
+            'attachment_name': fn,
+            'email_subject': meta['email_subject'],
+            'sender': meta['sender'],
+            'sent_on': meta['sent_on'],
+            'page_count': get_doc_info(pdf_path, need_text=OCR_REQUIRED)['page_count'],
+            'start_page': 0,
+            'merged_file': os.path.basename(CONSOLIDATED_ATTACHMENT_PDF_PATH),
+            'matched_keywords': meta['matched_keywords'],
+            'sha256': att['sha256'],
+            'email_key': meta.get('email_key')
+        }
+        TRACER.current().set(file=fn, bytes=att['size'], pages=att_entry['page_count'])
+        return {'pdf_path': pdf_path, 'sha256': att['sha256'], 'size': att['size'],
+                'page_count': att_entry['page_count'], 'index': att_entry}
+    except Exception as e:
+        log(f"Attachment processing failed for {fn}: {e}", level=logging.WARNING)
+        return None
+
+# Process emails and attachments
+def process_emails(source=None, on_attachment=None):
+    """
+    Export matching emails and their attachments as a three-stage pipeline:
+    an enumerator thread pulls item snapshots off Outlook (bounded queue),
+    a process pool renders email PDFs and a thread pool converts and
+    validates attachments. Results are collected in enumeration order, so
+    the merged PDFs and index match a serial run, and each item is recorded
+    as soon as it and everything before it is done; only a bounded window of
+    items is held at any time.
+
+    With stream_email_render the emails are instead drawn straight into the
+    consolidated email PDF (or its parts) as they arrive, and the returned
+    email list holds those parts rather than one PDF per email.
+
+    on_attachment, if given, is called (from worker threads) with each
+    attachment PDF as soon as it is ready, so later stages can start on it
+    before the export finishes. Attachments of unchanged items are passed
+    with the OCR output recorded for them by the last run, if any.
+    """
+    # Collect metadata for index
+    global EMAIL_INDEX_LIST, ATTACHMENT_INDEX_LIST
+    EMAIL_INDEX_LIST.clear()
+    ATTACHMENT_INDEX_LIST.clear()
+    snapshots = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    errors = []
+    enumerator = threading.Thread(target=enumerate_mail_snapshots, args=(snapshots, source, errors),
+                                  name='mail-enumerator', daemon=True)
+    enumerator.start()
+    # Bounds the snapshots (and their bodies) waiting on the worker pools
+    inflight = threading.BoundedSemaphore(PIPELINE_QUEUE_SIZE)
+    done_lock = threading.Lock()
+    # Items not yet recorded, in enumeration order
+    slots = deque()
+    total = 0
+    renderer = None
+    if STREAM_EMAIL_RENDER:
+        renderer = EmailStreamRenderer(CONSOLIDATED_EMAIL_PDF_PATH, MAX_SPLIT_SIZE_MB if SPLIT_EMAILS else None)
+    # Messages reach the renderer in enumeration order, so earlier replies are recorded first
+    collapser = ThreadCollapser(THREAD_SIMILARITY) if COLLAPSE_THREADS else None
+    email_pdfs = []
+    attachments = []
+    # First record merged for each attachment payload
+    merged_by_hash = {}
+
+    def place_attachment(record):
+        canonical = merged_by_hash.get(record.get('sha256')) if ATTACHMENT_DEDUP else None
+        if canonical is None:
+            if record.get('pdf_path') is None:
+                log(f"Skipping duplicate of a failed attachment: {record['index']['attachment_name']}", level=logging.WARNING)
+                return None
+            record['index'].pop('duplicate_of', None)
+            # Lets the merge leave out entries whose OCR fails
+            record['index']['source_path'] = record['pdf_path']
+            merged_by_hash.setdefault(record.get('sha256'), record)
+            attachments.append(record['pdf_path'])
+            ATTACHMENT_INDEX_LIST.append(record['index'])
+            return record
+        # Another copy of a payload already merged: index this carrier, point at the merged copy
+        ATTACHMENT_DEDUP_STATS['duplicates'] += 1
+        ATTACHMENT_DEDUP_STATS['bytes'] += record.get('size') or canonical.get('size') or 0
+        ATTACHMENT_DEDUP_STATS['pages'] += canonical['page_count']
+        carrier = record['index']
+        entry = dict(canonical['index'], **{k: carrier[k] for k in ('attachment_name', 'email_subject', 'sender',
+                                                                  'sent_on', 'matched_keywords', 'email_key')
+                                            if k in carrier})
+        entry['duplicate_of'] = canonical['index']['source_filename']
+        ATTACHMENT_INDEX_LIST.append(entry)
+        return dict(record, pdf_path=canonical['pdf_path'], page_count=canonical['page_count'], index=entry)
+
+    # Record one item's results in the index lists (and run state) once its work is done
+    def finalize(slot):
+        snap = slot['snapshot']
+        cached = snap['cached']
+        if cached:
+            if not cached['email_index']:
+                return
+            if not renderer:
+                email_pdfs.append(cached['email_pdf'])
+            EMAIL_INDEX_LIST.append(cached['email_index'])
+            for att in cached['attachments']:
+                place_attachment(att)
+            with RUN_STATE_LOCK:
+                RUN_STATE_STATS['reused'] += 1
+            return
+        email_entry = slot['email_entry']
+        out = snap.get('email_path')
+        if email_entry:
+            EMAIL_INDEX_LIST.append(email_entry)
+        elif slot['email']:
+            try:
+                page_count = slot['email'].result()
+            except Exception as e:
+                log(f"Email render failed for {os.path.basename(out)}: {e}", level=logging.WARNING)
+                page_count = 0
+            if page_count:
+                # Rendered emails always carry a text layer; record them without a parse
+                register_doc(out, page_count, has_text=True)
+            if page_count and is_valid_pdf(out):
+                email_pdfs.append(out)
+                email_entry = dict({'source_filename': os.path.basename(out), 'source_path': out,
+                                    'page_count': page_count}, **snap['meta'])
+                EMAIL_INDEX_LIST.append(email_entry)
+        item_attachments = []
+        for att, future in zip(snap['attachments'], slot['attachments']):
+            if future is not None:
+                record = future.result()
+            else:
+                record = {'pdf_path': None, 'sha256': att['sha256'], 'size': att['size'], 'page_count': 0,
+                          'index': dict(snap['meta'], attachment_name=att['file_name'])}
+            record = record and place_attachment(record)
+            if record:
+                item_attachments.append(record)
+        # Remember what was exported so the next run can reuse it
+        if snap['entry_id'] and email_entry:
+            run_state_save_export(snap['entry_id'], snap['modified'], out, email_entry, item_attachments)
+
+    def drain():
+        # Past the look-ahead limit, wait for the oldest item rather than queue more behind it
+        while slots and (len(slots) > 2 * PIPELINE_QUEUE_SIZE or all(f.done() for f in slots[0]['futures'])):
+            finalize(slots.popleft())
+
+    # Export matching emails to PDF with progress bar
+    with ProcessPoolExecutor(max_workers=RENDER_WORKERS) as render_pool, \
+            ThreadPoolExecutor(max_workers=ATTACHMENT_WORKERS) as att_pool, \
+            tqdm(desc="Exporting Emails", unit='email', position=1, leave=True) as bar:
+        def finished(slot):
+            def callback(_future):
+                with done_lock:
+                    slot['pending'] -= 1
+                    if slot['pending']:
+                        return
+                    bar.update(1)
+                inflight.release()
+            return callback
+        while True:
+            drain()
+            snap = snapshots.get()
+            if snap is None:
+                break
+            total += 1
+            slot = {'snapshot': snap, 'email': None, 'email_entry': None, 'attachments': [], 'futures': []}
+            slots.append(slot)
+            ENUMERATION_STATS['peak_inflight'] = max(ENUMERATION_STATS['peak_inflight'], len(slots))
+            if on_attachment and snap['cached']:
+                for att in snap['cached']['attachments']:
+                    on_attachment(att['pdf_path'], att.get('ocr_path'))
+            if renderer and snap['cached']:
+                try:
+                    with open(snap['cached']['email_pdf'], encoding='utf-8') as f:
+                        details = json.load(f)
+                    snap['cached']['email_index'].pop('source_path', None)
+                    shown, pending = collapser.collapse(details) if collapser else (details, None)
+                    entry = renderer.add(shown, snap['cached']['email_index'])
+                    if collapser:
+                        collapser.record(pending, shown, entry, renderer.part_number())
+                except Exception as e:
+                    # Artifact unreadable: drop the item from this run's output
+                    log(f"Cached email unreadable, skipping: {e}")
+                    snap['cached'] = {'email_pdf': None, 'email_index': None, 'attachments': []}
+            elif renderer:
+                details = snap.pop('details')
+                if 'corpus' in snap:
+                    corpus_add_email(snap['corpus'], details, snap['meta'])
+                shown, pending = collapser.collapse(details) if collapser else (details, None)
+                slot['email_entry'] = renderer.add(shown, dict({'source_filename': ''}, **snap['meta']))
+                if collapser:
+                    collapser.record(pending, shown, slot['email_entry'], renderer.part_number())
+                if snap['entry_id']:
+                    with open(snap['email_path'], 'w', encoding='utf-8') as f:
+                        json.dump(details, f)
+            # Duplicate attachments keep a None placeholder; their first copy is reused
+            slot['attachments'] = [None] * len(snap['attachments'])
+            to_prepare = [att for att in snap['attachments'] if not att.get('duplicate')]
+            # Streamed emails without new attachments have nothing left for the pools
+            if snap['cached'] or (renderer and not to_prepare):
+                bar.update(1)
+                continue
+            inflight.acquire()
+            if not renderer:
+                details = snap.pop('details')
+                if 'corpus' in snap:
+                    corpus_add_email(snap['corpus'], details, snap['meta'])
+                if collapser:
+                    details, pending = collapser.collapse(details)
+                    # Separate files: pointers can name the message but not a merged page
+                    collapser.record(pending, details)
+                slot['email'] = render_pool.submit(render_email_pdf, details, snap['email_path'])
+            slot['attachments'] = [None if att.get('duplicate') else att_pool.submit(prepare_attachment, att, snap['meta'])
+                                   for att in snap['attachments']]
+            futures = ([slot['email']] if slot['email'] else []) + [f for f in slot['attachments'] if f]
+            slot['futures'] = futures
+            slot['pending'] = len(futures)
+            for future in futures:
+                future.add_done_callback(finished(slot))
+            if on_attachment:
+                for future in slot['attachments']:
+                    if future is not None:
+                        future.add_done_callback(lambda f: f.result() and on_attachment(f.result()['pdf_path']))
+        bar.total = total
+        bar.refresh()
+    enumerator.join()
+    if errors:
+        raise errors[0]
+    # The pools have shut down, so everything left is finished
+    while slots:
+        finalize(slots.popleft())
+    if renderer:
+        email_pdfs = renderer.close()
+    close_converter_pool()
+    run_state_commit()
     return email_pdfs, attachments
 
 # Google Drive download
-def download_google_docs_from_drive(keywords, out_dir):
+DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+# Responses worth retrying: rate limiting and transient server errors
+DRIVE_RETRY_STATUS = (429, 500, 502, 503, 504)
+DRIVE_STATS = {'listed': 0, 'pages': 0, 'changes': 0, 'downloaded': 0, 'reused': 0, 'bytes': 0,
+               'retries': 0, 'failed': 0}
+DRIVE_STATS_LOCK = threading.Lock()
+DRIVE_FILE_FIELDS = 'id,name,mimeType,parents,trashed,size,md5Checksum,modifiedTime'
+
+class DriveError(Exception):
+    pass
+
+# Download workers update the counters concurrently
+def drive_count(key, amount=1):
+    with DRIVE_STATS_LOCK:
+        DRIVE_STATS[key] += amount
+
+def drive_credentials():
     creds = None
     if os.path.exists(GDRIVE_TOKEN_FILE):
         creds = Credentials.from_authorized_user_file(GDRIVE_TOKEN_FILE)
@@ -575,127 +2544,1090 @@ def download_google_docs_from_drive(keywords, out_dir):
         if creds and creds.expired and creds.refresh_token:
             creds.refresh(Request())
         else:
-            flow = InstalledAppFlow.from_client_secrets_file(GDRIVE_CLIENT_SECRET_FILE, 
-                      ['https://www.googleapis.com/auth/drive.readonly'])
+            flow = InstalledAppFlow.from_client_secrets_file(GDRIVE_CLIENT_SECRET_FILE, DRIVE_SCOPES)
             creds = flow.run_local_server(port=0)
         with open(GDRIVE_TOKEN_FILE, 'w') as token:
             token.write(creds.to_json())
-    service = build('drive', 'v3', credentials=creds)
-    query = "mimeType='application/pdf'"
-    files = service.files().list(q=query, fields="files(id,name)").execute().get('files', [])
-    downloaded = []
+    return creds
+
+class DriveClient:
+    """
+    Minimal Drive v3 REST client. session is anything with the
+    requests.Session interface: an AuthorizedSession in production, or a
+    plain Session pointed at a local stand-in (base_url) in benchmarks.
+
+    Requests answered with 429/5xx or failing to connect are retried up to
+    max_retries times with exponential backoff (honoring Retry-After).
+    """
+    def __init__(self, session, base_url=DRIVE_API_URL, max_retries=None, timeout=60):
+        self.session = session
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = DRIVE_MAX_RETRIES if max_retries is None else max_retries
+        self.timeout = timeout
+
+    def request(self, path, params=None, stream=False):
+        url = f"{self.base_url}/{path}"
+        for attempt in range(self.max_retries + 1):
+            delay = min(DRIVE_BACKOFF_SECONDS * 2 ** attempt, 60) * (0.5 + random.random() / 2)
+            try:
+                with LANES.busy('drive'):
+                    resp = self.session.request('GET', url, params=params, stream=stream, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise DriveError(f"GET {path} failed: {e}")
+            else:
+                if resp.status_code < 400:
+                    return resp
+                retry_after = resp.headers.get('Retry-After', '')
+                resp.close()
+                if resp.status_code not in DRIVE_RETRY_STATUS or attempt == self.max_retries:
+                    raise DriveError(f"GET {path} returned HTTP {resp.status_code}")
+                if retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+            drive_count('retries')
+            time.sleep(delay)
+
+    def list_files(self, query, fields=DRIVE_FILE_FIELDS, page_size=1000):
+        """Yield every file matching the Drive query, following nextPageToken."""
+        params = {'q': query, 'pageSize': page_size, 'fields': f"nextPageToken,files({fields})",
+                  'supportsAllDrives': 'true', 'includeItemsFromAllDrives': 'true'}
+        while True:
+            resp = self.request('files', params)
+            data = resp.json()
+            drive_count('pages')
+            for f in data.get('files', []):
+                drive_count('listed')
+                yield f
+            if not data.get('nextPageToken'):
+                return
+            params['pageToken'] = data['nextPageToken']
+
+    def start_page_token(self):
+        return self.request('changes/startPageToken', {'supportsAllDrives': 'true'}).json()['startPageToken']
+
+    def list_changes(self, page_token, page_size=1000):
+        """
+        Return (changes since page_token, token for the next sync), following
+        nextPageToken until Drive hands out newStartPageToken.
+        """
+        params = {'pageToken': page_token, 'pageSize': page_size,
+                  'fields': f"nextPageToken,newStartPageToken,changes(fileId,removed,file({DRIVE_FILE_FIELDS}))",
+                  'supportsAllDrives': 'true', 'includeItemsFromAllDrives': 'true'}
+        changes = []
+        while True:
+            data = self.request('changes', params).json()
+            changes.extend(data.get('changes', []))
+            if 'newStartPageToken' in data:
+                drive_count('changes', len(changes))
+                return changes, data['newStartPageToken']
+            params['pageToken'] = data['nextPageToken']
+
+    @traced('drive.download')
+    def download(self, file_id, path, md5=None, chunk_size=None):
+        """
+        Stream a file's content to path in chunks. Written to path + '.part'
+        and renamed once complete (and, with md5 given, verified), so an
+        interrupted download never leaves a truncated file behind. Retries
+        restart the file from scratch.
+        """
+        chunk_size = chunk_size or DRIVE_CHUNK_BYTES
+        tmp = path + '.part'
+        for attempt in range(self.max_retries + 1):
+            resp = self.request(f"files/{file_id}", {'alt': 'media', 'supportsAllDrives': 'true'}, stream=True)
+            size = 0
+            digest = hashlib.md5()
+            try:
+                with LANES.busy('drive'), resp, open(tmp, 'wb') as f:
+                    for chunk in resp.iter_content(chunk_size):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                if md5 and digest.hexdigest() != md5:
+                    raise DriveError(f"checksum mismatch ({digest.hexdigest()} != {md5})")
+            except (requests.RequestException, DriveError) as e:
+                # Connection dropped mid-body or content corrupted
+                if attempt == self.max_retries:
+                    os.remove(tmp)
+                    raise DriveError(f"Download of {file_id} failed: {e}")
+                drive_count('retries')
+                time.sleep(min(DRIVE_BACKOFF_SECONDS * 2 ** attempt, 60))
+                continue
+            os.replace(tmp, path)
+            drive_count('bytes', size)
+            TRACER.current().set(file_id=file_id, bytes=size, attempts=attempt + 1)
+            return size
+
+def drive_quote(value):
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+def drive_transcript_query(keywords, folder_id=None):
+    """
+    Drive search for the transcript PDFs: restricted to folder_id when set
+    and, with DRIVE_SERVER_SIDE_FILTER, to names containing a keyword.
+    Drive matches name terms by prefix, so the caller still checks names.
+    """
+    clauses = ["mimeType='application/pdf'", 'trashed=false']
+    if folder_id:
+        clauses.append(f"{drive_quote(folder_id)} in parents")
+    if DRIVE_SERVER_SIDE_FILTER and keywords:
+        clauses.append('(' + ' or '.join(f"name contains {drive_quote(kw)}" for kw in keywords) + ')')
+    return ' and '.join(clauses)
+
+def transcript_name_matches(name, keywords):
+    """
+    Local keyword check on a Drive file name: a substring match, narrowed to
+    Drive's word-prefix matching when the query filters names server-side
+    so listings and change feeds select the same files.
+    """
+    name = name.lower()
+    if DRIVE_SERVER_SIDE_FILTER:
+        return any(re.search(r'(?<![0-9a-z])' + re.escape(kw.lower()), name) for kw in keywords)
+    return any(kw.lower() in name for kw in keywords)
+
+# Whether a Drive file resource (from a listing or change) is a wanted transcript
+def transcript_file_matches(f, keywords, folder_id=None):
+    return (f.get('mimeType') == 'application/pdf' and not f.get('trashed')
+            and (not folder_id or folder_id in f.get('parents', []))
+            and transcript_name_matches(f.get('name', ''), keywords))
+
+def drive_client():
+    session = AuthorizedSession(drive_credentials())
+    # One pooled connection per download worker
+    session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=DRIVE_DOWNLOAD_WORKERS))
+    return DriveClient(session)
+
+def drive_download_all(client, jobs):
+    """
+    Download (file resource, path) jobs DRIVE_DOWNLOAD_WORKERS at a time.
+    Returns a success flag per job; failures are logged.
+    """
+    def fetch(f, path):
+        try:
+            client.download(f['id'], path, md5=f.get('md5Checksum'))
+            return True
+        except Exception as e:
+            drive_count('failed')
+            log(f"Transcript download failed for {f['name']}: {e}", level=logging.WARNING)
+            return False
+
+    done = [False] * len(jobs)
     # Download matching transcripts with progress bar
-    for f in tqdm(files,
-                    desc="Downloading Transcripts",
-                    unit='file', position=1, leave=True):
-        if any(kw in f['name'].lower() for kw in keywords):
-            request = service.files().get_media(fileId=f['id'])
-            fh = BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-            path = os.path.join(out_dir, f['name'])
-            with open(path, 'wb') as out_f:
-                out_f.write(fh.getvalue())
-            downloaded.append(path)
-    return downloaded
+    with ThreadPoolExecutor(max_workers=DRIVE_DOWNLOAD_WORKERS) as pool, \
+            tqdm(total=len(jobs), desc="Downloading Transcripts", unit='file', position=2, leave=True) as bar:
+        futures = {pool.submit(fetch, f, path): i for i, (f, path) in enumerate(jobs)}
+        for future in as_completed(futures):
+            done[futures[future]] = future.result()
+            bar.update(1)
+    drive_count('downloaded', sum(done))
+    return done
+
+def download_google_docs_from_drive(keywords, out_dir, client=None):
+    """
+    Download the PDFs whose names contain a keyword (from the configured
+    transcript folder, if any) into out_dir, DRIVE_DOWNLOAD_WORKERS at a
+    time. Returns the saved paths in listing order; failed downloads are
+    logged and left out.
+
+    With DRIVE_INCREMENTAL_SYNC the files are kept in a persistent store
+    instead and only new or changed ones are fetched (sync_drive_transcripts).
+    """
+    client = client or drive_client()
+    if DRIVE_INCREMENTAL_SYNC:
+        return sync_drive_transcripts(client, keywords, out_dir)
+    files = [f for f in client.list_files(drive_transcript_query(keywords, GDRIVE_MEETING_TRANSCRIPTS_FOLDER_ID))
+             if transcript_name_matches(f['name'], keywords)]
+    reserved = set()
+    jobs = [(f, reserve_attachment_path(out_dir, f['name'], reserved)) for f in files]
+    return [path for (f, path), ok in zip(jobs, drive_download_all(client, jobs)) if ok]
+
+# Incremental transcript sync
+# The run-state database keeps the matching Drive files (id, name, md5Checksum,
+# modifiedTime) and a Changes API page token; copies live in .run_state/transcripts.
+def drive_store_path(file_id):
+    return os.path.join(run_state_dir(), 'transcripts', re.sub(r'[^A-Za-z0-9_-]', '_', file_id) + '.pdf')
+
+# Record a matching file; its stored copy stays valid until md5/modifiedTime differ
+def drive_remember_file(conn, f):
+    conn.execute("INSERT INTO drive_files (file_id, name, md5, modified, size) VALUES (?, ?, ?, ?, ?) "
+                 "ON CONFLICT(file_id) DO UPDATE SET name = excluded.name, md5 = excluded.md5, "
+                 "modified = excluded.modified, size = excluded.size",
+                 (f['id'], f['name'], f.get('md5Checksum'), f.get('modifiedTime'), int(f.get('size') or 0)))
+
+def drive_forget_file(conn, file_id):
+    conn.execute("DELETE FROM drive_files WHERE file_id = ?", (file_id,))
+    if os.path.exists(drive_store_path(file_id)):
+        os.remove(drive_store_path(file_id))
+
+def sync_drive_transcripts(client, keywords, out_dir):
+    """
+    Bring the transcript store up to date and link its files into out_dir.
+
+    The first run (or one whose Drive query changed) lists every matching
+    file; later runs read only the Changes API feed since the saved page
+    token. A stored copy is reused while its md5Checksum (modifiedTime for
+    files without one) is unchanged, so only new or edited transcripts are
+    downloaded. Returns the out_dir paths ordered by name.
+    """
+    conn = run_state_connect()
+    folder_id = GDRIVE_MEETING_TRANSCRIPTS_FOLDER_ID
+    query = drive_transcript_query(keywords, folder_id)
+    with RUN_STATE_LOCK:
+        meta = dict(conn.execute("SELECT key, value FROM meta WHERE key IN ('drive_query', 'drive_page_token')"))
+    os.makedirs(os.path.dirname(drive_store_path('x')), exist_ok=True)
+    if meta.get('drive_query') == query and meta.get('drive_page_token'):
+        changes, token = client.list_changes(meta['drive_page_token'])
+        with RUN_STATE_LOCK:
+            for change in changes:
+                f = change.get('file')
+                if not change.get('removed') and f and transcript_file_matches(f, keywords, folder_id):
+                    drive_remember_file(conn, f)
+                else:
+                    drive_forget_file(conn, change['fileId'])
+        log(f"Drive sync: {len(changes)} changes since the last run")
+    else:
+        # Token first, so changes made while listing are picked up next run
+        token = client.start_page_token()
+        files = [f for f in client.list_files(query) if transcript_file_matches(f, keywords, folder_id)]
+        with RUN_STATE_LOCK:
+            listed = {f['id'] for f in files}
+            for (file_id,) in conn.execute("SELECT file_id FROM drive_files").fetchall():
+                if file_id not in listed:
+                    drive_forget_file(conn, file_id)
+            for f in files:
+                drive_remember_file(conn, f)
+    with RUN_STATE_LOCK:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('drive_query', ?)", (query,))
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('drive_page_token', ?)", (token,))
+        conn.commit()
+        rows = conn.execute("SELECT file_id, name, md5, modified, stored FROM drive_files ORDER BY name, file_id").fetchall()
+    files, jobs = [], []
+    for file_id, name, md5, modified, stored in rows:
+        f = {'id': file_id, 'name': name, 'md5Checksum': md5, 'version': md5 or modified}
+        files.append(f)
+        if stored == f['version'] and os.path.exists(drive_store_path(file_id)):
+            drive_count('reused')
+        else:
+            jobs.append((f, drive_store_path(file_id)))
+    for (f, _), ok in zip(jobs, drive_download_all(client, jobs)):
+        if ok:
+            f['stored'] = True
+            with RUN_STATE_LOCK:
+                conn.execute("UPDATE drive_files SET stored = ? WHERE file_id = ?", (f['version'], f['id']))
+    run_state_commit()
+    failed = {f['id'] for f, _ in jobs if not f.get('stored')}
+    reserved = set()
+    paths = []
+    for f in files:
+        if f['id'] in failed:
+            continue
+        path = reserve_attachment_path(out_dir, f['name'], reserved)
+        try:
+            os.link(drive_store_path(f['id']), path)
+        except OSError:
+            shutil.copyfile(drive_store_path(f['id']), path)
+        paths.append(path)
+    return paths
 
 # OCR status checker
 def check_ocr_status(path):
+    return bool(get_doc_info(path, need_text=True)['has_text'])
+
+# Page-level text layer check
+def pages_needing_ocr(path):
+    """
+    Return the 0-based indices of pages that have no usable text layer but do
+    carry images (blank pages don't need OCR). Pages are checked with PyMuPDF.
+
+    An evenly spaced sample of OCR_CHECK_PERCENTAGE of the pages (at most
+    OCR_CHECK_MAX_PAGES) is checked first; if every sampled page lacks text
+    the document is treated as fully scanned without checking the rest.
+    The result is cached in the document registry.
+    """
     try:
-        reader = PdfReader(path)
-        text = ''.join(page.extract_text() or '' for page in reader.pages[:OCR_CHECK_MAX_PAGES])
-        return len(text) > OCR_TEXT_THRESHOLD
+        key = doc_key(path)
+    except OSError:
+        return []
+    with DOC_REGISTRY_LOCK:
+        info = DOC_REGISTRY.get(key)
+        if info and 'ocr_pages' in info:
+            return info['ocr_pages']
+    start = time.perf_counter()
+    try:
+        with fitz.open(path) as doc:
+            n = doc.page_count
+            def lacks_text(i):
+                page = doc[i]
+                return len(page.get_text().strip()) < OCR_TEXT_THRESHOLD and bool(page.get_images())
+            sample_n = max(1, min(OCR_CHECK_MAX_PAGES, n, math.ceil(n * OCR_CHECK_PERCENTAGE)))
+            sample = sorted({k * (n - 1) // max(1, sample_n - 1) for k in range(sample_n)}) if n else []
+            if sample and all(lacks_text(i) for i in sample):
+                ocr_pages = list(range(n))
+            else:
+                ocr_pages = [i for i in range(n) if lacks_text(i)]
     except Exception:
-        return False
+        ocr_pages = []
+    elapsed = time.perf_counter() - start
+    with DOC_REGISTRY_LOCK:
+        info = DOC_REGISTRY.setdefault(key, {'valid': False, 'page_count': 0, 'size': key[2],
+                                             'has_text': None, 'parse_seconds': 0.0})
+        info['ocr_pages'] = ocr_pages
+        info['parse_seconds'] += elapsed
+        DOC_REGISTRY_STATS['parses'] += 1
+        DOC_REGISTRY_STATS['parse_seconds'] += elapsed
+    return ocr_pages
+
+# Copy the OCR'd pages back over their originals
+def splice_ocr_pages(path, ocr_path, pages, out_path):
+    with fitz.open(path) as doc, fitz.open(ocr_path) as ocr_doc:
+        for k, idx in enumerate(pages):
+            doc.insert_pdf(ocr_doc, from_page=k, to_page=k, start_at=idx)
+            doc.delete_page(idx + 1)
+        doc.save(out_path, garbage=3, deflate=True)
 
 # OCR PDF task wrapper
-def ocr_pdf_task(path):
+def ocr_pdf_task(path, jobs=OCR_JOBS, timeout=None, pages=None):
+    """
+    OCR path into <name>_ocr.pdf. When pages (0-based indices) is given, only
+    those pages are extracted and run through ocrmypdf, and the results are
+    spliced back into a copy of the original document.
+    """
     out_path = path.replace('.pdf', '_ocr.pdf')
+    sel_path = sel_ocr_path = None
     try:
-        cmd = ['ocrmypdf', '--jobs', str(OCR_JOBS), '--timeout', str(OCR_TIMEOUT_SECONDS), path, out_path]
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        ok = check_ocr_status(out_path)
+        if pages is not None:
+            sel_path = path.replace('.pdf', '_ocrsel.pdf')
+            sel_ocr_path = sel_path.replace('.pdf', '_ocr.pdf')
+            with fitz.open(path) as doc, fitz.open() as sel:
+                for idx in pages:
+                    sel.insert_pdf(doc, from_page=idx, to_page=idx)
+                sel.save(sel_path)
+            src, dst = sel_path, sel_ocr_path
+        else:
+            src, dst = path, out_path
+        cmd = ['ocrmypdf', '--jobs', str(jobs), '--timeout', str(OCR_TIMEOUT_SECONDS)]
+        if OCR_PAGE_LEVEL:
+            # Pages that already carry text are left alone rather than failing the file
+            cmd.append('--skip-text')
+        subprocess.run(cmd + [src, dst], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout)
+        ok = check_ocr_status(dst)
+        if ok and pages is not None:
+            splice_ocr_pages(path, sel_ocr_path, pages, out_path)
         if ok:
             return True, out_path
         else:
             return False, path
+    except subprocess.TimeoutExpired:
+        log(f"OCR timed out after {timeout:.0f}s: {os.path.basename(path)}", level=logging.WARNING)
+        return False, path
     except Exception:
         return False, path
-    
-# Project index builder
-def build_project_index(emails_dir='emails', attachments_dir='attachments', transcripts_dir='transcripts', output_csv='project_index.csv'):
-    import csv, os
-    global EMAIL_INDEX_LIST, ATTACHMENT_INDEX_LIST, TRANSCRIPT_INDEX_LIST
-    global CONSOLIDATED_EMAIL_PDF_PATH, CONSOLIDATED_ATTACHMENT_PDF_PATH, CONSOLIDATED_TRANSCRIPT_PDF_PATH
-    # Basenames for merged files
-    email_merged_basename = os.path.basename(CONSOLIDATED_EMAIL_PDF_PATH)
-    attachment_merged_basename = os.path.basename(CONSOLIDATED_ATTACHMENT_PDF_PATH)
-    transcript_merged_basename = os.path.basename(CONSOLIDATED_TRANSCRIPT_PDF_PATH)
-    # CSV headers
-    headers = ['type', 'source_filename', 'email_subject', 'sender', 'sent_on', 'attachment_name', 'transcript_subject', 'meeting_date', 'page_count', 'start_page', 'merged_file']
-    with open(output_csv, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(headers)
-        # Emails
-        start_page = 1
-        for entry in EMAIL_INDEX_LIST:
-            fname = entry.get('source_filename', '')
-            path = os.path.join(emails_dir, fname)
+    finally:
+        for tmp in (sel_path, sel_ocr_path):
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+
+# Persistent OCR result cache
+# Index of cached _ocr.pdf blobs, keyed by SHA-256 of the input plus the OCR settings
+OCR_CACHE_LOCK = threading.Lock()
+OCR_CACHE_STATS = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'bytes_reused': 0}
+
+# Anything that changes which pages are OCR'd or how
+def ocr_settings():
+    engine = (f"ocrmypdf|timeout={OCR_TIMEOUT_SECONDS}" if OCR_ENGINE != 'tesseract'
+              else f"tesseract|lang={OCR_LANGUAGE}|dpi={OCR_DPI}")
+    return (f"{engine}|page_level={OCR_PAGE_LEVEL}|"
+            f"check={OCR_CHECK_PERCENTAGE},{OCR_CHECK_MAX_PAGES},{OCR_TEXT_THRESHOLD}")
+
+def ocr_cache_key(path):
+    h = hashlib.sha256(file_sha256(path).encode('ascii'))
+    h.update(ocr_settings().encode('utf-8'))
+    return h.hexdigest()
+
+def ocr_cache_connect():
+    os.makedirs(os.path.join(OCR_CACHE_DIR, 'blobs'), exist_ok=True)
+    conn = sqlite3.connect(os.path.join(OCR_CACHE_DIR, 'index.sqlite'), timeout=30)
+    conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                 "key TEXT PRIMARY KEY, size INTEGER, created REAL, last_used REAL)")
+    return conn
+
+def ocr_cache_blob(key):
+    return os.path.join(OCR_CACHE_DIR, 'blobs', key[:2], f"{key}.pdf")
+
+# Copy a cached OCR result to dest; returns True on a hit
+def ocr_cache_fetch(key, dest):
+    with OCR_CACHE_LOCK:
+        conn = ocr_cache_connect()
+        try:
+            row = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            blob = ocr_cache_blob(key)
+            if not row or not os.path.exists(blob):
+                if row:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    conn.commit()
+                OCR_CACHE_STATS['misses'] += 1
+                return False
+            shutil.copyfile(blob, dest)
+            conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            OCR_CACHE_STATS['hits'] += 1
+            OCR_CACHE_STATS['bytes_reused'] += row[0]
+            return True
+        finally:
+            conn.close()
+
+# Add an OCR result to the cache, evicting least recently used blobs over the size cap
+def ocr_cache_store(key, src):
+    with OCR_CACHE_LOCK:
+        conn = ocr_cache_connect()
+        try:
+            blob = ocr_cache_blob(key)
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            shutil.copyfile(src, blob + '.tmp')
+            os.replace(blob + '.tmp', blob)
+            now = time.time()
+            conn.execute("INSERT OR REPLACE INTO entries (key, size, created, last_used) VALUES (?, ?, ?, ?)",
+                         (key, os.path.getsize(blob), now, now))
+            OCR_CACHE_STATS['stores'] += 1
+            max_bytes = OCR_CACHE_MAX_MB * 1024 * 1024
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            for old_key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+                if total <= max_bytes:
+                    break
+                if old_key == key:
+                    continue
+                conn.execute("DELETE FROM entries WHERE key = ?", (old_key,))
+                if os.path.exists(ocr_cache_blob(old_key)):
+                    os.remove(ocr_cache_blob(old_key))
+                total -= size
+                OCR_CACHE_STATS['evictions'] += 1
+            conn.commit()
+        finally:
+            conn.close()
+
+# Parallel OCR scheduler
+class OcrScheduler:
+    """
+    Run several ocrmypdf processes at once under a shared core budget.
+
+    Each submitted file is given a number of ocrmypdf jobs based on its page
+    count (one per OCR_PAGES_PER_JOB pages, capped at the budget). Whenever
+    cores free up, the largest pending file that fits in the free cores is
+    started. wait() returns one result dict per file in submission order, with
+    'ok', 'output', 'jobs', 'wait' (queue seconds) and 'run' (OCR seconds).
+    """
+    def __init__(self, core_budget=OCR_JOBS, on_done=None):
+        self.core_budget = max(1, core_budget)
+        self.free_cores = self.core_budget
+        self.on_done = on_done
+        self.cond = threading.Condition()
+        # Pending tasks bucketed by job count; each bucket is a heap keyed on page count
+        self.pending = {}
+        self.pending_count = 0
+        self.running = 0
+        self.tasks = []
+
+    def jobs_for(self, pages):
+        return max(1, min(self.core_budget, -(-pages // OCR_PAGES_PER_JOB)))
+
+    def submit(self, path, ocr_pages=None):
+        return self.submit_many([path], {path: ocr_pages} if ocr_pages is not None else None)[0]
+
+    # Queue a batch before dispatching so the largest files start first.
+    # ocr_pages optionally maps a path to the page indices that need OCR.
+    def submit_many(self, paths, ocr_pages=None):
+        ocr_pages = ocr_pages or {}
+        new_tasks = []
+        for path in paths:
+            selected = ocr_pages.get(path)
+            pages = max(1, len(selected) if selected is not None else pdf_page_count(path))
+            new_tasks.append({'path': path, 'pages': pages, 'jobs': self.jobs_for(pages), 'ok': False,
+                              'ocr_pages': selected, 'output': path,
+                              'queued_at': time.perf_counter(), 'wait': 0.0, 'run': 0.0})
+        with self.cond:
+            for task in new_tasks:
+                self.tasks.append(task)
+                heapq.heappush(self.pending.setdefault(task['jobs'], []), (-task['pages'], len(self.tasks), task))
+                self.pending_count += 1
+            self._dispatch()
+        return new_tasks
+
+    def _dispatch(self):
+        # Called with self.cond held. Job count grows with page count, so the
+        # largest file that fits is at the top of the highest non-empty bucket
+        # that needs no more than the free cores.
+        while self.pending_count:
+            for jobs in range(self.free_cores, 0, -1):
+                if self.pending.get(jobs):
+                    break
+            else:
+                return
+            task = heapq.heappop(self.pending[jobs])[2]
+            self.pending_count -= 1
+            self.free_cores -= jobs
+            self.running += 1
+            threading.Thread(target=self._run, args=(task,), daemon=True).start()
+
+    def _run(self, task):
+        start = time.perf_counter()
+        task['wait'] = start - task['queued_at']
+        # ocr_timeout is applied per page by ocrmypdf; bound the whole file by
+        # the pages each job has to get through
+        timeout = OCR_TIMEOUT_SECONDS * max(1, -(-task['pages'] // task['jobs']))
+        try:
+            with LANES.busy('ocr', task['jobs']), TRACER.span('ocr.file', file=os.path.basename(task['path']),
+                                                             pages=task['pages'], jobs=task['jobs'],
+                                                             wait=round(task['wait'], 3)) as span:
+                task['ok'], task['output'] = ocr_pdf_task(task['path'], task['jobs'], timeout, task['ocr_pages'])
+                span.set(ok=task['ok'])
+        except Exception as e:
+            log(f"OCR exception for {os.path.basename(task['path'])}: {e}")
+        task['run'] = time.perf_counter() - start
+        log(f"{os.path.basename(task['path'])}: OCR {'succeeded' if task['ok'] else 'failed'} "
+            f"({task['pages']} pages, {task['jobs']} jobs, waited {task['wait']:.1f}s, ran {task['run']:.1f}s)")
+        if self.on_done:
+            self.on_done(task)
+        with self.cond:
+            self.free_cores += task['jobs']
+            self.running -= 1
+            self._dispatch()
+            self.cond.notify_all()
+
+    def wait(self):
+        with self.cond:
+            while self.pending_count or self.running:
+                self.cond.wait()
+        return list(self.tasks)
+
+# In-process Tesseract page OCR
+# Runs in a worker process: PyMuPDF rasterizes the page at dpi and hands it to
+# the Tesseract library it links against. Returns the recognized words as
+# (x0, y0, x1, y1, word) in page coordinates, and the seconds taken.
+def ocr_page_words(path, index, dpi, language, tessdata):
+    start = time.perf_counter()
+    with fitz.open(path) as doc:
+        page = doc[index]
+        textpage = page.get_textpage_ocr(flags=0, language=language, dpi=dpi, full=True, tessdata=tessdata)
+        words = [tuple(w[:5]) for w in page.get_text('words', textpage=textpage)]
+    return words, time.perf_counter() - start
+
+# Write recognized words over their pages as invisible text, keeping the page content as it was
+def write_ocr_text_layer(path, page_words, out_path):
+    font = fitz.Font('helv')
+    with fitz.open(path) as doc:
+        for idx, words in page_words.items():
+            page = doc[idx]
+            writer = fitz.TextWriter(page.rect)
+            for x0, y0, x1, y1, word in words:
+                height = max(1.0, y1 - y0)
+                writer.append((x0, y1 - height * 0.2), word, font=font, fontsize=height * 0.85)
+            writer.write_text(page, render_mode=3)
+        doc.save(out_path, garbage=3, deflate=True)
+
+def tesseract_available():
+    try:
+        return bool(OCR_TESSDATA or fitz.get_tessdata())
+    except Exception:
+        return False
+
+# Per-page OCR seconds of the tesseract engine, for the summary histogram
+OCR_PAGE_TIMES = []
+OCR_PAGE_BUCKETS = (0.5, 1, 2, 5, 10)
+
+def ocr_page_histogram():
+    if not OCR_PAGE_TIMES:
+        return "OCR page times: no pages OCR'd"
+    times = sorted(OCR_PAGE_TIMES)
+    counts = [0] * (len(OCR_PAGE_BUCKETS) + 1)
+    for t in times:
+        counts[next((i for i, b in enumerate(OCR_PAGE_BUCKETS) if t < b), len(OCR_PAGE_BUCKETS))] += 1
+    labels = [f"<{OCR_PAGE_BUCKETS[0]}s"] + [f"{a}-{b}s" for a, b in zip(OCR_PAGE_BUCKETS, OCR_PAGE_BUCKETS[1:])] + \
+             [f">={OCR_PAGE_BUCKETS[-1]}s"]
+    def pct(p):
+        return times[min(len(times) - 1, int(p * len(times)))]
+    return (f"OCR page times ({len(times)} pages): " + ', '.join(f"{l} {c}" for l, c in zip(labels, counts)) +
+            f"; p50 {pct(0.5):.2f}s, p95 {pct(0.95):.2f}s, max {times[-1]:.2f}s")
+
+class PageOcrEngine:
+    """
+    OCR pages rather than files: every page that needs OCR, from every
+    submitted file, goes into one queue feeding a pool of core_budget worker
+    processes, so a long scan is spread over all cores instead of being the
+    last file running. Once all of a file's pages are back, their words are
+    written over the original pages as an invisible text layer.
+
+    Same interface as OcrScheduler: submit(), submit_many(), wait() and
+    tasks, with on_done called once per file.
+    """
+    def __init__(self, core_budget=OCR_JOBS, on_done=None):
+        self.core_budget = max(1, core_budget)
+        self.on_done = on_done
+        self.cond = threading.Condition()
+        # (task, page index) in submission order, shared by all files
+        self.queue = deque()
+        self.inflight = 0
+        self.open_tasks = 0
+        self.tasks = []
+        self.pool = None
+        self.writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ocr-write')
+
+    def submit(self, path, ocr_pages=None):
+        return self.submit_many([path], {path: ocr_pages} if ocr_pages is not None else None)[0]
+
+    def submit_many(self, paths, ocr_pages=None):
+        ocr_pages = ocr_pages or {}
+        new_tasks = []
+        for path in paths:
+            selected = ocr_pages.get(path)
+            indices = list(selected) if selected is not None else list(range(pdf_page_count(path)))
+            new_tasks.append({'path': path, 'pages': len(indices), 'jobs': max(1, min(self.core_budget, len(indices))),
+                              'ok': False, 'ocr_pages': selected, 'output': path, 'words': {}, 'remaining': len(indices),
+                              'error': None, 'queued_at': time.perf_counter(), 'started_at': None, 'wait': 0.0, 'run': 0.0})
+        with self.cond:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.core_budget)
+            for task in new_tasks:
+                self.tasks.append(task)
+                self.open_tasks += 1
+                if not task['pages']:
+                    self.writer.submit(self._finish, task)
+                self.queue.extend((task, idx) for idx in (task['ocr_pages'] if task['ocr_pages'] is not None
+                                                          else range(task['pages'])))
+            self._dispatch()
+        return new_tasks
+
+    def _dispatch(self):
+        # Called with self.cond held; keeps exactly one page per worker in flight
+        while self.queue and self.inflight < self.core_budget:
+            task, idx = self.queue.popleft()
+            if task['started_at'] is None:
+                task['started_at'] = time.perf_counter()
+                task['wait'] = task['started_at'] - task['queued_at']
             try:
-                reader = PdfReader(path)
-                page_count = len(reader.pages)
-            except Exception:
-                page_count = 0
-            writer.writerow([
-                'email', fname,
-                entry.get('email_subject', ''),
-                entry.get('sender', ''),
-                entry.get('sent_on', ''),
-                '', '', '',
-                page_count, start_page,
-                email_merged_basename
-            ])
-            start_page += page_count
-        # Attachments
-        for entry in ATTACHMENT_INDEX_LIST:
-            writer.writerow([
-                'attachment',
-                entry.get('source_filename', ''),
-                '', '', '',
-                entry.get('attachment_name', ''),
-                '', '',
-                entry.get('page_count', 0),
-                entry.get('start_page', 0),
-                entry.get('merged_file', attachment_merged_basename)
-            ])
-        # Transcripts
-        start_page = 1
-        for entry in TRANSCRIPT_INDEX_LIST:
-            fname = entry.get('source_filename', '')
-            path = os.path.join(transcripts_dir, fname)
+                future = self.pool.submit(ocr_page_words, task['path'], idx, OCR_DPI, OCR_LANGUAGE, OCR_TESSDATA)
+            except Exception as e:
+                # Pool unusable (e.g. a worker died): fail the page without waiting on it
+                task['error'] = task['error'] or e
+                task['remaining'] -= 1
+                if not task['remaining']:
+                    self.writer.submit(self._finish, task)
+                continue
+            self.inflight += 1
+            LANES.acquire('ocr')
+            future.add_done_callback(lambda f, task=task, idx=idx: self._page_done(task, idx, f))
+
+    def _page_done(self, task, idx, future):
+        LANES.release('ocr')
+        try:
+            words, seconds = future.result()
+        except Exception as e:
+            words, seconds = None, 0.0
+            task['error'] = task['error'] or e
+        with self.cond:
+            self.inflight -= 1
+            if words is not None:
+                task['words'][idx] = words
+                OCR_PAGE_TIMES.append(seconds)
+            task['remaining'] -= 1
+            finished = not task['remaining']
+            self._dispatch()
+        if finished:
+            self.writer.submit(self._finish, task)
+
+    def _finish(self, task):
+        name = os.path.basename(task['path'])
+        out_path = task['path'].replace('.pdf', '_ocr.pdf')
+        try:
+            with TRACER.span('ocr.file', file=name, pages=task['pages'], engine='tesseract',
+                             wait=round(task['wait'], 3)) as span:
+                if task['error'] is not None:
+                    raise task['error']
+                write_ocr_text_layer(task['path'], task['words'], out_path)
+                task['ok'] = check_ocr_status(out_path)
+                if task['ok']:
+                    task['output'] = out_path
+                span.set(ok=task['ok'])
+        except Exception as e:
+            log(f"OCR exception for {name}: {e}")
+        task['words'] = {}
+        task['run'] = time.perf_counter() - (task['started_at'] or task['queued_at'])
+        log(f"{name}: OCR {'succeeded' if task['ok'] else 'failed'} "
+            f"({task['pages']} pages, waited {task['wait']:.1f}s, ran {task['run']:.1f}s)")
+        if self.on_done:
+            self.on_done(task)
+        with self.cond:
+            self.open_tasks -= 1
+            self.cond.notify_all()
+
+    def wait(self):
+        with self.cond:
+            while self.open_tasks:
+                self.cond.wait()
+        self.writer.shutdown()
+        if self.pool is not None:
+            self.pool.shutdown()
+        return list(self.tasks)
+
+# Stage scheduling
+class LaneMeter:
+    """
+    Utilization of the resources the stages compete for. Each lane has a
+    capacity (Outlook sessions, Drive connections, OCR cores, merge slots);
+    work holds some of its units while it runs. A lane's utilization is the
+    unit-seconds used over capacity x wall time, and 'active' is the share
+    of the run during which any of it was in use.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lanes = {}
+        self.start = time.perf_counter()
+
+    def reset(self, capacities):
+        with self.lock:
+            self.start = time.perf_counter()
+            self.lanes = {name: {'capacity': max(1, capacity), 'in_use': 0, 'since': self.start,
+                                 'unit_seconds': 0.0, 'active_seconds': 0.0}
+                          for name, capacity in capacities.items()}
+
+    def _advance(self, lane, now):
+        if lane['in_use']:
+            lane['unit_seconds'] += lane['in_use'] * (now - lane['since'])
+            lane['active_seconds'] += now - lane['since']
+        lane['since'] = now
+
+    def acquire(self, name, units=1):
+        with self.lock:
+            lane = self.lanes.setdefault(name, {'capacity': units, 'in_use': 0, 'since': self.start,
+                                                'unit_seconds': 0.0, 'active_seconds': 0.0})
+            self._advance(lane, time.perf_counter())
+            lane['in_use'] += units
+
+    def release(self, name, units=1):
+        with self.lock:
+            lane = self.lanes[name]
+            self._advance(lane, time.perf_counter())
+            lane['in_use'] -= units
+
+    @contextmanager
+    def busy(self, name, units=1):
+        self.acquire(name, units)
+        try:
+            yield
+        finally:
+            self.release(name, units)
+
+    def utilization(self):
+        """Return {lane: (utilization, active share)} for the run so far."""
+        with self.lock:
+            now = time.perf_counter()
+            wall = max(now - self.start, 1e-9)
+            result = {}
+            for name, lane in self.lanes.items():
+                self._advance(lane, now)
+                result[name] = (lane['unit_seconds'] / (lane['capacity'] * wall), lane['active_seconds'] / wall)
+            return result
+
+    def summary(self):
+        usage = self.utilization()
+        if not usage:
+            return "Lane utilization: no work recorded"
+        parts = [f"{name} {used:.0%} of {self.lanes[name]['capacity']} (active {active:.0%})"
+                 for name, (used, active) in usage.items()]
+        bottleneck = max(usage, key=lambda name: usage[name][0])
+        return f"Lane utilization: {', '.join(parts)}; busiest: {bottleneck}"
+
+LANES = LaneMeter()
+
+# Peak resident set size of this process in bytes, or None if it can't be read
+def peak_rss_bytes():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in bytes on macOS and in KB elsewhere
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + \
+                       [(name, ctypes.c_size_t) for name in (
+                           'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                           'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except Exception:
+        pass
+    return None
+
+class StageGraph:
+    """
+    Run named stages on their own threads, each as soon as the stages it
+    depends on have finished. A stage function is called with its
+    dependencies' results as positional arguments. If a stage raises, the
+    stages depending on it are skipped and the others carry on; run()
+    returns (results, errors) once everything has finished, where errors
+    maps each failed stage to its exception.
+    """
+    def __init__(self, on_done=None):
+        self.stages = {}
+        self.results = {}
+        self.errors = {}
+        # name -> (start, end) seconds from the start of run()
+        self.timings = {}
+        self.on_done = on_done
+        self.cond = threading.Condition()
+
+    def add(self, name, fn, deps=()):
+        missing = [d for d in deps if d not in self.stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stage(s): {', '.join(missing)}")
+        self.stages[name] = (fn, tuple(deps))
+
+    def _run(self, name, origin):
+        fn, deps = self.stages[name]
+        start = time.perf_counter() - origin
+        try:
+            with TRACER.span(f"stage.{name}"):
+                result = fn(*(self.results[d] for d in deps))
+            error = None
+        except Exception as e:
+            log(f"Stage {name} failed: {e}", level=logging.WARNING)
+            result, error = None, e
+        with self.cond:
+            self.timings[name] = (start, time.perf_counter() - origin)
+            if error is None:
+                self.results[name] = result
+            else:
+                self.errors[name] = error
+            self.cond.notify_all()
+        if self.on_done:
+            self.on_done(name)
+
+    def run(self):
+        origin = time.perf_counter()
+        started, skipped = set(), set()
+        threads = []
+        with self.cond:
+            while True:
+                for name, (_, deps) in self.stages.items():
+                    if name in started or name in skipped:
+                        continue
+                    if any(d in self.errors or d in skipped for d in deps):
+                        skipped.add(name)
+                        log(f"Stage {name} skipped: an upstream stage failed", level=logging.WARNING)
+                    elif all(d in self.results for d in deps):
+                        started.add(name)
+                        thread = threading.Thread(target=self._run, args=(name, origin), name=f"stage-{name}",
+                                                  daemon=True)
+                        thread.start()
+                        threads.append(thread)
+                if len(self.results) + len(self.errors) + len(skipped) == len(self.stages):
+                    break
+                self.cond.wait()
+        for thread in threads:
+            thread.join()
+        return self.results, self.errors
+
+class AttachmentOcr:
+    """
+    OCR stage for exported attachment PDFs. submit() may be called from any
+    thread as soon as an attachment is saved: the text-layer check and OCR
+    cache lookup run on a small intake pool, and files that need OCR go
+    straight to an OcrScheduler. A file submitted with the output an earlier
+    run recorded for it is settled with that output without being checked.
+    finish(pdfs) submits anything not seen yet, waits for all of it and
+    returns (PDFs to merge, failed inputs) in the order of pdfs.
+    """
+    def __init__(self, core_budget=OCR_JOBS, intake_workers=2):
+        self.lock = threading.Lock()
+        # Input PDF -> output path, or None when OCR failed
+        self.outcomes = {}
+        self.cache_keys = {}
+        self.submitted = {}
+        engine = PageOcrEngine if OCR_ENGINE == 'tesseract' else OcrScheduler
+        self.scheduler = engine(core_budget, on_done=self.ocr_done)
+        self.intake = ThreadPoolExecutor(max_workers=intake_workers, thread_name_prefix='ocr-intake')
+        if OCR_ENGINE == 'tesseract':
+            self.engine_available = tesseract_available()
+            self.engine_missing = "Tesseract language data not found (set [PDF] tessdata)"
+        else:
+            self.engine_available = shutil.which('ocrmypdf') is not None
+            self.engine_missing = "ocrmypdf not found"
+        self.bar = tqdm(desc="Attachment OCR/Processing", unit='file', position=3, leave=True)
+
+    def submit(self, pdf, output=None):
+        with self.lock:
+            if pdf in self.submitted:
+                return
+            job = (self.reuse, pdf, output) if output else (self.check, pdf)
+            self.submitted[pdf] = self.intake.submit(*job)
+            self.bar.total = len(self.submitted)
+            self.bar.refresh()
+
+    def settle(self, pdf, output):
+        with self.lock:
+            self.outcomes[pdf] = output
+        self.bar.update(1)
+
+    def reuse(self, pdf, output):
+        log(f"{os.path.basename(pdf)}: OCR output reused from the last run", level=logging.DEBUG)
+        with RUN_STATE_LOCK:
+            RUN_STATE_STATS['ocr_reused'] += 1
+        self.settle(pdf, output)
+
+    @traced('ocr.check')
+    def check(self, pdf):
+        TRACER.current().set(file=os.path.basename(pdf))
+        # If OCR not required, include all attachments as-is
+        if not OCR_REQUIRED:
+            return self.settle(pdf, pdf)
+        name = os.path.basename(pdf)
+        log(f"Processing attachment: {name}", level=logging.DEBUG)
+        # If PDF already contains text, skip OCR
+        ocr_pages = None
+        if not is_valid_pdf(pdf):
+            has_text = False
+        elif OCR_PAGE_LEVEL:
+            ocr_pages = pages_needing_ocr(pdf)
+            has_text = not ocr_pages
+        else:
+            has_text = check_ocr_status(pdf)
+        TRACER.current().set(has_text=has_text)
+        if has_text:
+            log(f"{name}: existing text detected, skipping OCR", level=logging.DEBUG)
+            return self.settle(pdf, pdf)
+        if OCR_CACHE_ENABLE:
             try:
-                reader = PdfReader(path)
-                page_count = len(reader.pages)
-            except Exception:
-                page_count = 0
-            writer.writerow([
-                'transcript', fname,
-                '', '', '', '',
-                entry.get('transcript_subject', ''),
-                entry.get('meeting_date', ''),
-                page_count, start_page,
-                transcript_merged_basename
-            ])
-            start_page += page_count
+                self.cache_keys[pdf] = ocr_cache_key(pdf)
+                cached_out = pdf.replace('.pdf', '_ocr.pdf')
+                hit = ocr_cache_fetch(self.cache_keys[pdf], cached_out)
+                TRACER.current().set(cache_hit=hit)
+                if hit:
+                    log(f"{name}: OCR result reused from cache")
+                    return self.settle(pdf, cached_out)
+            except Exception as e:
+                log(f"OCR cache lookup failed for {name}: {e}", level=logging.WARNING)
+        if not self.engine_available:
+            log(f"{self.engine_missing}, cannot OCR: {name}", level=logging.WARNING)
+            return self.settle(pdf, None)
+        if ocr_pages is not None and len(ocr_pages) < pdf_page_count(pdf):
+            log(f"{name}: queued for OCR of {len(ocr_pages)} of {pdf_page_count(pdf)} pages", level=logging.DEBUG)
+            self.scheduler.submit(pdf, ocr_pages)
+        else:
+            log(f"{name}: queued for OCR", level=logging.DEBUG)
+            self.scheduler.submit(pdf)
+
+    def ocr_done(self, task):
+        if task['ok'] and task['path'] in self.cache_keys:
+            try:
+                ocr_cache_store(self.cache_keys[task['path']], task['output'])
+            except Exception as e:
+                log(f"OCR cache store failed for {os.path.basename(task['path'])}: {e}", level=logging.WARNING)
+        self.settle(task['path'], task['output'] if task['ok'] else None)
+
+    def finish(self, pdfs):
+        for pdf in pdfs:
+            self.submit(pdf)
+        for pdf, future in list(self.submitted.items()):
+            try:
+                future.result()
+            except Exception as e:
+                log(f"Attachment check failed for {os.path.basename(pdf)}: {e}", level=logging.WARNING)
+                self.settle(pdf, None)
+        self.intake.shutdown()
+        self.scheduler.wait()
+        self.bar.close()
+        merged = [self.outcomes[p] for p in pdfs if self.outcomes.get(p)]
+        failures = [p for p in pdfs if not self.outcomes.get(p)]
+        return merged, failures
+
+    @property
+    def tasks(self):
+        return self.scheduler.tasks
+
+# Project index builder
+INDEX_HEADERS = ['type', 'source_filename', 'email_subject', 'sender', 'sent_on', 'attachment_name',
+                 'transcript_subject', 'meeting_date', 'page_count', 'start_page', 'merged_file',
+                 'matched_keywords', 'duplicate_of']
+
+def project_index_rows():
+    """
+    One row dict per index entry, from the page counts and locations recorded
+    while rendering and merging. Entries placed before this existed (no
+    start_page) are laid out one after another from the top of the first file.
+    """
+    rows = []
+    for kind, entries, merged_path in (('email', EMAIL_INDEX_LIST, CONSOLIDATED_EMAIL_PDF_PATH),
+                                       ('attachment', ATTACHMENT_INDEX_LIST, CONSOLIDATED_ATTACHMENT_PDF_PATH),
+                                       ('transcript', TRANSCRIPT_INDEX_LIST, CONSOLIDATED_TRANSCRIPT_PDF_PATH)):
+        next_page = 1
+        for entry in entries:
+            page_count = entry.get('page_count')
+            if page_count is None:
+                page_count = pdf_page_count(entry['source_path']) if entry.get('source_path') else 0
+            row = {h: entry.get(h, '') for h in INDEX_HEADERS}
+            row.update(type=kind, page_count=page_count, start_page=entry.get('start_page', next_page),
+                       merged_file=entry.get('merged_file', os.path.basename(merged_path or '')))
+            if 'start_page' not in entry:
+                next_page += page_count
+            rows.append(row)
+    return rows
+
+def write_index_manifest(path, rows):
+    files = [{'type': kind, 'merged_file': name, 'pages': pages}
+             for kind, parts in OUTPUT_PARTS.items() for name, pages in parts]
+    if path.endswith('.json'):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'generated': datetime.now().isoformat(timespec='seconds'), 'keywords': keywords,
+                       'files': files, 'entries': rows}, f, indent=1)
+        return
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("CREATE TABLE files (type TEXT, merged_file TEXT PRIMARY KEY, pages INTEGER)")
+        conn.execute(f"CREATE TABLE entries ({', '.join(INDEX_HEADERS)})")
+        conn.execute("CREATE INDEX entries_location ON entries (merged_file, start_page)")
+        conn.executemany("INSERT INTO files VALUES (:type, :merged_file, :pages)", files)
+        conn.executemany(f"INSERT INTO entries VALUES ({', '.join(':' + h for h in INDEX_HEADERS)})", rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+@traced('index.build')
+def build_project_index(output_csv='project_index.csv', manifest=None):
+    """
+    Write the project index CSV for the merged PDFs (and, with manifest set to
+    'json' or 'sqlite', a manifest of the output files and entries next to it)
+    without opening any PDF. Returns the manifest path, if one was written.
+    """
+    import csv
+    rows = project_index_rows()
+    with open(output_csv, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=INDEX_HEADERS)
+        writer.writeheader()
+        writer.writerows(rows)
+    TRACER.current().set(rows=len(rows))
+    if manifest not in ('json', 'sqlite'):
+        return None
+    path = f"{os.path.splitext(output_csv)[0]}.{manifest}"
+    write_index_manifest(path, rows)
+    return path
 
 # Updated transcript processing
-def process_transcripts():
+def process_transcripts(client=None):
+    paths = download_google_docs_from_drive(keywords, TRANSCRIPT_SAVE_PATH, client)
+    return merge_transcript_output(paths)
+
+# Index and merge (and split) the transcript PDFs; returns the valid ones
+def merge_transcript_output(paths):
     # Collect transcript metadata for index
     global TRANSCRIPT_INDEX_LIST
     TRANSCRIPT_INDEX_LIST.clear()
-    paths = download_google_docs_from_drive(keywords, TRANSCRIPT_SAVE_PATH)
     valid = [p for p in paths if is_valid_pdf(p)]
     # Build transcript metadata entries
     for p in valid:
@@ -714,188 +3646,523 @@ def process_transcripts():
         TRANSCRIPT_INDEX_LIST.append({
             'source_filename': fname,
             'transcript_subject': transcript_subject,
-            'meeting_date': meeting_date
+            'meeting_date': meeting_date,
+            'page_count': pdf_page_count(p)
         })
     if valid:
-        merge_pdfs(valid, CONSOLIDATED_TRANSCRIPT_PDF_PATH)
-        # Split transcripts PDF if over size limit
-        parts = split_pdf_by_size(CONSOLIDATED_TRANSCRIPT_PDF_PATH)
+        with LANES.busy('merge'):
+            parts, part_page_counts, merged = merge_to_parts(valid, CONSOLIDATED_TRANSCRIPT_PDF_PATH)
+        OUTPUT_PARTS['transcript'] = list(zip(map(os.path.basename, parts), part_page_counts))
         if len(parts) > 1:
             log(f"Split merged transcripts into {len(parts)} parts under {MAX_SPLIT_SIZE_MB}MB")
             for p in parts:
                 log(f"Transcript part: {p}")
+        if parts:
+            flag_unmerged(TRANSCRIPT_INDEX_LIST, valid, merged)
+            update_index_after_split(parts, TRANSCRIPT_INDEX_LIST, part_page_counts)
     return valid
 
+# Merge emails and split if necessary; returns the output parts
+def merge_email_output(emails):
+    if emails and STREAM_EMAIL_RENDER:
+        # Already rendered straight into the consolidated file or its parts
+        email_parts = emails
+        OUTPUT_PARTS['email'] = [(os.path.basename(p), pdf_page_count(p)) for p in email_parts]
+        if len(email_parts) > 1:
+            log(f"Rendered emails into {len(email_parts)} parts under {MAX_SPLIT_SIZE_MB}MB")
+            for p in email_parts:
+                log(f"Email part: {p}")
+        return email_parts
+    if not emails:
+        log("ℹ️ No email PDFs to merge.")
+        return []
+    with LANES.busy('merge'):
+        email_parts, part_page_counts, merged = merge_to_parts(emails, CONSOLIDATED_EMAIL_PDF_PATH, SPLIT_EMAILS)
+    OUTPUT_PARTS['email'] = list(zip(map(os.path.basename, email_parts), part_page_counts))
+    if len(email_parts) > 1:
+        log(f"Split merged emails into {len(email_parts)} parts under {MAX_SPLIT_SIZE_MB}MB")
+        for p in email_parts:
+            log(f"Email part: {p}")
+    if email_parts:
+        # One index entry per email PDF, in order; entries from older run state lack a page count
+        for entry in EMAIL_INDEX_LIST:
+            if 'page_count' not in entry:
+                entry['page_count'] = pdf_page_count(entry['source_path'])
+        flag_unmerged(EMAIL_INDEX_LIST, emails, merged)
+        update_index_after_split(email_parts, EMAIL_INDEX_LIST, part_page_counts)
+    return email_parts
+
+# Merge (and split) the OCR'd attachments, then point the index at the parts
+def merge_attachment_output(attachments_to_merge, failures=()):
+    """
+    attachments_to_merge are the OCR outputs of the merged (non-duplicate)
+    attachment index entries, in order, minus failures: the source PDFs whose
+    OCR failed. Their entries (and copies of them) are left without a location.
+    """
+    failed = set(failures)
+    for entry in ATTACHMENT_INDEX_LIST:
+        if not entry.get('duplicate_of') and entry.get('source_path') in failed:
+            entry['omitted'] = True
+    if not attachments_to_merge:
+        log("ℹ️ No attachments merged.")
+        return []
+    with LANES.busy('merge'):
+        # Split attachments or retain single file based on config
+        parts, part_page_counts, merged = merge_to_parts(attachments_to_merge, CONSOLIDATED_ATTACHMENT_PDF_PATH,
+                                                         SPLIT_ATTACHMENTS)
+    OUTPUT_PARTS['attachment'] = list(zip(map(os.path.basename, parts), part_page_counts))
+    if len(parts) > 1:
+        log(f"Split merged attachments into {len(parts)} parts under {MAX_SPLIT_SIZE_MB}MB")
+        for p in parts:
+            log(f"Attachment part: {p}")
+    # Update attachment index entries after merge/split
+    if parts:
+        flag_unmerged(ATTACHMENT_INDEX_LIST, attachments_to_merge, merged)
+        update_index_after_split(parts, ATTACHMENT_INDEX_LIST, part_page_counts)
+    return parts
+
+# Text corpus
+# With [CORPUS] enable, every exported email (its rendered text), attachment
+# (after OCR) and transcript is stored in an SQLite database shared by all
+# keyword sets: one row per document with its index metadata and a stored
+# copy of the PDF, and one FTS5 row per page. `query <keywords>` then builds
+# the consolidated PDFs and project index for a new keyword set from it.
+CORPUS_CONN = None
+CORPUS_LOCK = threading.Lock()
+CORPUS_STATS = {'emails': 0, 'attachments': 0, 'transcripts': 0, 'reused': 0, 'pages': 0}
+CORPUS_FTS_TOKENIZE = "trigram"
+
+def corpus_connect():
+    global CORPUS_CONN
+    with CORPUS_LOCK:
+        if CORPUS_CONN is None:
+            os.makedirs(os.path.join(CORPUS_DIR, 'docs'), exist_ok=True)
+            conn = sqlite3.connect(os.path.join(CORPUS_DIR, 'corpus.sqlite'), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS documents ("
+                         "doc_id INTEGER PRIMARY KEY, kind TEXT, key TEXT UNIQUE, modified TEXT, metadata TEXT, "
+                         "details TEXT, match_text TEXT, artifact TEXT, page_count INTEGER)")
+            # Attachments of each email, in the order they were attached
+            conn.execute("CREATE TABLE IF NOT EXISTS links ("
+                         "email_id INTEGER, seq INTEGER, attachment_id INTEGER, attachment_name TEXT, "
+                         "PRIMARY KEY (email_id, seq))")
+            try:
+                # Trigram tokens make MATCH a substring search, like the keyword matcher
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5("
+                             f"text, doc_id UNINDEXED, page UNINDEXED, tokenize='{CORPUS_FTS_TOKENIZE}')")
+            except sqlite3.OperationalError:
+                # SQLite before 3.34 has no trigram tokenizer; queries then scan every email
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(text, doc_id UNINDEXED, page UNINDEXED)")
+            conn.commit()
+            CORPUS_CONN = conn
+    return CORPUS_CONN
+
+def corpus_commit():
+    if CORPUS_CONN is not None:
+        with CORPUS_LOCK:
+            CORPUS_CONN.commit()
+
+# Insert or update a document row, keeping its doc_id; returns the doc_id
+def corpus_upsert(conn, kind, key, modified, metadata, page_texts, details=None, match_text=None, artifact=None):
+    conn.execute("INSERT INTO documents (kind, key, modified, metadata, details, match_text, artifact, page_count) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET kind = excluded.kind, "
+                 "modified = excluded.modified, metadata = excluded.metadata, details = excluded.details, "
+                 "match_text = excluded.match_text, artifact = excluded.artifact, page_count = excluded.page_count",
+                 (kind, key, modified, json.dumps(metadata), json.dumps(details) if details else None,
+                  match_text or None, artifact, len(page_texts)))
+    doc_id = conn.execute("SELECT doc_id FROM documents WHERE key = ?", (key,)).fetchone()[0]
+    conn.execute("DELETE FROM pages WHERE doc_id = ?", (doc_id,))
+    conn.executemany("INSERT INTO pages (text, doc_id, page) VALUES (?, ?, ?)",
+                     [(text, doc_id, n) for n, text in enumerate(page_texts, 1)])
+    CORPUS_STATS['pages'] += len(page_texts)
+    return doc_id
+
+# Store an email's fields; its pages are the rendered lines, split as the renderer splits them
+def corpus_add_email(corpus, details, meta):
+    lines = email_lines(details)
+    pages = ['\n'.join(lines[i:i + EMAIL_LINES_PER_PAGE]) for i in range(0, len(lines), EMAIL_LINES_PER_PAGE)]
+    metadata = {k: meta[k] for k in ('email_subject', 'sender', 'sent_on')}
+    conn = corpus_connect()
+    with CORPUS_LOCK:
+        corpus_upsert(conn, 'email', corpus['key'], corpus['modified'], metadata, pages,
+                      details=details, match_text=corpus['match_text'])
+    CORPUS_STATS['emails'] += 1
+
+# Store a PDF (attachment after OCR, or transcript) with its page text; returns its doc_id
+def corpus_add_file(kind, key, path, metadata):
+    conn = corpus_connect()
+    with CORPUS_LOCK:
+        row = conn.execute("SELECT doc_id, artifact FROM documents WHERE key = ?", (key,)).fetchone()
+    # Keyed by content, so a stored copy never goes stale
+    if row and row[1] and os.path.exists(os.path.join(CORPUS_DIR, row[1])):
+        CORPUS_STATS['reused'] += 1
+        return row[0]
+    with fitz.open(path) as doc:
+        pages = [page.get_text() for page in doc]
+    artifact = os.path.join('docs', hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pdf')
+    shutil.copyfile(path, os.path.join(CORPUS_DIR, artifact))
+    with CORPUS_LOCK:
+        doc_id = corpus_upsert(conn, kind, key, None, metadata, pages, artifact=artifact)
+    CORPUS_STATS[kind + 's'] += 1
+    return doc_id
+
+def corpus_ingest(attachment_pdfs, ocr_outputs, transcript_paths):
+    """
+    Add this run's attachments (as OCR'd; failed ones are left out, as they
+    are from the merge) and transcripts to the corpus, and link attachments
+    to the emails that carried them. Emails are added as they are exported.
+    """
+    conn = corpus_connect()
+    doc_ids = {}
+    merged = [e for e in ATTACHMENT_INDEX_LIST if not e.get('duplicate_of')]
+    for entry, pdf in zip(merged, attachment_pdfs):
+        output = ocr_outputs.get(pdf)
+        if not output or not entry.get('sha256'):
+            continue
+        try:
+            doc_ids[entry['sha256']] = corpus_add_file('attachment', entry['sha256'], output,
+                                                       {'source_filename': entry['source_filename']})
+        except Exception as e:
+            log(f"Corpus: could not store {entry['source_filename']}: {e}", level=logging.WARNING)
+    carriers = {}
+    for entry in ATTACHMENT_INDEX_LIST:
+        if entry.get('email_key') and entry.get('sha256') in doc_ids:
+            carriers.setdefault(entry['email_key'], []).append((doc_ids[entry['sha256']], entry['attachment_name']))
+    with CORPUS_LOCK:
+        for email_key, atts in carriers.items():
+            row = conn.execute("SELECT doc_id FROM documents WHERE key = ? AND kind = 'email'", (email_key,)).fetchone()
+            if not row:
+                continue
+            conn.execute("DELETE FROM links WHERE email_id = ?", (row[0],))
+            conn.executemany("INSERT INTO links (email_id, seq, attachment_id, attachment_name) VALUES (?, ?, ?, ?)",
+                             [(row[0], seq, att_id, name) for seq, (att_id, name) in enumerate(atts)])
+    for entry, path in zip(TRANSCRIPT_INDEX_LIST, transcript_paths):
+        try:
+            corpus_add_file('transcript', 'transcript:' + file_sha256(path), path,
+                            {'transcript_subject': entry['transcript_subject'],
+                             'meeting_date': entry['meeting_date'], 'name': os.path.basename(path)})
+        except Exception as e:
+            log(f"Corpus: could not store {os.path.basename(path)}: {e}", level=logging.WARNING)
+    corpus_commit()
+    summary = (f"Corpus: {CORPUS_STATS['emails']} emails, {CORPUS_STATS['attachments']} attachments and "
+               f"{CORPUS_STATS['transcripts']} transcripts stored ({CORPUS_STATS['pages']} pages indexed), "
+               f"{CORPUS_STATS['reused']} already present: {CORPUS_DIR}")
+    return summary
+
+# Emails that could match, from the page index, or None when it can't narrow them down
+def corpus_email_candidates(conn, _keywords):
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'pages'").fetchone()
+    if not sql or CORPUS_FTS_TOKENIZE not in sql[0]:
+        return None
+    # Every word of a keyword must be on some page of the document; each word
+    # needs three characters for a trigram lookup
+    words_per_keyword = [k.split() for k in _keywords]
+    if not words_per_keyword or any(len(w) < 3 for words in words_per_keyword for w in words):
+        return None
+    candidates = set()
+    for words in words_per_keyword:
+        docs = None
+        for word in words:
+            rows = conn.execute("SELECT DISTINCT doc_id FROM pages WHERE pages MATCH ?",
+                                ('"' + word.replace('"', '""') + '"',))
+            hits = {int(r[0]) for r in rows}
+            docs = hits if docs is None else docs & hits
+        candidates |= docs
+    return candidates
+
+def run_corpus_query():
+    """
+    Build the consolidated PDFs and project index for the current keywords
+    from the corpus: matching emails are drawn again from their stored
+    fields, their attachments and the transcripts whose names match are
+    merged from the stored copies. Emails are matched exactly as an export
+    matches them; the page index only narrows down which ones to check.
+    """
+    global EMAIL_INDEX_LIST, ATTACHMENT_INDEX_LIST
+    if not os.path.exists(os.path.join(CORPUS_DIR, 'corpus.sqlite')):
+        raise FileNotFoundError(f"No corpus at {CORPUS_DIR}; run an export with [CORPUS] enable = yes first")
+    start = time.perf_counter()
+    conn = corpus_connect()
+    matcher = build_keyword_matcher()
+    EMAIL_INDEX_LIST.clear()
+    ATTACHMENT_INDEX_LIST.clear()
+    candidates = corpus_email_candidates(conn, keywords)
+    renderer = EmailStreamRenderer(CONSOLIDATED_EMAIL_PDF_PATH, MAX_SPLIT_SIZE_MB if SPLIT_EMAILS else None)
+    collapser = ThreadCollapser(THREAD_SIMILARITY) if COLLAPSE_THREADS else None
+    checked = 0
+    matched = []
+    rows = conn.execute("SELECT doc_id, metadata, details, match_text FROM documents WHERE kind = 'email' ORDER BY doc_id")
+    for doc_id, metadata, details, match_text in rows.fetchall():
+        if candidates is not None and doc_id not in candidates and not match_text:
+            continue
+        checked += 1
+        details = json.loads(details)
+        found = matcher.find(details['subject'], details['body'].strip() or match_text or '')
+        if not found:
+            continue
+        meta = dict(json.loads(metadata), matched_keywords='; '.join(found))
+        shown, pending = collapser.collapse(details) if collapser else (details, None)
+        entry = renderer.add(shown, dict({'source_filename': ''}, **meta))
+        if collapser:
+            collapser.record(pending, shown, entry, renderer.part_number())
+        EMAIL_INDEX_LIST.append(entry)
+        matched.append((doc_id, meta))
+    renderer.close()
+    # Attachments of the matched emails, deduplicated as in an export
+    pdfs, merged_by_id = [], {}
+    for email_id, meta in matched:
+        links = conn.execute("SELECT d.doc_id, d.key, d.metadata, d.artifact, d.page_count, l.attachment_name "
+                             "FROM links l JOIN documents d ON d.doc_id = l.attachment_id "
+                             "WHERE l.email_id = ? ORDER BY l.seq", (email_id,)).fetchall()
+        for att_id, key, att_meta, artifact, page_count, name in links:
+            entry = {
+                'source_filename': json.loads(att_meta)['source_filename'],
+                'attachment_name': name,
+                'email_subject': meta['email_subject'],
+                'sender': meta['sender'],
+                'sent_on': meta['sent_on'],
+                'page_count': page_count,
+                'start_page': 0,
+                'merged_file': os.path.basename(CONSOLIDATED_ATTACHMENT_PDF_PATH),
+                'matched_keywords': meta['matched_keywords'],
+                'sha256': key
+            }
+            if ATTACHMENT_DEDUP and att_id in merged_by_id:
+                entry['duplicate_of'] = merged_by_id[att_id]['source_filename']
+                ATTACHMENT_DEDUP_STATS['duplicates'] += 1
+                ATTACHMENT_DEDUP_STATS['pages'] += page_count
+            else:
+                merged_by_id[att_id] = entry
+                pdfs.append(os.path.join(CORPUS_DIR, artifact))
+            ATTACHMENT_INDEX_LIST.append(entry)
+    merge_attachment_output(pdfs)
+    # Transcripts are selected by name, as the Drive download selects them
+    transcripts, reserved = [], set()
+    for metadata, artifact in conn.execute("SELECT metadata, artifact FROM documents WHERE kind = 'transcript' "
+                                           "ORDER BY doc_id").fetchall():
+        name = json.loads(metadata)['name']
+        if transcript_name_matches(name, keywords):
+            path = reserve_attachment_path(TRANSCRIPT_SAVE_PATH, name, reserved)
+            try:
+                os.link(os.path.join(CORPUS_DIR, artifact), path)
+            except OSError:
+                shutil.copyfile(os.path.join(CORPUS_DIR, artifact), path)
+            transcripts.append(path)
+    merge_transcript_output(transcripts)
+    output_csv = os.path.join(BASE_FOLDER, f"project_index_{PROJECT_SAFE}_{DATE_STR}.csv")
+    build_project_index(output_csv, INDEX_MANIFEST)
+    total = conn.execute("SELECT COUNT(*) FROM documents WHERE kind = 'email'").fetchone()[0]
+    return (f"Corpus query: {len(matched)} of {total} emails matched ({checked} checked after the page index), "
+            f"{len(pdfs)} attachments ({ATTACHMENT_DEDUP_STATS['duplicates']} duplicate copies), "
+            f"{len(transcripts)} transcripts in {time.perf_counter() - start:.1f}s; index: {output_csv}")
+
 # Main execution
 if __name__ == '__main__':
+    if args.command:
+        # query <keywords>: answer from the corpus, without Outlook or Drive
+        if args.command[0] != 'query' or len(args.command) < 2:
+            parser.error("unknown command; usage: query <comma-separated keywords>")
+        initialize_paths_and_logging(' '.join(args.command[1:]))
+        log(f"--- {SCRIPT_NAME} {__version__} corpus query: {', '.join(keywords)} ---")
+        try:
+            log(run_corpus_query())
+        except Exception as e:
+            log(f"Corpus query failed: {e}", level=logging.ERROR)
+            LOG_FILE_HANDLER.flush()
+            sys.exit(1)
+        for path in [EMAIL_SAVE_PATH, ATTACHMENT_SAVE_PATH, TRANSCRIPT_SAVE_PATH]:
+            shutil.rmtree(path, ignore_errors=True)
+        LOG_FILE_HANDLER.flush()
+        sys.exit(0)
     initialize_paths_and_logging()
     log(f"--- {SCRIPT_NAME} {__version__} STARTED ---")
     overall_start = datetime.now()
+    if TRACE_FILE:
+        TRACER.enable()
+    profiler = None
+    if PROFILE:
+        profiler = Profiler(PROFILE_SAMPLE_EVERY)
+        profiler.install(globals())
+        log(f"Profiling enabled: sampling 1 in {PROFILE_SAMPLE_EVERY} calls of {len(PROFILE_TARGETS)} hot functions")
 
-    # Setup overall progress bar
-    total_stages = 3
-    stage_pct = 100 / total_stages
+    # Stages run as a dependency graph: transcripts download while emails are
+    # exported, attachments are OCR'd as they are saved, and each merge starts
+    # once its inputs are complete
+    LANES.reset({'outlook': 1, 'drive': DRIVE_DOWNLOAD_WORKERS, 'ocr': OCR_JOBS, 'merge': 3})
     overall_bar = tqdm(total=100, desc="Overall Progress", position=0, leave=True)
-
-    # Stage 1: Email processing
-    stage1_start = datetime.now()
-    emails, atts = process_emails()
-    stage1_end = datetime.now()
-    stage1_elapsed = stage1_end - stage1_start
-    overall_bar.update(stage_pct)
-
-    # Stage 2: Transcript processing
-    stage2_start = datetime.now()
+    attachment_ocr = AttachmentOcr(OCR_JOBS)
+    graph = StageGraph(on_done=lambda _name: overall_bar.update(100 / len(graph.stages)))
+    graph.add('emails', lambda: process_emails(on_attachment=attachment_ocr.submit))
     if GOOGLE_DRIVE_ENABLE:
-        trans_paths = process_transcripts()
+        graph.add('transcripts', process_transcripts)
     else:
         log("Transcript download disabled by config.")
-        trans_paths = []
-    stage2_end = datetime.now()
-    stage2_elapsed = stage2_end - stage2_start
-    overall_bar.update(stage_pct)
-
-    # Stage 3: Attachment OCR / processing
-    stage3_start = datetime.now()
-    attachments_to_merge, failures = [], []
-    total_atts = len(atts)
-    if total_atts == 0:
+    graph.add('attachment_ocr', lambda exported: attachment_ocr.finish(exported[1]), deps=['emails'])
+    graph.add('email_merge', lambda exported: merge_email_output(exported[0]), deps=['emails'])
+    graph.add('attachment_merge', lambda ocr: merge_attachment_output(*ocr), deps=['attachment_ocr'])
+    if INCREMENTAL_EXPORT:
+        graph.add('ocr_state', lambda _ocr: run_state_record_ocr(attachment_ocr.outcomes), deps=['attachment_ocr'])
+    if CORPUS_ENABLE:
+        graph.add('corpus', lambda exported, _ocr, *transcripts: corpus_ingest(
+            exported[1], attachment_ocr.outcomes, transcripts[0] if transcripts else []),
+            deps=['emails', 'attachment_ocr'] + (['transcripts'] if GOOGLE_DRIVE_ENABLE else []))
+    try:
+        results, stage_errors = graph.run()
+    finally:
+        overall_bar.close()
+    # Without the export there is nothing to index; any other failed stage only loses its own output
+    if 'emails' in stage_errors:
+        raise stage_errors['emails']
+    for name, error in stage_errors.items():
+        log(f"Stage {name} failed, continuing without its output: {error}", level=logging.ERROR)
+    emails, atts = results['emails']
+    trans_paths = results.get('transcripts', [])
+    attachments_to_merge, failures = results.get('attachment_ocr', ([], list(atts)))
+    ocr_tasks = attachment_ocr.tasks
+    if not atts:
         log("ℹ️ No attachments to process.")
-    else:
-        # Process attachments with per-file progress bar
-        with tqdm(atts,
-                  desc="Attachment OCR/Processing",
-                  unit='file', position=1, leave=True) as attach_bar:
-            for pdf in attach_bar:
-                # If OCR not required, include all attachments as-is
-                if not OCR_REQUIRED:
-                    attachments_to_merge.append(pdf)
-                    overall_bar.update(stage_pct / total_atts)
-                    continue
-                name = os.path.basename(pdf)
-                attach_bar.set_postfix_str(name)
-                log(f"Processing attachment: {name}")
-                # If PDF already contains text, skip OCR
-                if is_valid_pdf(pdf) and check_ocr_status(pdf):
-                    log(f"{name}: existing text detected, skipping OCR")
-                    attachments_to_merge.append(pdf)
-                else:
-                    # Perform OCR
-                    if shutil.which('ocrmypdf') is None:
-                        log(f"ocrmypdf not found, cannot OCR: {name}")
-                        failures.append(pdf)
-                    else:
-                        log(f"{name}: performing OCR (timeout {OCR_TIMEOUT_SECONDS}s)")
-                        try:
-                            ok, outp = ocr_pdf_task(pdf)
-                            if ok:
-                                log(f"{name}: OCR succeeded -> {os.path.basename(outp)}")
-                                attachments_to_merge.append(outp)
-                            else:
-                                log(f"{name}: OCR failed, skipping merge")
-                                failures.append(pdf)
-                        except Exception as e:
-                            log(f"OCR exception for {name}: {e}")
-                            failures.append(pdf)
-                # Update overall progress
-                overall_bar.update(stage_pct / total_atts)
-    # End of attachments processing timing
-    stage3_end = datetime.now()
-    stage3_elapsed = stage3_end - stage3_start
-    # Close overall progress bar at end of processing
-    overall_bar.close()
-
-    # Merge and finalize
-    # Merge emails and split if necessary
-    if emails:
-        merge_pdfs(emails, CONSOLIDATED_EMAIL_PDF_PATH)
-        # Split emails PDF if over size limit
-        email_parts = split_pdf_by_size(CONSOLIDATED_EMAIL_PDF_PATH)
-        if len(email_parts) > 1:
-            log(f"Split merged emails into {len(email_parts)} parts under {MAX_SPLIT_SIZE_MB}MB")
-            for p in email_parts:
-                log(f"Email part: {p}")
-    else:
-        log("ℹ️ No email PDFs to merge.")
-
-    if attachments_to_merge:
-        merge_pdfs(attachments_to_merge, CONSOLIDATED_ATTACHMENT_PDF_PATH)
-        # Split attachments or retain single file based on config
-        if SPLIT_ATTACHMENTS:
-            parts = split_pdf_by_size(CONSOLIDATED_ATTACHMENT_PDF_PATH)
-            if len(parts) > 1:
-                log(f"Split merged attachments into {len(parts)} parts under {MAX_SPLIT_SIZE_MB}MB")
-                for p in parts:
-                    log(f"Attachment part: {p}")
-        else:
-            parts = [CONSOLIDATED_ATTACHMENT_PDF_PATH]
-        # Update attachment index entries after merge/split
-        update_attachment_index_after_split(parts, ATTACHMENT_INDEX_LIST)
-    else:
-        log("ℹ️ No attachments merged.")
+    lane_summary = LANES.summary()
+    stage_summary = (f"Failed stages: {', '.join(f'{name} ({error})' for name, error in stage_errors.items())}"
+                     if stage_errors else "Failed stages: none")
 
     overall_end = datetime.now()
     overall_elapsed = overall_end - overall_start
     # Compute OCR success count for attachments
     success_count = len(attachments_to_merge)
+    if ocr_tasks:
+        waits = [t['wait'] for t in ocr_tasks]
+        runs = [t['run'] for t in ocr_tasks]
+        ocr_summary = (f"OCR {'page queue' if OCR_ENGINE == 'tesseract' else 'scheduler'}: "
+                       f"{len(ocr_tasks)} files on {OCR_JOBS} cores, "
+                       f"queue wait avg {sum(waits) / len(waits):.1f}s / max {max(waits):.1f}s, "
+                       f"run avg {sum(runs) / len(runs):.1f}s / max {max(runs):.1f}s")
+    else:
+        ocr_summary = "OCR scheduler: no files needed OCR"
+    if OCR_ENGINE == 'tesseract':
+        ocr_summary += f"\n{ocr_page_histogram()}"
+    ocr_cache_summary = (f"OCR cache: {OCR_CACHE_STATS['hits']} hits, {OCR_CACHE_STATS['misses']} misses, "
+                         f"{OCR_CACHE_STATS['bytes_reused'] / (1024 * 1024):.1f} MB reused"
+                         if OCR_CACHE_ENABLE else "OCR cache: disabled")
+    incremental_summary = (f"Incremental export: {RUN_STATE_STATS['reused']} emails reused, "
+                           f"{RUN_STATE_STATS['exported']} new or modified exported, "
+                           f"{RUN_STATE_STATS['match_hits']} keyword checks skipped, "
+                           f"{RUN_STATE_STATS['ocr_reused']} attachment OCR outputs reused"
+                           if INCREMENTAL_EXPORT else "Incremental export: disabled")
+    dedup_summary = (f"Attachment dedup: {ATTACHMENT_DEDUP_STATS['duplicates']} duplicate copies reused, "
+                     f"{ATTACHMENT_DEDUP_STATS['bytes'] / (1024 * 1024):.1f} MB and {ATTACHMENT_DEDUP_STATS['pages']} pages "
+                     f"not converted, OCR'd or merged again"
+                     if ATTACHMENT_DEDUP else "Attachment dedup: disabled")
+    thread_summary = (f"Thread collapse: {THREAD_COLLAPSE_STATS['paragraphs']} quoted paragraphs "
+                      f"({THREAD_COLLAPSE_STATS['chars'] / 1024:.0f} KB of text) omitted from "
+                      f"{THREAD_COLLAPSE_STATS['messages']} messages"
+                      if COLLAPSE_THREADS else "Thread collapse: disabled")
+    drive_summary = (f"Transcript download: {DRIVE_STATS['downloaded']} downloaded "
+                     f"({DRIVE_STATS['bytes'] / (1024 * 1024):.1f} MB), {DRIVE_STATS['reused']} reused from the store, "
+                     f"{DRIVE_STATS['listed']} listed in {DRIVE_STATS['pages']} pages, "
+                     f"{DRIVE_STATS['changes']} changes read, {DRIVE_STATS['retries']} retries, "
+                     f"{DRIVE_STATS['failed']} failed"
+                     if GOOGLE_DRIVE_ENABLE else "Transcript download: disabled")
+    converter_summary = (CONVERTER_POOL.summary() if CONVERTER_POOL is not None
+                         else "Office conversion: no documents converted")
+    peak_rss = peak_rss_bytes()
+    enumeration_summary = (f"Mailbox enumeration: {ENUMERATION_STATS['scanned']} items scanned in "
+                           f"{ENUMERATION_STATS['folders']} folders, {ENUMERATION_STATS['matched']} matched, "
+                           f"at most {ENUMERATION_STATS['peak_inflight']} in flight; peak RSS "
+                           + (f"{peak_rss / (1024 * 1024):.0f} MB" if peak_rss else "unavailable"))
+    corpus_summary = results.get('corpus', "Corpus: not updated (stage failed or skipped)" if CORPUS_ENABLE
+                                 else "Corpus: disabled")
+    compact_mb = {k: COMPACT_STATS[k] / (1024 * 1024) for k in ('bytes_in', 'bytes_out')}
+    compaction_summary = (f"Compaction: {COMPACT_STATS['files']} files, {compact_mb['bytes_in']:.1f}MB -> "
+                          f"{compact_mb['bytes_out']:.1f}MB ({compact_mb['bytes_in'] - compact_mb['bytes_out']:.1f}MB saved), "
+                          f"{COMPACT_STATS['parts_avoided']} parts avoided"
+                          if COMPACT_OUTPUT else "Compaction: disabled")
+    registry_summary = (f"Document registry: {DOC_REGISTRY_STATS['parses']} parses "
+                        f"({DOC_REGISTRY_STATS['parse_seconds']:.1f}s), "
+                        f"{DOC_REGISTRY_STATS['hits']} of {DOC_REGISTRY_STATS['lookups']} lookups served from memory "
+                        f"(~{DOC_REGISTRY_STATS['seconds_saved']:.1f}s saved)")
 
     # Summary output
     print("\n=== Processing Summary ===")
-    print(f"Emails downloaded: {len(emails)}")
-    print(f"Emails merged: {len(emails)}")
+    print(f"Emails downloaded: {len(EMAIL_INDEX_LIST)}")
+    print(f"Emails merged: {len(EMAIL_INDEX_LIST)}")
     print(f"Attachments downloaded: {len(atts)}")
     print(f"Attachments OCR succeeded: {success_count}")
     print(f"Attachments OCR failed: {len(failures)}")
     print(f"Attachments merged: {len(attachments_to_merge)}")
     print(f"Transcripts downloaded: {len(trans_paths)}")
     print(f"Transcripts merged: {len(trans_paths)}")
+    print(enumeration_summary)
+    print(drive_summary)
+    print(incremental_summary)
+    print(converter_summary)
+    print(dedup_summary)
+    print(thread_summary)
+    print(ocr_summary)
+    print(ocr_cache_summary)
+    print(compaction_summary)
+    print(registry_summary)
+    print(corpus_summary)
     if failures:
         print("\nFailed OCR attachments:")
         for f in failures:
             print(f" - {os.path.basename(f)}")
+    if ocr_tasks:
+        print("\nOCR timings (queue wait / run):")
+        for t in ocr_tasks:
+            print(f" - {os.path.basename(t['path'])}: {t['wait']:.1f}s / {t['run']:.1f}s ({t['jobs']} jobs)")
     # Print timing information
-    print("\nStage durations:")
-    print(f" - Email processing: {stage1_elapsed}")
-    print(f" - Transcript processing: {stage2_elapsed}")
-    print(f" - Attachment processing: {stage3_elapsed}")
+    print("\nStage timeline (seconds from start):")
+    for name, (start, end) in sorted(graph.timings.items(), key=lambda item: item[1]):
+        print(f" - {name}: {start:.1f} -> {end:.1f} ({end - start:.1f}s)")
+    print(lane_summary)
+    print(stage_summary)
     print(f"Total runtime: {overall_elapsed}")
     
-    # Log summary to log_messages
+    # Log summary to the log file
     log("=== Processing Summary ===")
-    log(f"Emails downloaded: {len(emails)}")
-    log(f"Emails merged: {len(emails)}")
+    log(f"Emails downloaded: {len(EMAIL_INDEX_LIST)}")
+    log(f"Emails merged: {len(EMAIL_INDEX_LIST)}")
     log(f"Attachments downloaded: {len(atts)}")
     log(f"Attachments OCR succeeded: {success_count}")
     log(f"Attachments OCR failed: {len(failures)}")
     log(f"Attachments merged: {len(attachments_to_merge)}")
     log(f"Transcripts downloaded: {len(trans_paths)}")
     log(f"Transcripts merged: {len(trans_paths)}")
+    log(enumeration_summary)
+    log(drive_summary)
+    log(incremental_summary)
+    log(converter_summary)
+    log(dedup_summary)
+    log(thread_summary)
+    log(ocr_summary)
+    log(ocr_cache_summary)
+    log(compaction_summary)
+    log(registry_summary)
+    log(corpus_summary)
     if failures:
         log("Failed OCR attachments:")
         for f in failures:
             log(f" - {os.path.basename(f)}")
+    if ocr_tasks:
+        log("OCR timings (queue wait / run):")
+        for t in ocr_tasks:
+            log(f" - {os.path.basename(t['path'])}: {t['wait']:.1f}s / {t['run']:.1f}s ({t['jobs']} jobs)")
     # Log timing information
-    log("Stage durations:")
-    log(f" - Email processing: {stage1_elapsed}")
-    log(f" - Transcript processing: {stage2_elapsed}")
-    log(f" - Attachment processing: {stage3_elapsed}")
+    log("Stage timeline (seconds from start):")
+    for name, (start, end) in sorted(graph.timings.items(), key=lambda item: item[1]):
+        log(f" - {name}: {start:.1f} -> {end:.1f} ({end - start:.1f}s)")
+    log(lane_summary)
+    log(stage_summary)
     log(f"Total runtime: {overall_elapsed}")
 
-    # Write log to file
-    with open(LOG_FILE, 'w', encoding='utf-8') as lf:
-        lf.write("\n".join(log_messages))
     # Build project index CSV for merged PDFs
     try:
-        # Generate index for individual PDFs in email, attachment, and transcript folders
+        # Index every entry by its part and page, from the page counts recorded while merging
         # Name index CSV with project and date
         output_csv = os.path.join(BASE_FOLDER, f"project_index_{PROJECT_SAFE}_{DATE_STR}.csv")
-        build_project_index(
-            emails_dir=EMAIL_SAVE_PATH,
-            attachments_dir=ATTACHMENT_SAVE_PATH,
-            transcripts_dir=TRANSCRIPT_SAVE_PATH,
-            output_csv=output_csv
-        )
-        msg = f"Project index generated: {output_csv}"
+        manifest = build_project_index(output_csv, INDEX_MANIFEST)
+        msg = f"Project index generated: {output_csv}" + (f" (manifest: {manifest})" if manifest else "")
         print(msg)
         log(msg)
     except Exception as e:
@@ -903,6 +4170,19 @@ if __name__ == '__main__':
         err = f"Failed to generate {os.path.basename(output_csv)}: {e}"
         print(err)
         log(err)
+    if TRACE_FILE:
+        trace_path = TRACE_FILE if os.path.isabs(TRACE_FILE) else os.path.join(BASE_FOLDER, TRACE_FILE)
+        try:
+            log(f"Trace: {TRACER.export(trace_path)} spans written to {trace_path}")
+        except Exception as e:
+            log(f"Trace export failed: {e}", level=logging.WARNING)
+    if profiler:
+        profile_path = os.path.join(BASE_FOLDER, f"profile_{PROJECT_SAFE}_{DATE_STR}.txt")
+        try:
+            profiler.report(profile_path)
+            log(f"Profile written to {profile_path}")
+        except Exception as e:
+            log(f"Profile report failed: {e}", level=logging.WARNING)
     # Cleanup temporary files and folders
     try:
         shutil.rmtree(EMAIL_SAVE_PATH)
@@ -910,4 +4190,6 @@ if __name__ == '__main__':
         shutil.rmtree(TRANSCRIPT_SAVE_PATH)
         log("Cleaned up temporary files")
     except Exception as e:
-        log(f"Cleanup failed: {e}")
+        log(f"Cleanup failed: {e}", level=logging.WARNING)
+    # Write any buffered log records to the log file
+    LOG_FILE_HANDLER.flush()
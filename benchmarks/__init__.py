@@ -0,0 +1,25 @@
+# Benchmarks for the Email_Search PDF pipeline.
+#
+# The main script has a versioned filename that can't be imported with a plain
+# import statement, so load_script() loads it by path instead.
+import glob
+import importlib.util
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_script = None
+
+def load_script():
+    global _script
+    if _script is None:
+        matches = sorted(glob.glob(os.path.join(REPO_ROOT, 'Email_Search_v*.py')))
+        if not matches:
+            raise FileNotFoundError(f"No Email_Search_v*.py found in {REPO_ROOT}")
+        spec = importlib.util.spec_from_file_location('email_search', matches[-1])
+        _script = importlib.util.module_from_spec(spec)
+        # Registered so process pools can pickle functions defined in the script
+        sys.modules['email_search'] = _script
+        spec.loader.exec_module(_script)
+    return _script
@@ -0,0 +1,46 @@
+# Compare one converter process per document (the old behaviour) with the
+# persistent ConverterPool, using the stub backend so it runs without Office.
+#
+# Usage: python -m benchmarks.bench_convert [--docs 40] [--startup 1.0] [--delay 0.05] [--workers 2]
+#
+# --startup models launching Word/Excel and --delay the conversion itself.
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import load_script
+
+def run(script, paths, workers, max_jobs, options):
+    pool = script.ConverterPool(workers=workers, backend='stub', max_jobs=max_jobs, backend_options=options)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as exe:
+        results = list(exe.map(pool.convert, paths))
+    elapsed = time.perf_counter() - start
+    pool.close()
+    return elapsed, sum(1 for r in results if r), pool.stats['started']
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument('--docs', type=int, default=40)
+    ap.add_argument('--startup', type=float, default=1.0, help='Modeled application launch seconds')
+    ap.add_argument('--delay', type=float, default=0.05, help='Modeled seconds per conversion')
+    ap.add_argument('--workers', type=int, default=2)
+    opts, _ = ap.parse_known_args()
+    script = load_script()
+    options = {'startup_delay': opts.startup, 'delay': opts.delay}
+    print(f"{'mode':>12} {'docs':>6} {'converted':>10} {'workers':>8} {'started':>8} {'seconds':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(opts.docs):
+            path = os.path.join(tmp, f"doc_{i:04d}.docx")
+            with open(path, 'wb') as f:
+                f.write(b'stub')
+            paths.append(path)
+        for mode, workers, max_jobs in (('per-file', 1, 1), ('pool', opts.workers, 1000)):
+            elapsed, converted, started = run(script, paths, workers, max_jobs, options)
+            print(f"{mode:>12} {opts.docs:>6} {converted:>10} {workers:>8} {started:>8} {elapsed:>8.2f}")
+
+if __name__ == '__main__':
+    main()
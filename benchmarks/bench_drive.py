@@ -0,0 +1,63 @@
+# Download transcripts from a local fake Drive server, once one file at a time
+# (the old behaviour) and once with concurrent workers, with per-request
+# latency, a per-connection bandwidth cap and periodic 429/503 responses.
+# Then run the incremental sync twice: a full listing, and a Changes API
+# catch-up after a few files were edited.
+#
+# Usage: python -m benchmarks.bench_drive [--files 40] [--size-kb 512] [--latency 0.1] [--workers 8]
+import argparse
+import random
+import tempfile
+import time
+
+import requests
+
+from benchmarks import load_script
+from benchmarks.fakes import FakeDriveServer
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument('--files', type=int, default=40)
+    ap.add_argument('--size-kb', type=int, default=512)
+    ap.add_argument('--latency', type=float, default=0.1, help='Modeled seconds per request')
+    ap.add_argument('--bandwidth-mb', type=float, default=20.0, help='Per-connection MB/s')
+    ap.add_argument('--fail-every', type=int, default=10, help='Answer every Nth request with 429/503 (0 = never)')
+    ap.add_argument('--workers', type=int, default=8)
+    opts, _ = ap.parse_known_args()
+    script = load_script()
+    script.DRIVE_BACKOFF_SECONDS = 0.05
+    state_dir = tempfile.TemporaryDirectory()
+    script.BASE_FOLDER = state_dir.name
+    rng = random.Random(0)
+    with FakeDriveServer(latency=opts.latency, bytes_per_second=opts.bandwidth_mb * 1024 * 1024,
+                         fail_every=opts.fail_every) as server:
+        ids = [server.add_file(f"Project_sync_{i:04d}.pdf", rng.randbytes(opts.size_kb * 1024))
+               for i in range(opts.files)]
+        # Files that should be filtered out by the query
+        for i in range(opts.files):
+            server.add_file(f"Unrelated_{i:04d}.pdf", b'%PDF-1.4')
+        print(f"{'mode':>12} {'files':>6} {'fetched':>8} {'workers':>8} {'retries':>8} {'seconds':>8} {'MB/s':>8}")
+        runs = (('serial', 1, False), ('concurrent', opts.workers, False),
+                ('sync-full', opts.workers, True), ('sync-delta', opts.workers, True))
+        for mode, workers, incremental in runs:
+            if mode == 'sync-delta':
+                for file_id in ids[:max(1, opts.files // 10)]:
+                    server.update_file(file_id, data=rng.randbytes(opts.size_kb * 1024))
+            script.DRIVE_DOWNLOAD_WORKERS = workers
+            script.DRIVE_INCREMENTAL_SYNC = incremental
+            for key in script.DRIVE_STATS:
+                script.DRIVE_STATS[key] = 0
+            client = script.DriveClient(requests.Session(), base_url=server.base_url)
+            with tempfile.TemporaryDirectory() as tmp:
+                start = time.perf_counter()
+                paths = script.download_google_docs_from_drive(['project'], tmp, client)
+                elapsed = time.perf_counter() - start
+            mb = script.DRIVE_STATS['bytes'] / (1024 * 1024)
+            print(f"{mode:>12} {len(paths):>6} {script.DRIVE_STATS['downloaded']:>8} {workers:>8} "
+                  f"{script.DRIVE_STATS['retries']:>8} "
+                  f"{elapsed:>8.2f} {mb / elapsed:>8.1f}")
+    script.RUN_STATE_CONN.close()
+    state_dir.cleanup()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# Compare Python-side filtering with server-side (DASL) filtering in
+# get_all_mail_items against an in-memory Outlook.
+#
+# Usage: python -m benchmarks.bench_enumeration [--items 2000 10000] [--body-kb 20]
+#
+# Reports wall time plus the number of simulated COM calls and bytes, and a
+# modeled COM time using ComStats' per-call and per-byte costs. 'peak KB' is
+# the most Python memory allocated at once while draining the item stream
+# (tracemalloc, in a separate untimed pass); it should stay flat as the
+# mailbox grows, since items are yielded one at a time.
+import argparse
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks import load_script
+from benchmarks.fakes import ComStats, FakeFolder, FakeMailItem, FakeOutlookApplication
+
+WORDS = ('status', 'meeting', 'invoice', 'schedule', 'review', 'contract', 'shipment', 'update', 'team', 'budget')
+
+def make_mailbox(n_items, body_kb, keywords, match_rate=0.05, folders=5, seed=0):
+    rng = random.Random(seed)
+    stats = ComStats()
+    now = datetime.now()
+    buckets = [[] for _ in range(folders)]
+    filler = ' '.join(rng.choice(WORDS) for _ in range(body_kb * 1024 // 7))
+    for i in range(n_items):
+        body = filler
+        if rng.random() < match_rate:
+            cut = rng.randrange(len(body))
+            body = body[:cut] + f" {rng.choice(keywords)} " + body[cut:]
+        buckets[i % folders].append(FakeMailItem(
+            stats, f"ID{i:08d}", subject=f"{rng.choice(WORDS)} {i}", body=body,
+            sent_on=now - timedelta(days=rng.randrange(365)), sender='sender@example.com'))
+    subfolders = [FakeFolder(stats, f"Folder {k}", bucket) for k, bucket in enumerate(buckets[1:], 1)]
+    inbox = FakeFolder(stats, 'Inbox', buckets[0], subfolders)
+    return FakeOutlookApplication(inbox, stats)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument('--items', type=int, nargs='+', default=[2000, 10000])
+    ap.add_argument('--body-kb', type=int, default=20)
+    opts, _ = ap.parse_known_args()
+    script = load_script()
+    script.INCREMENTAL_EXPORT = False
+    script.PROCESS_ONLY_WITH_KEYWORDS = True
+    kws = ['project falcon', 'acme corp']
+    print(f"{'items':>7} {'mode':>8} {'matched':>8} {'seconds':>8} {'COM calls':>10} {'COM MB':>8} {'modeled s':>10} {'peak KB':>8}")
+    for n in opts.items:
+        app = make_mailbox(n, opts.body_kb, kws)
+        for mode, server_side in (('python', False), ('dasl', True)):
+            script.SERVER_SIDE_FILTER = server_side
+            app.stats.calls = app.stats.bytes = 0
+            start = time.perf_counter()
+            found = sum(1 for _ in script.get_all_mail_items(kws, source=script.OutlookMailSource(app, email=None)))
+            elapsed = time.perf_counter() - start
+            calls, com_bytes, modeled = app.stats.calls, app.stats.bytes, app.stats.modeled_seconds()
+            tracemalloc.start()
+            for item in script.get_all_mail_items(kws, source=script.OutlookMailSource(app, email=None)):
+                script.mail_item_fields(item)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{n:>7} {mode:>8} {found:>8} {elapsed:>8.2f} {calls:>10} "
+                  f"{com_bytes / 1e6:>8.1f} {modeled:>10.2f} {peak / 1024:>8.0f}")
+
+if __name__ == '__main__':
+    main()
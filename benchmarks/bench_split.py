@@ -0,0 +1,36 @@
+# Benchmark split_pdf_by_size on generated PDFs of increasing page count.
+#
+# Usage: python -m benchmarks.bench_split [--pages 1000 5000 20000] [--parts 4]
+#
+# Each input is split into roughly --parts parts. With the incremental size
+# tracker the per-page cost should stay flat as the page count grows.
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks import load_script
+from benchmarks.corpus import make_text_pdf
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument('--pages', type=int, nargs='+', default=[1000, 5000, 20000])
+    ap.add_argument('--parts', type=int, default=4, help='Target number of parts per input')
+    opts, _ = ap.parse_known_args()
+    script = load_script()
+    print(f"{'pages':>8} {'size MB':>8} {'parts':>6} {'seconds':>9} {'us/page':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in opts.pages:
+            src = os.path.join(tmp, f"bench_{n}.pdf")
+            make_text_pdf(src, n)
+            size_mb = os.path.getsize(src) / (1024 * 1024)
+            max_mb = size_mb / opts.parts * 1.05
+            start = time.perf_counter()
+            parts = script.split_pdf_by_size(src, max_mb=max_mb)
+            elapsed = time.perf_counter() - start
+            over = [p for p in parts if os.path.getsize(p) > max_mb * 1024 * 1024]
+            print(f"{n:>8} {size_mb:>8.1f} {len(parts):>6} {elapsed:>9.2f} {elapsed / n * 1e6:>9.1f}"
+                  + (f"  ({len(over)} parts over limit)" if over else ''))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# Synthetic corpora for the benchmarks: fake Outlook mail items and the PDFs
+# the pipeline sees in practice (text documents, image-only "scanned" pages and
+# sets of documents large enough to merge into multi-part output).
+#
+# Everything is seeded, so the same arguments produce the same corpus and
+# timings stay comparable between runs.
+import os
+import random
+import string
+from datetime import datetime, timedelta
+
+import fitz
+
+from benchmarks.fakes import ComStats, FakeAttachment, FakeMailItem
+
+WORDS = ('status', 'meeting', 'invoice', 'schedule', 'review', 'contract', 'shipment', 'update', 'team',
+         'budget', 'forecast', 'vendor', 'approval', 'deadline', 'quarter', 'project', 'draft', 'minutes')
+
+def filler_text(rng, n_bytes, words_per_line=14):
+    words, size = [], 0
+    while size < n_bytes:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    lines = [' '.join(words[i:i + words_per_line]) for i in range(0, len(words), words_per_line)]
+    return '\n'.join(lines)
+
+def logo_png(size=64):
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, size, size), 0)
+    pix.set_rect(pix.irect, (40, 90, 160))
+    return pix.tobytes('png')
+
+def make_text_pdf(path, pages, seed=0, chars_per_page=1500):
+    # Text pages with a letterhead image shared by every page, so the splitter
+    # has to count the shared XObject once per part rather than once per page.
+    rng = random.Random(seed)
+    logo = logo_png()
+    doc = fitz.open()
+    logo_xref = 0
+    for _ in range(pages):
+        page = doc.new_page()
+        logo_xref = page.insert_image(fitz.Rect(50, 20, 114, 84), stream=logo, xref=logo_xref)
+        text = ''.join(rng.choice(string.ascii_letters + ' ') for _ in range(chars_per_page))
+        page.insert_textbox(fitz.Rect(50, 100, 550, 750), text, fontsize=9)
+    doc.save(path)
+    doc.close()
+    return path
+
+def make_scanned_pdf(path, pages, seed=0, dpi=72):
+    # Image-only pages: text is rasterized and the text layer dropped, the way
+    # a scanner produces them. Each page gets its own image.
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for _ in range(pages):
+        src = fitz.open()
+        page = src.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 750), filler_text(rng, 1200), fontsize=10)
+        png = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY).tobytes('png')
+        src.close()
+        out = doc.new_page()
+        out.insert_image(out.rect, stream=png)
+    doc.save(path, deflate=True)
+    doc.close()
+    return path
+
+def make_pdf_set(out_dir, count, pages, scanned_ratio=0.0, seed=0, prefix='doc'):
+    """
+    Write count PDFs of roughly pages pages each (varied by +-50%) to out_dir,
+    a scanned_ratio fraction of them image-only. Returns the paths in order.
+    """
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for i in range(count):
+        n = max(1, rng.randint(pages // 2, pages + pages // 2))
+        path = os.path.join(out_dir, f"{prefix}_{i:05d}.pdf")
+        if rng.random() < scanned_ratio:
+            make_scanned_pdf(path, n, seed=seed + i)
+        else:
+            make_text_pdf(path, n, seed=seed + i)
+        paths.append(path)
+    return paths
+
+# Attachment kinds and their default share of a mailbox's attachments
+ATTACHMENT_MIX = {'text_pdf': 0.4, 'scanned_pdf': 0.2, 'docx': 0.2, 'xlsx': 0.1, 'signature': 0.1}
+
+def make_attachment(rng, kind, tmp_dir, seed, pages=3):
+    if kind in ('text_pdf', 'scanned_pdf'):
+        path = os.path.join(tmp_dir, f"att_{seed}.pdf")
+        (make_text_pdf if kind == 'text_pdf' else make_scanned_pdf)(path, pages, seed=seed)
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.remove(path)
+        return FakeAttachment(f"{rng.choice(WORDS)}_{seed}.pdf", data)
+    if kind == 'signature':
+        return FakeAttachment(f"image{seed:03d}.png", logo_png(32))
+    # Office attachments are placeholders; only the stub converter backend reads them
+    ext = '.docx' if kind == 'docx' else '.xlsx'
+    return FakeAttachment(f"{rng.choice(WORDS)}_{seed}{ext}", filler_text(rng, 2048).encode())
+
+def make_mail_items(count, body_kb=4, html_ratio=0.2, attachments_per_item=0.5, attachment_mix=None,
+                    keywords=(), match_rate=0.5, tmp_dir=None, stats=None, seed=0):
+    """
+    Build count FakeMailItems with bodies of about body_kb KB.
+
+    html_ratio of them have an HTML body and an empty plain-text Body, as
+    HTML-only messages do. attachments_per_item is the mean number of
+    attachments per item, drawn from attachment_mix (kind -> weight, see
+    ATTACHMENT_MIX); PDF attachments are rendered through tmp_dir. A
+    match_rate fraction of bodies mention one of keywords.
+    """
+    rng = random.Random(seed)
+    stats = stats or ComStats()
+    mix = attachment_mix or ATTACHMENT_MIX
+    kinds, weights = list(mix), list(mix.values())
+    now = datetime(2024, 6, 1, 9, 0)
+    items = []
+    for i in range(count):
+        body = filler_text(rng, body_kb * 1024)
+        if keywords and rng.random() < match_rate:
+            cut = rng.randrange(len(body))
+            body = body[:cut] + f" {rng.choice(keywords)} " + body[cut:]
+        html_body = ''
+        if rng.random() < html_ratio:
+            paragraphs = ''.join(f"<p>{line}</p>" for line in body.split('\n'))
+            html_body, body = f"<html><body>{paragraphs}</body></html>", ''
+        attachments = []
+        if tmp_dir:
+            n_att = int(attachments_per_item) + (rng.random() < attachments_per_item % 1)
+            for k in range(n_att):
+                kind = rng.choices(kinds, weights)[0]
+                attachments.append(make_attachment(rng, kind, tmp_dir, seed * 100000 + i * 10 + k))
+        sent = now - timedelta(days=rng.randrange(365), minutes=rng.randrange(1440))
+        items.append(FakeMailItem(
+            stats, f"ID{i:08d}", subject=f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} #{i}",
+            body=body, html_body=html_body, sent_on=sent, sender=f"user{i % 37}@example.com",
+            to='team@example.com', attachments=attachments, conversation_id=f"CONV{i % max(1, count // 5):06d}"))
+    return items
@@ -0,0 +1,497 @@
+# In-memory stand-ins for the external systems the script talks to, so the
+# pipeline can be exercised and benchmarked on Linux without Outlook.
+#
+# FakeOutlookApplication mimics the slice of the Outlook object model used by
+# OutlookMailSource: GetNamespace('MAPI'), folders, Items.Restrict, GetTable
+# and GetItemFromID. Every property read on an item is counted in ComStats so
+# benchmarks can compare how much data crosses the (simulated) COM boundary.
+#
+# FakeDriveServer is a local HTTP stand-in for the Drive REST API.
+import hashlib
+import http.server
+import json
+import re
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+
+class ComStats:
+    # Rough cost of one cross-process COM call and of marshalling one byte
+    CALL_SECONDS = 200e-6
+    BYTE_SECONDS = 20e-9
+
+    def __init__(self):
+        self.calls = 0
+        self.bytes = 0
+
+    def record(self, value):
+        self.calls += 1
+        if isinstance(value, str):
+            self.bytes += len(value)
+
+    def modeled_seconds(self):
+        return self.calls * self.CALL_SECONDS + self.bytes * self.BYTE_SECONDS
+
+class FakeAttachment:
+    def __init__(self, file_name, data):
+        self.FileName = file_name
+        self.data = data
+
+    def SaveAsFile(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.data)
+
+class FakeMailItem:
+    def __init__(self, stats, entry_id, subject='', body='', html_body='', sent_on=None,
+                 sender='', to='', attachments=(), modified=None, conversation_id='', conversation_index=''):
+        self._stats = stats
+        self._props = {
+            'EntryID': entry_id,
+            'Subject': subject,
+            'Body': body,
+            'HTMLBody': html_body,
+            'SentOn': sent_on,
+            'SenderName': sender,
+            'SenderEmailAddress': sender,
+            'To': to,
+            'Attachments': list(attachments),
+            'LastModificationTime': modified or sent_on,
+            'ConversationID': conversation_id,
+            'ConversationIndex': conversation_index,
+        }
+
+    def proxy(self):
+        # A fresh wrapper over the same item, as each COM access returns a new proxy
+        clone = object.__new__(FakeMailItem)
+        clone._stats = self._stats
+        clone._props = self._props
+        return clone
+
+    def __getattr__(self, name):
+        props = self.__dict__.get('_props', {})
+        if name not in props:
+            raise AttributeError(name)
+        value = props[name]
+        self._stats.record(value)
+        return value
+
+class FakeItems:
+    def __init__(self, stats, items):
+        self._stats = stats
+        self._items = list(items)
+
+    def __iter__(self):
+        for item in self._items:
+            self._stats.record(None)
+            yield item.proxy()
+
+    @property
+    def Count(self):
+        return len(self._items)
+
+    def Restrict(self, dasl):
+        self._stats.record(dasl)
+        return FakeItems(self._stats, [i for i in self._items if dasl_matches(dasl, i._props)])
+
+class FakeColumns:
+    def __init__(self):
+        self.names = ['EntryID', 'Subject', 'CreationTime', 'LastModificationTime', 'MessageClass']
+
+    def RemoveAll(self):
+        self.names = []
+
+    def Add(self, name):
+        self.names.append(name)
+
+class FakeRow:
+    def __init__(self, values):
+        self._values = values
+
+    def GetValues(self):
+        return tuple(self._values)
+
+class FakeTable:
+    def __init__(self, stats, items):
+        self._stats = stats
+        self._items = items
+        self._pos = 0
+        self.Columns = FakeColumns()
+
+    @property
+    def EndOfTable(self):
+        return self._pos >= len(self._items)
+
+    def GetNextRow(self):
+        props = self._items[self._pos]._props
+        self._pos += 1
+        values = [props.get(name) for name in self.Columns.names]
+        for v in values:
+            self._stats.record(v)
+        return FakeRow(values)
+
+class FakeFolder:
+    def __init__(self, stats, name, items=(), folders=(), store_id='store-1'):
+        self._stats = stats
+        self.Name = name
+        self.StoreID = store_id
+        self.Items = FakeItems(stats, items)
+        self.Folders = list(folders)
+
+    def GetTable(self, dasl=None, table_contents=0):
+        self._stats.record(dasl)
+        items = self.Items._items
+        if dasl:
+            items = [i for i in items if dasl_matches(dasl, i._props)]
+        return FakeTable(self._stats, items)
+
+class FakeNamespace:
+    def __init__(self, stats, inbox):
+        self._stats = stats
+        self._inbox = inbox
+        self.Accounts = []
+        self._by_id = {}
+        stack = [inbox]
+        while stack:
+            folder = stack.pop()
+            for item in folder.Items._items:
+                self._by_id[item._props['EntryID']] = item
+            stack.extend(folder.Folders)
+
+    def GetDefaultFolder(self, folder_type):
+        return self._inbox
+
+    def GetItemFromID(self, entry_id, store_id=None):
+        self._stats.record(entry_id)
+        return self._by_id[entry_id].proxy()
+
+class FakeOutlookApplication:
+    def __init__(self, inbox, stats):
+        self.stats = stats
+        self._namespace = FakeNamespace(stats, inbox)
+
+    def GetNamespace(self, name):
+        return self._namespace
+
+# --- Minimal DASL evaluator for the filters build_dasl_filter produces ---
+
+DASL_PROPS = {
+    'urn:schemas:httpmail:date': 'SentOn',
+    'urn:schemas:httpmail:subject': 'Subject',
+    'urn:schemas:httpmail:textdescription': 'Body',
+}
+_TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|"([^"]+)"|\'((?:[^\']|\'\')*)\'|(>=|<=|<>|=|>|<)|([A-Za-z_]+))')
+
+def _tokenize(expr):
+    tokens, pos = [], 0
+    expr = expr.strip()
+    while pos < len(expr):
+        m = _TOKEN_RE.match(expr, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"Unsupported DASL near: {expr[pos:pos + 30]!r}")
+        lpar, rpar, prop, literal, op, word = m.groups()
+        if lpar:
+            tokens.append(('(', None))
+        elif rpar:
+            tokens.append((')', None))
+        elif prop:
+            tokens.append(('prop', prop))
+        elif literal is not None:
+            tokens.append(('lit', literal.replace("''", "'")))
+        elif op:
+            tokens.append(('op', op))
+        else:
+            tokens.append(('op' if word.lower() in ('like', 'ci_phrasematch') else 'word', word.lower()))
+        pos = m.end()
+    return tokens
+
+def _compare(props, prop, op, literal):
+    value = props.get(DASL_PROPS.get(prop, prop))
+    if op == 'like':
+        pattern = '.*'.join(re.escape(part) for part in literal.split('%'))
+        return bool(re.fullmatch(pattern, value or '', re.IGNORECASE | re.DOTALL))
+    if op == 'ci_phrasematch':
+        return re.search(r'\b' + re.escape(literal), value or '', re.IGNORECASE) is not None
+    if isinstance(value, datetime):
+        literal = datetime.strptime(literal, '%m/%d/%Y %I:%M %p')
+    if value is None:
+        return False
+    return {'>=': value >= literal, '<=': value <= literal, '>': value > literal,
+            '<': value < literal, '=': value == literal, '<>': value != literal}[op]
+
+def dasl_matches(dasl, props):
+    tokens = _tokenize(dasl[len('@SQL='):] if dasl.startswith('@SQL=') else dasl)
+    pos = 0
+
+    def expr():
+        nonlocal pos
+        result = term()
+        while pos < len(tokens) and tokens[pos] == ('word', 'or'):
+            pos += 1
+            rhs = term()
+            result = result or rhs
+        return result
+
+    def term():
+        nonlocal pos
+        result = factor()
+        while pos < len(tokens) and tokens[pos] == ('word', 'and'):
+            pos += 1
+            rhs = factor()
+            result = result and rhs
+        return result
+
+    def factor():
+        nonlocal pos
+        if tokens[pos][0] == '(':
+            pos += 1
+            result = expr()
+            pos += 1
+            return result
+        (_, prop), (_, op), (_, literal) = tokens[pos:pos + 3]
+        pos += 3
+        return _compare(props, prop, op, literal)
+
+    return expr()
+
+# --- Local stand-in for the Google Drive v3 REST API ---
+#
+# FakeDriveServer serves files.list (with q, pageSize and pageToken),
+# files.get?alt=media, changes.getStartPageToken and changes.list over real
+# HTTP on 127.0.0.1, so DriveClient can be pointed at it with a plain
+# requests.Session. Request latency, bandwidth and periodic 429/503 responses
+# can be injected. add_file/update_file/delete_file append to the change log.
+
+class FakeDriveServer:
+    def __init__(self, max_page_size=100, latency=0.0, bytes_per_second=None, fail_every=0):
+        self.files = []
+        self.changes = []
+        self._next_id = 0
+        self.max_page_size = max_page_size
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.fail_every = fail_every
+        self.stats = {'requests': 0, 'list_requests': 0, 'change_requests': 0, 'media_requests': 0,
+                      'failures': 0, 'bytes_sent': 0}
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    def add_file(self, name, data, parents=('root',), mime_type='application/pdf', trashed=False, modified=None):
+        self._next_id += 1
+        file_id = f"f{self._next_id:06d}"
+        self.files.append({'id': file_id, 'name': name, 'mimeType': mime_type, 'parents': list(parents),
+                           'trashed': trashed})
+        self.update_file(file_id, data=data, modified=modified or '2026-01-01T00:00:00.000Z')
+        return file_id
+
+    def update_file(self, file_id, data=None, modified=None, **fields):
+        f = self._file(file_id)
+        f.update(fields)
+        if data is not None:
+            f.update(data=data, size=str(len(data)), md5Checksum=hashlib.md5(data).hexdigest())
+        f['modifiedTime'] = modified or time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+        self.changes.append({'fileId': file_id, 'removed': False})
+
+    def delete_file(self, file_id):
+        self.files.remove(self._file(file_id))
+        self.changes.append({'fileId': file_id, 'removed': True})
+
+    def _file(self, file_id):
+        return next((f for f in self.files if f['id'] == file_id), None)
+
+    @staticmethod
+    def resource(f):
+        return {k: v for k, v in f.items() if k != 'data'}
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/drive/v3"
+
+    def start(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, payload, headers=()):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in headers:
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urllib.parse.urlsplit(self.path)
+                params = dict(urllib.parse.parse_qsl(url.query))
+                with server._lock:
+                    server.stats['requests'] += 1
+                    fail = server.fail_every and server.stats['requests'] % server.fail_every == 0
+                    if fail:
+                        server.stats['failures'] += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if fail:
+                    # Alternate rate limiting and a transient server error
+                    if server.stats['failures'] % 2:
+                        return self.send_json(429, {'error': 'rateLimitExceeded'}, [('Retry-After', '0')])
+                    return self.send_json(503, {'error': 'backendError'})
+                path = url.path[len('/drive/v3'):]
+                if path == '/files':
+                    return server.list_files(self, params)
+                if path.startswith('/files/') and params.get('alt') == 'media':
+                    return server.send_media(self, path[len('/files/'):])
+                if path == '/changes/startPageToken':
+                    return self.send_json(200, {'startPageToken': str(len(server.changes))})
+                if path == '/changes':
+                    return server.list_changes(self, params)
+                self.send_json(404, {'error': 'notFound'})
+
+        self._httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def list_files(self, handler, params):
+        with self._lock:
+            self.stats['list_requests'] += 1
+        matches = [f for f in self.files if drive_query_matches(params.get('q', ''), f)]
+        offset = int(params.get('pageToken') or 0)
+        size = min(int(params.get('pageSize') or 100), self.max_page_size)
+        page = [self.resource(f) for f in matches[offset:offset + size]]
+        payload = {'files': page}
+        if offset + size < len(matches):
+            payload['nextPageToken'] = str(offset + size)
+        handler.send_json(200, payload)
+
+    def list_changes(self, handler, params):
+        with self._lock:
+            self.stats['change_requests'] += 1
+        offset = int(params['pageToken'])
+        size = min(int(params.get('pageSize') or 100), self.max_page_size)
+        page = []
+        for change in self.changes[offset:offset + size]:
+            f = self._file(change['fileId'])
+            # Like Drive, a change reports the file's current state
+            if change['removed'] or f is None:
+                page.append({'fileId': change['fileId'], 'removed': True})
+            else:
+                page.append({'fileId': change['fileId'], 'removed': False, 'file': self.resource(f)})
+        payload = {'changes': page}
+        if offset + size < len(self.changes):
+            payload['nextPageToken'] = str(offset + size)
+        else:
+            payload['newStartPageToken'] = str(len(self.changes))
+        handler.send_json(200, payload)
+
+    def send_media(self, handler, file_id):
+        f = self._file(file_id)
+        if f is None:
+            return handler.send_json(404, {'error': 'notFound'})
+        with self._lock:
+            self.stats['media_requests'] += 1
+        data = f['data']
+        handler.send_response(200)
+        handler.send_header('Content-Type', f['mimeType'])
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        chunk = 64 * 1024
+        for i in range(0, len(data), chunk):
+            piece = data[i:i + chunk]
+            handler.wfile.write(piece)
+            if self.bytes_per_second:
+                time.sleep(len(piece) / self.bytes_per_second)
+        with self._lock:
+            self.stats['bytes_sent'] += len(data)
+
+# --- Minimal evaluator for Drive search queries ---
+
+_DRIVE_TOKEN_RE = re.compile(r"\s*(?:(\()|(\))|'((?:[^'\\]|\\.)*)'|(!=|<=|>=|=|<|>)|([A-Za-z_]+))")
+
+def _drive_tokenize(query):
+    tokens, pos = [], 0
+    query = query.strip()
+    while pos < len(query):
+        m = _DRIVE_TOKEN_RE.match(query, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"Unsupported Drive query near: {query[pos:pos + 30]!r}")
+        lpar, rpar, literal, op, word = m.groups()
+        if lpar:
+            tokens.append(('(', None))
+        elif rpar:
+            tokens.append((')', None))
+        elif literal is not None:
+            tokens.append(('lit', re.sub(r'\\(.)', r'\1', literal)))
+        elif op:
+            tokens.append(('op', op))
+        else:
+            tokens.append(('word', word))
+        pos = m.end()
+    return tokens
+
+def drive_query_matches(query, f):
+    if not query:
+        return True
+    tokens = _drive_tokenize(query)
+    pos = 0
+
+    def expr():
+        nonlocal pos
+        result = term()
+        while pos < len(tokens) and tokens[pos] == ('word', 'or'):
+            pos += 1
+            rhs = term()
+            result = result or rhs
+        return result
+
+    def term():
+        nonlocal pos
+        result = factor()
+        while pos < len(tokens) and tokens[pos] == ('word', 'and'):
+            pos += 1
+            rhs = factor()
+            result = result and rhs
+        return result
+
+    def factor():
+        nonlocal pos
+        if tokens[pos] == ('word', 'not'):
+            pos += 1
+            return not factor()
+        if tokens[pos][0] == '(':
+            pos += 1
+            result = expr()
+            pos += 1
+            return result
+        (kind, lhs), (_, op), (rkind, rhs) = tokens[pos:pos + 3]
+        pos += 3
+        if op == 'in':
+            return lhs in f.get(rhs, [])
+        value = f.get(lhs)
+        if rkind == 'word':
+            rhs = rhs == 'true'
+        if op == 'contains':
+            # Drive matches name terms by prefix: 'World' does not match 'HelloWorld'
+            return re.search(r'(?<![0-9a-z])' + re.escape(rhs), value or '', re.IGNORECASE) is not None
+        return {'=': value == rhs, '!=': value != rhs, '<': value < rhs, '<=': value <= rhs,
+                '>': value > rhs, '>=': value >= rhs}[op]
+
+    return expr()
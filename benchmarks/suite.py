@@ -0,0 +1,207 @@
+# Time the PDF hot paths on synthetic corpora at several scales and compare
+# the results with a stored baseline.
+#
+# Usage: python -m benchmarks.suite [--scales small medium large] [--repeat 3]
+#                                   [--output results.json] [--baseline benchmarks/baseline.json]
+#                                   [--save-baseline] [--tolerance 0.25]
+#
+# Each case is run --repeat times on a cold document registry and the fastest
+# run is kept. Results are written as JSON; with a baseline present every case
+# is compared against it and the exit status is 1 if any case got slower than
+# the baseline by more than --tolerance (and by at least --min-delta seconds).
+# Run with --save-baseline on a known-good tree to record the baseline; it is
+# only meaningful on the machine it was recorded on.
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import fitz
+import pypdf
+
+from benchmarks import REPO_ROOT, load_script
+from benchmarks.corpus import make_mail_items, make_pdf_set
+
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, 'benchmarks', 'baseline.json')
+
+# emails: mail items rendered; body_kb: body size; docs/doc_pages: attachment PDFs
+# and their mean page count; scanned: fraction of image-only attachment PDFs
+SCALES = {
+    'small': {'emails': 40, 'body_kb': 4, 'docs': 12, 'doc_pages': 4, 'scanned': 0.25},
+    'medium': {'emails': 200, 'body_kb': 8, 'docs': 40, 'doc_pages': 8, 'scanned': 0.25},
+    'large': {'emails': 1000, 'body_kb': 16, 'docs': 120, 'doc_pages': 20, 'scanned': 0.2},
+}
+# Number of parts the merged attachments are split into
+SPLIT_PARTS = 4
+
+def timed(script, fn, repeat, setup=None):
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with script.DOC_REGISTRY_LOCK:
+            script.DOC_REGISTRY.clear()
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+def result(runs, items, unit):
+    best = min(runs)
+    return {'seconds': best, 'median': statistics.median(runs), 'items': items, 'unit': unit,
+            'per_item_ms': best / items * 1000 if items else 0.0}
+
+def run_scale(script, scale, params, repeat, tmp):
+    out = {}
+    root = os.path.join(tmp, scale)
+    email_dir = os.path.join(root, 'emails')
+    os.makedirs(email_dir)
+    items = make_mail_items(params['emails'], body_kb=params['body_kb'], seed=1)
+    docs = make_pdf_set(os.path.join(root, 'attachments'), params['docs'], params['doc_pages'],
+                        scanned_ratio=params['scanned'], seed=2)
+    doc_pages = [script.pdf_page_count(p) for p in docs]
+    total_pages = sum(doc_pages)
+
+    email_paths = [os.path.join(email_dir, f"email_{i:05d}.pdf") for i in range(len(items))]
+    def render():
+        for item, path in zip(items, email_paths):
+            script.save_email_as_pdf(item, path)
+    out['save_email_as_pdf'] = result(timed(script, render, repeat), len(items), 'emails')
+
+    merged = os.path.join(root, f"Attachments_{scale}.pdf")
+    out['merge_pdfs'] = result(timed(script, lambda: script.merge_pdfs(docs, merged), repeat), total_pages, 'pages')
+    out['merge_pdfs']['bytes'] = os.path.getsize(merged)
+
+    max_mb = os.path.getsize(merged) / (1024 * 1024) / SPLIT_PARTS * 1.05
+    # Each split starts from a fresh copy of the merged file, since it leaves parts behind
+    split_src = os.path.join(root, 'split', f"Attachments_{scale}.pdf")
+    os.makedirs(os.path.dirname(split_src))
+    def copy_merged():
+        for name in os.listdir(os.path.dirname(split_src)):
+            os.remove(os.path.join(os.path.dirname(split_src), name))
+        with open(merged, 'rb') as src, open(split_src, 'wb') as dst:
+            dst.write(src.read())
+    parts = []
+    def split():
+        parts[:] = script.split_pdf_by_size(split_src, max_mb=max_mb)
+    out['split_pdf_by_size'] = result(timed(script, split, repeat, setup=copy_merged), total_pages, 'pages')
+    out['split_pdf_by_size']['parts'] = len(parts)
+
+    # One index row per carrying email, with every fifth document attached twice
+    def index_entries():
+        entries = []
+        for i, (path, pc) in enumerate(zip(docs, doc_pages)):
+            entries.append({'source_filename': os.path.basename(path), 'page_count': pc, 'sha256': path})
+            if i % 5 == 0:
+                entries.append({'source_filename': os.path.basename(path), 'page_count': pc, 'sha256': path,
+                                'duplicate_of': os.path.basename(path)})
+        return entries
+    entries = []
+    part_page_counts = [script.pdf_page_count(p) for p in parts]
+    runs = timed(script, lambda: script.update_index_after_split(parts, entries, part_page_counts), repeat,
+                 setup=lambda: entries.__setitem__(slice(None), index_entries()))
+    out['update_index_after_split'] = result(runs, len(entries), 'entries')
+
+    def check():
+        for path in docs:
+            script.check_ocr_status(path)
+    out['check_ocr_status'] = result(timed(script, check, repeat), len(docs), 'files')
+
+    script.CONSOLIDATED_EMAIL_PDF_PATH = os.path.join(root, f"Emails_{scale}.pdf")
+    script.CONSOLIDATED_ATTACHMENT_PDF_PATH = merged
+    script.CONSOLIDATED_TRANSCRIPT_PDF_PATH = os.path.join(root, f"Transcripts_{scale}.pdf")
+    # Index entries as the merges leave them: page counts and locations already known
+    script.EMAIL_INDEX_LIST = [{'source_filename': os.path.basename(p), 'source_path': p,
+                                'email_subject': item.Subject, 'sender': item.SenderName,
+                                'page_count': script.pdf_page_count(p)}
+                               for item, p in zip(items, email_paths)]
+    script.update_index_after_split([script.CONSOLIDATED_EMAIL_PDF_PATH], script.EMAIL_INDEX_LIST,
+                                    [sum(e['page_count'] for e in script.EMAIL_INDEX_LIST)])
+    script.ATTACHMENT_INDEX_LIST = entries
+    script.TRANSCRIPT_INDEX_LIST = [{'source_filename': os.path.basename(p), 'transcript_subject': 'Meeting',
+                                     'page_count': pc}
+                                    for p, pc in zip(docs[:max(1, len(docs) // 4)], doc_pages)]
+    script.update_index_after_split([script.CONSOLIDATED_TRANSCRIPT_PDF_PATH], script.TRANSCRIPT_INDEX_LIST,
+                                    [sum(e['page_count'] for e in script.TRANSCRIPT_INDEX_LIST)])
+    csv_path = os.path.join(root, 'project_index.csv')
+    rows = len(script.EMAIL_INDEX_LIST) + len(entries) + len(script.TRANSCRIPT_INDEX_LIST)
+    runs = timed(script, lambda: script.build_project_index(csv_path), repeat)
+    out['build_project_index'] = result(runs, rows, 'rows')
+    return out
+
+def compare(results, baseline, tolerance, min_delta):
+    """Return (rows, regressions) comparing results with baseline case by case."""
+    rows, regressions = [], []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            rows.append((key, cur['seconds'], None, None, 'new'))
+            continue
+        ratio = cur['seconds'] / base['seconds'] if base['seconds'] else float('inf')
+        slower = cur['seconds'] > base['seconds'] * (1 + tolerance) and cur['seconds'] - base['seconds'] >= min_delta
+        status = 'REGRESSION' if slower else ('faster' if ratio < 1 - tolerance else 'ok')
+        rows.append((key, cur['seconds'], base['seconds'], ratio, status))
+        if slower:
+            regressions.append(key)
+    return rows, regressions
+
+def environment():
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'machine': platform.machine(),
+            'cpus': os.cpu_count(), 'pypdf': pypdf.__version__, 'pymupdf': fitz.VersionBind,
+            'recorded': datetime.now().isoformat(timespec='seconds')}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small', 'medium'])
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--output', help='Write results as JSON to this path')
+    ap.add_argument('--baseline', default=DEFAULT_BASELINE)
+    ap.add_argument('--save-baseline', action='store_true', help='Store these results as the baseline')
+    ap.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown as a fraction of the baseline')
+    ap.add_argument('--min-delta', type=float, default=0.02, help='Ignore slowdowns smaller than this many seconds')
+    opts, _ = ap.parse_known_args()
+    script = load_script()
+    script.LOGGER.setLevel(logging.WARNING)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in opts.scales:
+            for case, res in run_scale(script, scale, SCALES[scale], max(1, opts.repeat), tmp).items():
+                results[f"{scale}/{case}"] = res
+    report = {'environment': environment(), 'repeat': opts.repeat, 'results': results}
+    if opts.output:
+        with open(opts.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    baseline = {}
+    if not opts.save_baseline and os.path.exists(opts.baseline):
+        with open(opts.baseline, encoding='utf-8') as f:
+            stored = json.load(f)
+        baseline = stored.get('results', {})
+        env = stored.get('environment', {})
+        if (env.get('platform'), env.get('python')) != (report['environment']['platform'], report['environment']['python']):
+            print(f"Note: baseline was recorded on {env.get('platform')} / Python {env.get('python')}")
+    rows, regressions = compare(results, baseline, opts.tolerance, opts.min_delta)
+    print(f"{'case':<45} {'items':>7} {'seconds':>9} {'ms/item':>9} {'baseline':>9} {'ratio':>6}  status")
+    for key, seconds, base, ratio, status in rows:
+        res = results[key]
+        print(f"{key:<45} {res['items']:>7} {seconds:>9.3f} {res['per_item_ms']:>9.3f} "
+              f"{'' if base is None else f'{base:.3f}':>9} {'' if ratio is None else f'{ratio:.2f}':>6}  {status}")
+    if opts.save_baseline:
+        with open(opts.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved: {opts.baseline}")
+    elif not baseline:
+        print(f"No baseline at {opts.baseline}; run with --save-baseline to record one")
+    if regressions:
+        print(f"FAILED: {len(regressions)} case(s) slower than the baseline by more than "
+              f"{opts.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+# Shared fixtures. The script is loaded by path (see benchmarks.load_script)
+# and the external systems it talks to are replaced by the fakes in
+# benchmarks/fakes.py, so the suite runs on Linux without Outlook or Drive.
+import os
+import sys
+
+import fitz
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import load_script
+
+@pytest.fixture(scope='session')
+def script():
+    return load_script()
+
+def page_texts(paths):
+    # First line of every page across paths, in order; identifies pages after a split or merge
+    texts = []
+    for path in paths:
+        with fitz.open(path) as doc:
+            texts.extend(page.get_text().strip()[:60] for page in doc)
+    return texts
+
+@pytest.fixture
+def run_state(script, tmp_path, monkeypatch):
+    # A fresh run-state database under tmp_path, closed again afterwards
+    monkeypatch.setattr(script, 'BASE_FOLDER', str(tmp_path / 'export'))
+    monkeypatch.setattr(script, 'RUN_STATE_CONN', None)
+    for key in script.RUN_STATE_STATS:
+        monkeypatch.setitem(script.RUN_STATE_STATS, key, 0)
+    yield os.path.join(script.BASE_FOLDER, '.run_state')
+    if script.RUN_STATE_CONN is not None:
+        script.RUN_STATE_CONN.close()
@@ -0,0 +1,59 @@
+# ConverterPool against the stub backend: reuse, recycling and timeouts
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+def make_docs(tmp_path, names):
+    paths = []
+    for name in names:
+        path = tmp_path / name
+        path.write_bytes(b'stub')
+        paths.append(str(path))
+    return paths
+
+@pytest.fixture
+def pool_factory(script):
+    pools = []
+    def make(**kwargs):
+        pool = script.ConverterPool(backend='stub', **kwargs)
+        pools.append(pool)
+        return pool
+    yield make
+    for pool in pools:
+        pool.close()
+
+def test_workers_are_reused(script, tmp_path, pool_factory):
+    pool = pool_factory(workers=2, max_jobs=100, timeout=30)
+    paths = make_docs(tmp_path, [f"doc{i}.docx" for i in range(8)])
+    with ThreadPoolExecutor(max_workers=2) as exe:
+        results = list(exe.map(pool.convert, paths))
+    assert results == [os.path.splitext(p)[0] + '.pdf' for p in paths]
+    assert all(script.pdf_page_count(r) == 1 for r in results)
+    assert pool.stats['converted'] == 8
+    assert pool.stats['started'] <= 2
+    assert pool.stats['recycled'] == 0
+
+def test_workers_are_recycled_after_max_jobs(tmp_path, pool_factory):
+    pool = pool_factory(workers=1, max_jobs=3, timeout=30)
+    for path in make_docs(tmp_path, [f"doc{i}.xlsx" for i in range(7)]):
+        assert pool.convert(path)
+    assert pool.stats['converted'] == 7
+    assert pool.stats['recycled'] == 2
+    assert pool.stats['started'] == 3
+
+def test_timeout_kills_only_the_stuck_worker(tmp_path, pool_factory):
+    pool = pool_factory(workers=1, max_jobs=100, timeout=1, backend_options={'hang_marker': 'stuck'})
+    ok, stuck, after = make_docs(tmp_path, ['ok.docx', 'stuck.docx', 'after.docx'])
+    assert pool.convert(ok)
+    assert pool.convert(stuck) is None
+    # The slot is freed and a fresh worker takes the next job
+    assert pool.convert(after)
+    assert pool.stats['timeouts'] == 1
+    assert pool.stats['converted'] == 2
+    assert pool.stats['started'] == 2
+    assert pool.live == 1
+
+def test_unknown_backend(script):
+    with pytest.raises(ValueError):
+        script.ConverterPool(backend='nope')
@@ -0,0 +1,94 @@
+# Transcript download and incremental sync against the local fake Drive server
+import os
+
+import pytest
+import requests
+
+from benchmarks.fakes import FakeDriveServer
+
+@pytest.fixture
+def drive(script, monkeypatch, run_state):
+    monkeypatch.setattr(script, 'GDRIVE_MEETING_TRANSCRIPTS_FOLDER_ID', '')
+    monkeypatch.setattr(script, 'DRIVE_SERVER_SIDE_FILTER', True)
+    monkeypatch.setattr(script, 'DRIVE_BACKOFF_SECONDS', 0.01)
+    monkeypatch.setattr(script, 'DRIVE_DOWNLOAD_WORKERS', 4)
+    monkeypatch.setattr(script, 'DRIVE_INCREMENTAL_SYNC', False)
+    for key in script.DRIVE_STATS:
+        monkeypatch.setitem(script.DRIVE_STATS, key, 0)
+    with FakeDriveServer(max_page_size=3) as server:
+        yield server, script.DriveClient(requests.Session(), base_url=server.base_url)
+
+def download(script, client, tmp_path, name, incremental):
+    script.DRIVE_INCREMENTAL_SYNC = incremental
+    out = tmp_path / name
+    out.mkdir()
+    paths = script.download_google_docs_from_drive(['project'], str(out), client)
+    return {os.path.basename(p): open(p, 'rb').read() for p in paths}
+
+def stats(script):
+    counts = dict(script.DRIVE_STATS)
+    for key in script.DRIVE_STATS:
+        script.DRIVE_STATS[key] = 0
+    return counts
+
+def test_download_filters_and_pages(script, drive, tmp_path):
+    server, client = drive
+    for i in range(7):
+        server.add_file(f"Project sync {i}.pdf", f"transcript {i}".encode())
+    server.add_file('Subproject notes.pdf', b'prefix match only')
+    server.add_file('Unrelated.pdf', b'no')
+    server.add_file('Project notes.docx', b'no', mime_type='application/msword')
+    server.add_file('Project trashed.pdf', b'no', trashed=True)
+    files = download(script, client, tmp_path, 'out', incremental=False)
+    assert files == {f"Project sync {i}.pdf": f"transcript {i}".encode() for i in range(7)}
+    counts = stats(script)
+    assert counts['downloaded'] == 7 and counts['listed'] == 7 and counts['pages'] == 3
+
+def test_retries_transient_errors(script, drive, tmp_path):
+    server, client = drive
+    server.fail_every = 3
+    for i in range(40):
+        server.add_file(f"project {i}.pdf", bytes([i]) * 1000)
+    script.DRIVE_DOWNLOAD_WORKERS = 8
+    files = download(script, client, tmp_path, 'out', incremental=False)
+    assert len(files) == 40
+    counts = stats(script)
+    assert counts['retries'] > 0 and counts['failed'] == 0
+    # Counters updated by concurrent workers add up
+    assert counts['downloaded'] == 40 and counts['bytes'] == 40000
+
+def test_incremental_sync(script, drive, tmp_path):
+    server, client = drive
+    ids = [server.add_file(f"Project sync {i}.pdf", f"v1 {i}".encode()) for i in range(5)]
+    other = server.add_file('Unrelated.pdf', b'no')
+    first = download(script, client, tmp_path, 'run1', incremental=True)
+    assert len(first) == 5
+    assert stats(script)['downloaded'] == 5
+    # Nothing changed: everything comes from the store, only the change feed is read
+    media = server.stats['media_requests']
+    assert download(script, client, tmp_path, 'run2', incremental=True) == first
+    counts = stats(script)
+    assert counts['downloaded'] == 0 and counts['reused'] == 5 and counts['listed'] == 0
+    assert server.stats['media_requests'] == media
+    # One edit, one removal, one rename into the filter, one new file
+    server.update_file(ids[0], data=b'v2 0')
+    server.delete_file(ids[1])
+    server.update_file(other, name='Project renamed.pdf')
+    server.add_file('Project sync new.pdf', b'new')
+    third = download(script, client, tmp_path, 'run3', incremental=True)
+    counts = stats(script)
+    assert counts['downloaded'] == 3 and counts['reused'] == 3
+    expected = dict(first, **{'Project sync 0.pdf': b'v2 0', 'Project renamed.pdf': b'no',
+                             'Project sync new.pdf': b'new'})
+    del expected['Project sync 1.pdf']
+    assert third == expected
+
+def test_changed_query_lists_again(script, drive, tmp_path, monkeypatch):
+    server, client = drive
+    server.add_file('Project a.pdf', b'a')
+    download(script, client, tmp_path, 'run1', incremental=True)
+    stats(script)
+    monkeypatch.setattr(script, 'GDRIVE_MEETING_TRANSCRIPTS_FOLDER_ID', 'root')
+    assert download(script, client, tmp_path, 'run2', incremental=True) == {'Project a.pdf': b'a'}
+    counts = stats(script)
+    assert counts['listed'] == 1 and counts['reused'] == 1
@@ -0,0 +1,100 @@
+# Server-side (DASL) filtering and incremental enumeration against the fake Outlook
+from datetime import datetime, timedelta
+
+import pytest
+
+from benchmarks.fakes import ComStats, FakeFolder, FakeMailItem, FakeOutlookApplication, dasl_matches
+
+NOW = datetime.now().replace(second=0, microsecond=0)
+
+@pytest.fixture(autouse=True)
+def settings(script, monkeypatch):
+    monkeypatch.setattr(script, 'PROCESS_ONLY_WITH_KEYWORDS', True)
+    monkeypatch.setattr(script, 'KEYWORD_WHOLE_WORD', False)
+    monkeypatch.setattr(script, 'KEYWORD_PHRASE_MATCH', False)
+    monkeypatch.setattr(script, 'DASL_KEYWORD_MATCH', 'like')
+    monkeypatch.setattr(script, 'LIMIT_TO_DAYS_BACK', 0)
+    monkeypatch.setattr(script, 'INCREMENTAL_EXPORT', False)
+    monkeypatch.setattr(script, 'SERVER_SIDE_FILTER', True)
+
+def make_mailbox(bodies):
+    # bodies: one (subject, body, days old) per item, spread over an inbox and two subfolders
+    stats = ComStats()
+    items = [FakeMailItem(stats, f"ID{i:04d}", subject=subject, body=body, sent_on=NOW - timedelta(days=age),
+                          modified=NOW - timedelta(days=age))
+             for i, (subject, body, age) in enumerate(bodies)]
+    sub = [FakeFolder(stats, 'Projects', items[1::3]), FakeFolder(stats, 'Deleted Items', items[2::3])]
+    return FakeOutlookApplication(FakeFolder(stats, 'Inbox', items[0::3], sub), stats), items
+
+MAILBOX = [
+    ('Falcon kickoff', 'agenda attached', 1),
+    ('lunch', 'the project falcon budget', 3),
+    ('re: falcon', 'deleted folder is skipped', 2),
+    ('weekly', "o'brien signed the acme contract", 40),
+    ('misc', 'nothing relevant', 5),
+    ('Acme invoice', '', 10),
+    ('old', 'project falcon from last year', 400),
+]
+
+def found(script, app, kws):
+    return [item.EntryID for item in script.get_all_mail_items(kws, source=script.OutlookMailSource(app, email=None))]
+
+def test_filter_shape(script):
+    assert script.build_dasl_filter([], days_back=0) == (None, False)
+    dasl, applied = script.build_dasl_filter(["o'brien"], days_back=7, now=NOW)
+    assert applied
+    assert dasl.startswith('@SQL=')
+    assert f"\"urn:schemas:httpmail:date\" >= '{NOW - timedelta(days=8):%m/%d/%Y %I:%M %p}'" in dasl
+    assert "LIKE '%o''brien%'" in dasl
+
+def test_filter_left_to_python(script, monkeypatch):
+    # Wildcard characters and phrase mode can't be expressed with LIKE
+    assert script.build_dasl_filter(['100%'], days_back=0) == (None, False)
+    dasl, applied = script.build_dasl_filter(['100%'], days_back=30, now=NOW)
+    assert dasl and not applied
+    monkeypatch.setattr(script, 'KEYWORD_PHRASE_MATCH', True)
+    assert script.build_dasl_filter(['project falcon'], days_back=0) == (None, False)
+
+@pytest.mark.parametrize('mode', ['like', 'phrasematch'])
+def test_filter_selects_keyword_items(script, monkeypatch, mode):
+    monkeypatch.setattr(script, 'DASL_KEYWORD_MATCH', mode)
+    dasl, _ = script.build_dasl_filter(['falcon', "o'brien"], days_back=0)
+    props = [{'Subject': s, 'Body': b} for s, b, _ in MAILBOX]
+    assert [dasl_matches(dasl, p) for p in props] == [True, True, True, True, False, False, True]
+
+@pytest.mark.parametrize('whole_word', [False, True])
+@pytest.mark.parametrize('days_back', [0, 30])
+def test_server_and_python_filtering_agree(script, monkeypatch, whole_word, days_back):
+    monkeypatch.setattr(script, 'KEYWORD_WHOLE_WORD', whole_word)
+    monkeypatch.setattr(script, 'LIMIT_TO_DAYS_BACK', days_back)
+    kws = ['falcon', 'acme']
+    app, _ = make_mailbox(MAILBOX)
+    server = found(script, app, kws)
+    monkeypatch.setattr(script, 'SERVER_SIDE_FILTER', False)
+    assert found(script, app, kws) == server
+    # Inbox first, then subfolders; Deleted Items is excluded
+    assert server == (['ID0000', 'ID0003', 'ID0006', 'ID0001'] if not days_back else ['ID0000', 'ID0001'])
+
+def test_server_filter_reads_fewer_properties(script, monkeypatch):
+    app, _ = make_mailbox(MAILBOX * 20)
+    found(script, app, ['falcon'])
+    server_calls = app.stats.calls
+    app.stats.calls = 0
+    monkeypatch.setattr(script, 'SERVER_SIDE_FILTER', False)
+    found(script, app, ['falcon'])
+    assert server_calls < app.stats.calls
+
+def test_incremental_enumeration_reuses_match_results(script, monkeypatch, run_state):
+    monkeypatch.setattr(script, 'INCREMENTAL_EXPORT', True)
+    monkeypatch.setattr(script, 'SERVER_SIDE_FILTER', False)
+    app, items = make_mailbox(MAILBOX)
+    first = found(script, app, ['falcon'])
+    assert script.RUN_STATE_STATS['match_hits'] == 0
+    # Unchanged items are matched from the run state instead of their bodies
+    assert found(script, app, ['falcon']) == first
+    assert script.RUN_STATE_STATS['match_hits'] == 5
+    # An edited item is checked again
+    items[4]._props.update(Body='now about falcon', LastModificationTime=NOW)
+    second = found(script, app, ['falcon'])
+    assert second == first + ['ID0004']
+    assert script.RUN_STATE_STATS['match_hits'] == 9
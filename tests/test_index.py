@@ -0,0 +1,47 @@
+# Locating index entries in the parts of a merged output
+
+def entries(*page_counts):
+    return [{'source_filename': f"doc{i}.pdf", 'page_count': n, 'sha256': f"h{i}"}
+            for i, n in enumerate(page_counts)]
+
+def locations(index_list):
+    return [(e['merged_file'], e['start_page']) for e in index_list]
+
+def test_single_part(script):
+    index = entries(3, 1, 4)
+    script.update_index_after_split(['out.pdf'], index, [8])
+    assert locations(index) == [('out.pdf', 1), ('out.pdf', 4), ('out.pdf', 5)]
+
+def test_entries_on_part_boundaries(script):
+    index = entries(2, 3, 1, 4, 2)
+    script.update_index_after_split(['/x/out_part1.pdf', '/x/out_part2.pdf', '/x/out_part3.pdf'], index, [5, 1, 6])
+    assert locations(index) == [('out_part1.pdf', 1), ('out_part1.pdf', 3), ('out_part2.pdf', 1),
+                                ('out_part3.pdf', 1), ('out_part3.pdf', 5)]
+
+def test_document_split_across_parts_starts_in_first(script):
+    # A document larger than a part is located where its first page landed
+    index = entries(1, 10, 1)
+    script.update_index_after_split(['p1.pdf', 'p2.pdf', 'p3.pdf'], index, [4, 4, 4])
+    assert locations(index) == [('p1.pdf', 1), ('p1.pdf', 2), ('p3.pdf', 4)]
+
+def test_omitted_and_duplicate_entries(script):
+    index = entries(2, 5, 3)
+    index[1]['omitted'] = True
+    duplicate = dict(index[2], source_filename='copy.pdf', duplicate_of='doc2.pdf')
+    missing_copy = dict(index[1], duplicate_of='doc1.pdf')
+    index += [duplicate, missing_copy]
+    script.update_index_after_split(['p1.pdf', 'p2.pdf'], index, [2, 3])
+    assert locations(index) == [('p1.pdf', 1), ('', 0), ('p2.pdf', 1), ('p2.pdf', 1), ('', 0)]
+
+def test_page_counts_read_from_parts_when_not_given(script, tmp_path):
+    from benchmarks.corpus import make_text_pdf
+    parts = [make_text_pdf(str(tmp_path / f"p{i}.pdf"), n) for i, n in enumerate((2, 3))]
+    index = entries(1, 2, 2)
+    script.update_index_after_split(parts, index)
+    assert locations(index) == [('p0.pdf', 1), ('p0.pdf', 2), ('p1.pdf', 2)]
+
+def test_flag_unmerged(script):
+    index = entries(1, 1, 1)
+    index.insert(1, dict(index[0], duplicate_of='doc0.pdf'))
+    script.flag_unmerged(index, ['a.pdf', 'b.pdf', 'c.pdf'], ['a.pdf', 'c.pdf'])
+    assert [bool(e.get('omitted')) for e in index] == [False, False, True, False]
@@ -0,0 +1,80 @@
+# KeywordMatcher in all four modes, with the automaton and with the pure-Python fallbacks
+import random
+import re
+
+import pytest
+
+MODES = [(False, False), (True, False), (False, True), (True, True)]
+
+@pytest.fixture(params=['automaton', 'fallback'])
+def matcher_class(request, script, monkeypatch):
+    if request.param == 'automaton':
+        if script.ahocorasick is None:
+            pytest.skip('pyahocorasick is not installed')
+    else:
+        monkeypatch.setattr(script, 'ahocorasick', None)
+    return script.KeywordMatcher
+
+def reference(keywords, text, whole_word, phrase):
+    # One regex search per keyword, in keyword order
+    found = []
+    text = text.lower()
+    for kw in keywords:
+        words = kw.lower().split() if phrase else [kw.lower()]
+        if not kw or not ''.join(words) or kw in found:
+            continue
+        pattern = r'\s+'.join(map(re.escape, words))
+        if whole_word:
+            pattern = r'(?<!\w)' + pattern + r'(?!\w)'
+        if re.search(pattern, text):
+            found.append(kw)
+    return found
+
+@pytest.mark.parametrize('whole_word,phrase', MODES)
+def test_examples(matcher_class, whole_word, phrase):
+    kws = ['Falcon', 'project falcon', 'acme corp', 'con']
+    m = matcher_class(kws, whole_word=whole_word, phrase=phrase)
+    text = 'Status of PROJECT\n  Falcon for Acme Corp.'
+    expected = {
+        (False, False): ['Falcon', 'acme corp', 'con'],
+        (True, False): ['Falcon', 'acme corp'],
+        (False, True): ['Falcon', 'project falcon', 'acme corp', 'con'],
+        (True, True): ['Falcon', 'project falcon', 'acme corp'],
+    }[whole_word, phrase]
+    assert m.find('', text) == expected
+    assert m.find('Acme corp', 'falcon') == reference(kws, 'Acme corp falcon', whole_word, phrase)
+
+@pytest.mark.parametrize('whole_word,phrase', MODES)
+def test_matches_are_reported_across_texts_in_keyword_order(matcher_class, whole_word, phrase):
+    m = matcher_class(['zeta', 'alpha', 'beta'], whole_word=whole_word, phrase=phrase)
+    assert m.find('beta', None, 'alpha zeta') == ['zeta', 'alpha', 'beta']
+    assert m.find('', None) == []
+    assert matcher_class([], whole_word=whole_word, phrase=phrase).find('anything') == []
+
+@pytest.mark.parametrize('whole_word,phrase', MODES)
+def test_overlapping_and_contained_keywords(matcher_class, whole_word, phrase):
+    kws = ['ab', 'abc', 'bc', 'b', 'c_d']
+    m = matcher_class(kws, whole_word=whole_word, phrase=phrase)
+    for text in ('abc', 'xabcx', 'ab c', 'b', 'abc_d', 'c_d ab', 'a-b-c'):
+        assert m.find(text) == reference(kws, text, whole_word, phrase), text
+
+@pytest.mark.parametrize('whole_word,phrase', MODES)
+def test_random_against_reference(matcher_class, whole_word, phrase):
+    rng = random.Random(f"{whole_word}{phrase}")
+    for _ in range(500):
+        kws = [''.join(rng.choice('abAB _') for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 4))]
+        text = ''.join(rng.choice('abAB _\n.') for _ in range(rng.randint(0, 20)))
+        m = matcher_class(kws, whole_word=whole_word, phrase=phrase)
+        assert m.find(text) == reference(kws, text, whole_word, phrase), (kws, text)
+
+@pytest.mark.parametrize('whole_word,phrase', MODES)
+def test_keywords_sharing_a_normalized_form_are_all_reported(matcher_class, whole_word, phrase):
+    kws = ['b a', 'Acme', 'b  a', 'ACME', 'b\ta', 'acme']
+    m = matcher_class(kws, whole_word=whole_word, phrase=phrase)
+    expected = ['b a', 'Acme', 'b  a', 'ACME', 'b\ta', 'acme'] if phrase else ['b a', 'Acme', 'ACME', 'acme']
+    assert m.find('x b a acme') == expected == reference(kws, 'x b a acme', whole_word, phrase)
+
+@pytest.mark.parametrize('whole_word,phrase', MODES)
+def test_blank_keywords_never_match(matcher_class, whole_word, phrase):
+    m = matcher_class(['', '  ', 'a'], whole_word=whole_word, phrase=phrase)
+    assert m.find('b c') == []
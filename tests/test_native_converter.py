@@ -0,0 +1,45 @@
+# The Office-free converter backend
+import docx
+import openpyxl
+import pytest
+from openpyxl.chart import BarChart
+
+@pytest.fixture
+def backend(script):
+    return script.NativeOfficeBackend(max_rows=50, max_cols=5, max_pages=3)
+
+def pages(script, path):
+    return script.get_doc_info(path)['page_count']
+
+def test_docx(script, backend, tmp_path):
+    document = docx.Document()
+    document.add_heading('Title', 0)
+    document.add_paragraph('body text')
+    table = document.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = 'a'
+    document.save(tmp_path / 'doc.docx')
+    out = backend.convert(str(tmp_path / 'doc.docx'), str(tmp_path / 'doc.pdf'))
+    assert pages(script, out) == 1
+
+def test_xlsx_sheets_start_on_new_pages_and_are_capped(script, backend, tmp_path):
+    wb = openpyxl.Workbook()
+    wb.active.append(['x', 1])
+    big = wb.create_sheet('Big')
+    for i in range(200):
+        big.append([i] * 8)
+    wb.save(tmp_path / 'book.xlsx')
+    out = backend.convert(str(tmp_path / 'book.xlsx'), str(tmp_path / 'book.pdf'))
+    assert pages(script, out) == 2
+
+def test_workbook_without_worksheets(script, backend, tmp_path):
+    # Only a chart sheet: nothing to draw, but still a valid one-page PDF
+    wb = openpyxl.Workbook()
+    wb.create_chartsheet('Chart').add_chart(BarChart())
+    wb.remove(wb.active)
+    wb.save(tmp_path / 'charts.xlsx')
+    out = backend.convert(str(tmp_path / 'charts.xlsx'), str(tmp_path / 'charts.pdf'))
+    assert pages(script, out) == 1
+
+def test_legacy_formats_need_com(backend, tmp_path):
+    with pytest.raises(ValueError):
+        backend.convert(str(tmp_path / 'old.doc'), str(tmp_path / 'old.pdf'))
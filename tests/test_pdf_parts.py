@@ -0,0 +1,70 @@
+# Split and merge into size-bounded parts: every page written exactly once, in order
+import os
+
+from benchmarks.corpus import make_text_pdf
+from conftest import page_texts
+
+def test_split_round_trip(script, tmp_path):
+    src = make_text_pdf(str(tmp_path / 'big.pdf'), 120)
+    max_mb = os.path.getsize(src) / (1024 * 1024) / 4
+    parts = script.split_pdf_by_size(src, max_mb=max_mb)
+    assert len(parts) > 1
+    assert page_texts(parts) == page_texts([src])
+    assert all(os.path.getsize(p) <= max_mb * 1024 * 1024 for p in parts)
+
+def test_split_overshoot_keeps_every_page_in_order(script, tmp_path, monkeypatch):
+    # Planning against 130% of the limit makes written parts come out too large,
+    # so each one is trimmed and its trailing pages carried into the next
+    monkeypatch.setattr(script, 'PDF_SPLIT_SAFETY_MARGIN', 1.3)
+    monkeypatch.setattr(script, 'COMPACT_OUTPUT', False)
+    src = make_text_pdf(str(tmp_path / 'big.pdf'), 300)
+    max_mb = os.path.getsize(src) / (1024 * 1024) / 3
+    parts = script.split_pdf_by_size(src, max_mb=max_mb)
+    assert page_texts(parts) == page_texts([src])
+    assert all(os.path.getsize(p) <= max_mb * 1024 * 1024 for p in parts)
+
+def make_sources(tmp_path, count, pages):
+    return [make_text_pdf(str(tmp_path / f"d{i:02d}.pdf"), pages, seed=i) for i in range(count)]
+
+def check_placements(tmp_path, sources, parts, placements):
+    # Every source is reported once, and its start page is its first page
+    assert [pl['path'] for pl in placements] == sources
+    by_name = {os.path.basename(p): p for p in parts}
+    for pl in placements:
+        part_pages = page_texts([by_name[pl['merged_file']]])
+        assert part_pages[pl['start_page'] - 1] == page_texts([pl['path']])[0]
+
+def test_merge_round_trip(script, tmp_path):
+    sources = make_sources(tmp_path, 12, 10)
+    total = sum(os.path.getsize(p) for p in sources)
+    out = str(tmp_path / 'merged.pdf')
+    parts, counts, placements = script.merge_pdfs_to_parts(sources, out, max_mb=total / (1024 * 1024) / 3)
+    assert len(parts) > 1
+    assert counts == [len(page_texts([p])) for p in parts]
+    assert page_texts(parts) == page_texts(sources)
+    check_placements(tmp_path, sources, parts, placements)
+
+def test_merge_overshoot_places_every_page(script, tmp_path, monkeypatch):
+    monkeypatch.setattr(script, 'PDF_SPLIT_SAFETY_MARGIN', 1.3)
+    monkeypatch.setattr(script, 'COMPACT_OUTPUT', False)
+    sources = make_sources(tmp_path, 30, 10)
+    total = sum(os.path.getsize(p) for p in sources)
+    out = str(tmp_path / 'merged.pdf')
+    max_mb = total / (1024 * 1024) / 4
+    parts, counts, placements = script.merge_pdfs_to_parts(sources, out, max_mb=max_mb)
+    assert sum(counts) == 300
+    assert page_texts(parts) == page_texts(sources)
+    assert all(os.path.getsize(p) <= max_mb * 1024 * 1024 for p in parts)
+    check_placements(tmp_path, sources, parts, placements)
+
+def test_merge_to_parts_reports_merged_sources(script, tmp_path, monkeypatch):
+    monkeypatch.setattr(script, 'PDF_SPLIT_SAFETY_MARGIN', 1.3)
+    monkeypatch.setattr(script, 'COMPACT_OUTPUT', False)
+    sources = make_sources(tmp_path, 30, 10)
+    missing = str(tmp_path / 'missing.pdf')
+    total = sum(os.path.getsize(p) for p in sources)
+    monkeypatch.setattr(script, 'MAX_SPLIT_SIZE_MB', total / (1024 * 1024) / 4)
+    parts, counts, merged = script.merge_to_parts(sources[:15] + [missing] + sources[15:], str(tmp_path / 'out.pdf'))
+    assert len(parts) > 1
+    assert merged == sources
+    assert sum(counts) == 300
@@ -0,0 +1,53 @@
+# Reusing the artifacts of unchanged items from the run state
+import os
+import shutil
+
+from benchmarks.corpus import make_text_pdf
+
+def export_item(script, entry_id, modified, tmp_path):
+    item_dir = script.run_state_item_dir(entry_id)
+    os.makedirs(item_dir)
+    email_pdf = make_text_pdf(os.path.join(item_dir, 'email.pdf'), 1)
+    att_pdf = shutil.copy(make_text_pdf(str(tmp_path / 'scan.pdf'), 2), os.path.join(item_dir, 'scan.pdf'))
+    index = {'source_filename': 'scan.pdf', 'page_count': 2}
+    script.run_state_save_export(entry_id, modified, email_pdf, {'source_filename': 'email.pdf'},
+                                 [{'pdf_path': att_pdf, 'sha256': 'h', 'size': 1, 'page_count': 2, 'index': index}])
+    return att_pdf
+
+def test_cached_export_round_trip(script, run_state, tmp_path):
+    att_pdf = export_item(script, 'ID1', 't1', tmp_path)
+    cached = script.run_state_cached_export('ID1', 't1')
+    assert [a['pdf_path'] for a in cached['attachments']] == [att_pdf]
+    assert 'ocr_path' not in cached['attachments'][0]
+    assert script.run_state_cached_export('ID1', 't2') is None
+    os.remove(att_pdf)
+    assert script.run_state_cached_export('ID1', 't1') is None
+
+def test_ocr_output_reused_for_unchanged_items(script, run_state, tmp_path, monkeypatch):
+    att_pdf = export_item(script, 'ID1', 't1', tmp_path)
+    ocr_pdf = shutil.copy(att_pdf, att_pdf.replace('.pdf', '_ocr.pdf'))
+    # Outputs outside the run state (e.g. this run's temporary folders) are not recorded
+    script.run_state_record_ocr({att_pdf: str(tmp_path / 'elsewhere_ocr.pdf')})
+    assert 'ocr_path' not in script.run_state_cached_export('ID1', 't1')['attachments'][0]
+    script.run_state_record_ocr({att_pdf: ocr_pdf})
+    assert script.run_state_cached_export('ID1', 't1')['attachments'][0]['ocr_path'] == ocr_pdf
+    # Different OCR settings make the recorded output stale
+    with monkeypatch.context() as m:
+        m.setattr(script, 'OCR_REQUIRED', not script.OCR_REQUIRED)
+        assert 'ocr_path' not in script.run_state_cached_export('ID1', 't1')['attachments'][0]
+    assert script.run_state_cached_export('ID1', 't1')['attachments'][0]['ocr_path'] == ocr_pdf
+    os.remove(ocr_pdf)
+    assert 'ocr_path' not in script.run_state_cached_export('ID1', 't1')['attachments'][0]
+
+def test_attachment_ocr_settles_reused_output_without_checking(script, run_state, tmp_path, monkeypatch):
+    monkeypatch.setattr(script, 'OCR_REQUIRED', True)
+    ocr = script.AttachmentOcr(core_budget=1)
+    checked = []
+    monkeypatch.setattr(ocr, 'check', lambda pdf: (checked.append(pdf), ocr.settle(pdf, pdf)))
+    fresh = str(tmp_path / 'fresh.pdf')
+    ocr.submit(str(tmp_path / 'old.pdf'), str(tmp_path / 'old_ocr.pdf'))
+    merged, failures = ocr.finish([str(tmp_path / 'old.pdf'), fresh])
+    assert merged == [str(tmp_path / 'old_ocr.pdf'), fresh]
+    assert failures == []
+    assert checked == [fresh]
+    assert script.RUN_STATE_STATS['ocr_reused'] == 1